@@ -8,7 +8,7 @@ from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_talisman import Talisman
 
-from config import SECRET_KEY, DEBUG, HOST, PORT, TEMPLATES_DIR, STATIC_DIR
+from config import SECRET_KEY, DEBUG, HOST, PORT, TEMPLATES_DIR, STATIC_DIR, AI_WARMUP_ON_START
 
 print(" DEBUG: Importando blueprint...")
 from routes.main_routes import main_bp
@@ -103,7 +103,7 @@ def create_secure_app():
     
     #  Cache configuration
     from models.cache_manager import cache
-    app.config['CACHE_TYPE'] = 'simple'
+    app.config['CACHE_TYPE'] = 'SimpleCache'
     app.config['CACHE_DEFAULT_TIMEOUT'] = 300
     cache.init_app(app)
     
@@ -130,10 +130,11 @@ def cache_cleanup_thread():
             from models.cache_manager import context_cache
             cleaned = context_cache.cleanup_old_cache()
             if cleaned > 0:
-                print(f"Cache cleanup: {cleaned} sessões antigas removidas")
+                print(f"Cache cleanup: {cleaned} entradas expiradas removidas")
         except Exception as e:
             print(f"❌ Erro na limpeza de cache: {e}")
 
+
 #  CRIAR APP SEGURO
 app, csrf, limiter = create_secure_app()
 
@@ -142,6 +143,24 @@ cleanup_thread = threading.Thread(target=cache_cleanup_thread, daemon=True)
 cleanup_thread.start()
 print("Thread de limpeza de cache iniciada")
 
+#  Monitor de saúde do Ollama (tira o probe do hot path do /chat-stream)
+from utils.ai_client import ai_client
+ai_client.backends.start_health_checks()
+if AI_WARMUP_ON_START:
+    ai_client.warm_up()
+
+#  Manutenção do banco (optimize/ANALYZE/vacuum/limpeza) em horário de baixo tráfego
+from models.maintenance import maintenance_scheduler
+maintenance_scheduler.start()
+
+#  Tarefas em background do armazenamento de conversas (compactação do log)
+from models.chat_manager import chat_manager
+chat_manager.store.start()
+
+#  Resumo incremental das conversas longas (fora do caminho da resposta)
+from utils.conversation_summarizer import conversation_summarizer
+conversation_summarizer.start()
+
 if __name__ == '__main__':
     print(f"TITAN AI - SEGURO")
     print(f"CSRF Protection: {'DESABILITADO (DEBUG)' if DEBUG else 'ATIVO'}")
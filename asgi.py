@@ -0,0 +1,199 @@
+"""
+Entrada ASGI do Titan Chat
+
+O /chat-stream roda em asyncio (um stream aberto = uma corrotina, não uma
+thread); todas as outras rotas continuam no Flask via WsgiToAsgi.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5001
+
+O caminho async passa pelos mesmos hooks do Flask (CSRF, rate limit) e as
+etapas que tocam SQLite/arquivos rodam em asyncio.to_thread, fora do loop.
+
+Dependências extras: uvicorn, httpx, asgiref
+"""
+import json
+import uuid
+import asyncio
+from asgiref.wsgi import WsgiToAsgi
+from flask import session
+from werkzeug.exceptions import HTTPException
+
+from app import app as flask_app
+from utils.ai_client import ai_client
+from models.request_manager import request_manager
+from utils.stream_protocol import StreamEncoder, negotiate_protocol
+from routes.main_routes import montar_mensagens_chat, registrar_turno
+
+wsgi_application = WsgiToAsgi(flask_app)
+
+MAX_BODY_SIZE = 64 * 1024
+
+
+async def _read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY_SIZE:
+            return None
+        if not message.get("more_body", False):
+            return body
+
+
+async def _send_json(send, status, payload, extra_headers=()):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json")] + list(extra_headers)
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_flask_response(send, response):
+    """Envia uma resposta do Flask (ex.: 429 do limiter, 400 do CSRF) pelo ASGI"""
+    await send({
+        "type": "http.response.start",
+        "status": response.status_code,
+        "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in response.headers.items()]
+    })
+    await send({"type": "http.response.body", "body": response.get_data()})
+
+
+def _open_flask_session(scope):
+    """Hooks do Flask + sessão (cookie assinado) -> (session_id, set-cookie, resposta de erro ou None)
+
+    preprocess_request() roda os before_request registrados - CSRFProtect e
+    Flask-Limiter - exatamente como no /chat-stream do Flask.
+    """
+    headers = [(k.decode("latin-1"), v.decode("latin-1")) for k, v in scope.get("headers", [])]
+    client = scope.get("client") or ("", 0)
+
+    with flask_app.test_request_context(scope["path"], method="POST", headers=headers,
+                                        environ_base={"REMOTE_ADDR": client[0]}):
+        try:
+            rv = flask_app.preprocess_request()
+        except HTTPException as e:
+            rv = flask_app.handle_user_exception(e)
+        if rv is not None:
+            return None, [], flask_app.make_response(rv)
+
+        session_id = session.get("titan_session_id")
+        if not session_id:
+            session_id = str(uuid.uuid4())
+            session["titan_session_id"] = session_id
+
+        response = flask_app.response_class()
+        flask_app.session_interface.save_session(flask_app, session, response)
+        set_cookies = [(b"set-cookie", c.encode("latin-1")) for c in response.headers.getlist("Set-Cookie")]
+
+    return session_id, set_cookies, None
+
+
+async def _watch_disconnect(receive, disconnected):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            disconnected.set()
+            return
+
+
+async def chat_stream(scope, receive, send):
+    """🌊 CHAT STREAMING ASYNC - mesmos eventos SSE do /chat-stream do Flask"""
+    body = await _read_body(receive)
+    if body is None:
+        return await _send_json(send, 413, {"error": "Requisição inválida"})
+
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        return await _send_json(send, 400, {"error": "JSON inválido"})
+
+    mensagem = str(data.get("mensagem", "")).strip()
+    thinking_mode = data.get("thinking_mode", False)
+    stream_protocol = negotiate_protocol(data.get("stream_protocol", 1))
+
+    if not mensagem:
+        return await _send_json(send, 400, {"error": "Mensagem obrigatória"})
+
+    session_id, set_cookies, rejected = await asyncio.to_thread(_open_flask_session, scope)
+    if rejected is not None:
+        return await _send_flask_response(send, rejected)
+
+    # ✅ ESTADO DO OLLAMA EM MEMÓRIA (monitor em background)
+    if not ai_client.backends.is_available():
+        return await _send_json(send, 503, {"error": "Ollama indisponível"}, set_cookies)
+
+    messages = await asyncio.to_thread(montar_mensagens_chat, mensagem, session_id)
+
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"text/event-stream"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+        ] + set_cookies
+    })
+
+    encoder = StreamEncoder(protocol=stream_protocol, session_id=session_id)
+    # Conta como tráfego ativo (a manutenção do banco espera) e pode ser cancelada
+    request_id = request_manager.start_request(session_id)
+    disconnected = asyncio.Event()
+    watcher = asyncio.create_task(_watch_disconnect(receive, disconnected))
+    stream = ai_client.send_message_streaming_async(
+        messages,
+        thinking_mode=thinking_mode,
+        session_id=session_id,
+        request_id=request_id
+    )
+
+    try:
+        for line in encoder.start():
+            await send({"type": "http.response.body", "body": line.encode("utf-8"), "more_body": True})
+
+        async for chunk in stream:
+            if disconnected.is_set():
+                print(f" [ASTREAM] Cliente desconectou - abortando geração")
+                break
+            for line in encoder.encode(chunk):
+                await send({"type": "http.response.body", "body": line.encode("utf-8"), "more_body": True})
+            if chunk.get("type") == "done":
+                # Histórico + resumo em arquivo/SQLite - fora do event loop
+                await asyncio.to_thread(registrar_turno, session_id, mensagem, messages, chunk)
+
+    except Exception as e:
+        for line in encoder.encode({"error": str(e)}):
+            await send({"type": "http.response.body", "body": line.encode("utf-8"), "more_body": True})
+
+    finally:
+        # Fechar o gerador encerra o stream httpx (Ollama para de gerar)
+        await stream.aclose()
+        watcher.cancel()
+        encoder.close()
+        request_manager.finish_request(request_id)
+        if not disconnected.is_set():
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+async def lifespan(scope, receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if ai_client._async_http is not None:
+                await ai_client._async_http.aclose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    """Roteia /chat-stream para o caminho async e o resto para o Flask"""
+    if scope["type"] == "lifespan":
+        return await lifespan(scope, receive, send)
+    if scope["type"] == "http" and scope["path"] == "/chat-stream" and scope["method"] == "POST":
+        return await chat_stream(scope, receive, send)
+    return await wsgi_application(scope, receive, send)
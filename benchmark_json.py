@@ -0,0 +1,96 @@
+"""
+Benchmark da serialização dos arquivos de conversa
+
+Compara tamanho e tempo de gravação/leitura de um histórico sintético:
+json da stdlib com indent=2 (formato antigo dos exports e backups) contra o
+JSONCodec compacto (orjson se instalado) e suas variantes comprimidas.
+
+Uso: python benchmark_json.py [--chats 1000] [--mensagens 20] [--repeticoes 5]
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+
+def gerar_historico(chats, mensagens):
+    """Histórico com o formato das conversas salvas pelo frontend"""
+    rnd = random.Random(42)
+    palavras = ("memória", "conversa", "código", "função", "python", "análise", "resposta",
+                "pergunta", "dados", "arquivo", "servidor", "cliente", "ação", "índice")
+    historico = []
+    for i in range(chats):
+        historico.append({
+            'id': f"chat_{i:06d}",
+            'title': f"Conversa {i} sobre {rnd.choice(palavras)}",
+            'session_id': "bench-session-0001",
+            'created_at': f"2024-01-{1 + i % 28:02d}T12:00:00",
+            'updated_at': f"2024-02-{1 + i % 28:02d}T12:00:00",
+            'is_pinned': i % 17 == 0,
+            'thinking_mode': i % 3 == 0,
+            'messages': [{
+                'role': 'user' if j % 2 == 0 else 'assistant',
+                'content': ' '.join(rnd.choice(palavras) for _ in range(rnd.randint(10, 120))),
+                'timestamp': f"2024-01-01T12:{j % 60:02d}:00"
+            } for j in range(mensagens)]
+        })
+    return historico
+
+
+def medir(gravar, ler, path, repeticoes):
+    """(bytes, ms por gravação, ms por leitura) - melhor de N"""
+    dump_ms, load_ms = [], []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        gravar(path)
+        dump_ms.append((time.perf_counter() - inicio) * 1000)
+
+        inicio = time.perf_counter()
+        ler(path)
+        load_ms.append((time.perf_counter() - inicio) * 1000)
+    return path.stat().st_size, min(dump_ms), min(load_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--chats', type=int, default=1000)
+    parser.add_argument('--mensagens', type=int, default=20)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    from models.json_codec import JSONCodec, zstandard
+
+    historico = gerar_historico(args.chats, args.mensagens)
+
+    def gravar_antigo(path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(historico, f, ensure_ascii=False, indent=2)
+
+    def ler_antigo(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    cenarios = [("antes (json indent=2)", gravar_antigo, ler_antigo)]
+    compressoes = [None, 'gzip'] + (['zstd'] if zstandard else [])
+    for compression in compressoes:
+        codec = JSONCodec(compression=compression)
+        nome = f"codec {codec.backend}" + (f" + {compression}" if compression else "")
+        cenarios.append((nome, lambda path, c=codec: c.write_file(path, historico), codec.read_file))
+
+    print(f"📦 {args.chats} conversas x {args.mensagens} mensagens")
+    with tempfile.TemporaryDirectory() as tmp:
+        base = None
+        for i, (nome, gravar, ler) in enumerate(cenarios):
+            size, dump_ms, load_ms = medir(gravar, ler, Path(tmp) / f"{i}.json", args.repeticoes)
+            base = base or (size, dump_ms, load_ms)
+            print(f"📊 {nome}: {size / 1024:,.0f} KB ({size / base[0]:.0%}) | "
+                  f"grava {dump_ms:,.1f} ms ({base[1] / dump_ms:.1f}x) | lê {load_ms:,.1f} ms ({base[2] / load_ms:.1f}x)")
+
+    if not zstandard:
+        print("ℹ️ zstd não medido (pip install zstandard)")
+
+
+if __name__ == '__main__':
+    main()
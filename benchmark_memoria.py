@@ -0,0 +1,98 @@
+"""
+Benchmark das ferramentas de memória (salvar/buscar/listar/deletar)
+
+Compara ops/s com uma conexão nova por operação (comportamento antigo,
+journal padrão) contra o pool de conexões com WAL.
+
+Uso: python benchmark_memoria.py [--ops 2000] [--threads 4]
+"""
+import argparse
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class ConexaoPorOperacao:
+    """Comportamento antigo: sqlite3.connect + close a cada chamada"""
+
+    def __init__(self, db_file):
+        self.db_file = str(db_file)
+
+    @contextmanager
+    def connection(self):
+        conn = sqlite3.connect(self.db_file)
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+
+def executar(manager, ops, threads):
+    """ops/s de um ciclo salvar -> buscar -> listar -> deletar por sessão"""
+    por_thread = max(1, ops // threads)
+    erros = []
+
+    def worker(n):
+        session_id = f"bench-{n:04d}-{time.time_ns()}"
+        for i in range(por_thread // 4):
+            chave = f"chave_{i % 50}"
+            resultados = (
+                manager.salvar_dados(chave, f"valor {i}", "bench", session_id=session_id),
+                manager.buscar_dados(chave, session_id=session_id),
+                manager.listar_categorias(session_id=session_id),
+                manager.deletar_dados(chave, session_id=session_id),
+            )
+            erros.extend(r for r in resultados if r.get('status') != 'sucesso')
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    inicio = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - inicio
+    total = (por_thread // 4) * 4 * threads
+    return total / elapsed, total, len(erros)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--ops', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+
+    import builtins
+    from models.database import DatabaseManager
+    from models.db_pool import SQLitePool
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cenarios = [
+            ("antes (conexão por operação)", ConexaoPorOperacao(Path(tmp) / 'antes.db')),
+            ("depois (pool + WAL)", SQLitePool(Path(tmp) / 'depois.db')),
+        ]
+
+        resultados = []
+        print_original = builtins.print
+        for nome, pool in cenarios:
+            manager = DatabaseManager(pool=pool)
+            builtins.print = lambda *a, **k: None  # Logs por operação distorcem a medição
+            try:
+                ops_s, total, erros = executar(manager, args.ops, args.threads)
+            finally:
+                builtins.print = print_original
+            resultados.append(ops_s)
+            print(f"📊 {nome}: {ops_s:,.0f} ops/s ({total} ops, {args.threads} threads, {erros} erros)")
+
+        if resultados[0]:
+            print(f"🚀 Ganho: {resultados[1] / resultados[0]:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -16,8 +16,23 @@ SECURITY_LOGS_DIR = BASE_DIR / 'security_logs'
 
 # Configurações do chat
 CHAT_HISTORY_FILE = CHATS_DIR / 'chat_history.json'  # Mantido para compatibilidade
-MAX_BACKUPS = 10
+MAX_BACKUPS = 10  # Pontos de restauração retidos por sessão
 AUTO_BACKUP = True
+BACKUP_COALESCE_WINDOW = 300  # Segundos - saves dentro da janela não geram novo backup
+
+# Arquivos de conversa (exports, backups, resumos) - JSON compacto; orjson é usado se instalado
+CHAT_FILE_COMPRESSION = None  # None | 'gzip' | 'zstd' (pip install zstandard) - a leitura detecta sozinha
+CHAT_FILE_COMPRESSION_LEVEL = 3
+
+# Armazenamento do histórico de conversas
+CHAT_STORE_BACKEND = 'log'  # 'log' = chats.log por sessão | 'sqlite' = banco único (concorrência entre workers)
+CHAT_STORE_DB_FILE = CHATS_DIR / 'chats.db'
+
+# Log append-only das conversas (chats.log por sessão)
+CHAT_LOG_COMPACT_RATIO = 1.0  # Compacta quando o espaço morto >= N x o espaço vivo
+CHAT_LOG_COMPACT_MIN_BYTES = 256 * 1024  # Logs menores que isso nunca são compactados
+CHAT_LOG_COMPACT_INTERVAL = 300  # Segundos entre rodadas de compactação em background
+CHAT_LOG_INDEX_CACHE_SIZE = 256  # Índices de sessões mantidos em memória (LRU)
 
 # Configurações de sessão - CORRIGIDAS
 MAX_USUARIOS_SIMULTANEOS = 5
@@ -25,11 +40,47 @@ TIMEOUT_SESSAO = 3600  #  MUDANÇA: 1 hora ao invés de 30 minutos
 TEMPO_RESPOSTA_ESTIMADO = 6  # segundos
 CLEANUP_INTERVAL = 300  #  MUDANÇA: 5 minutos ao invés de 1 minuto
 
+# Histórico de conversa em memória (por sessão)
+CHAT_HISTORY_MAX_MESSAGES = 200
+CHAT_HISTORY_MAX_CHARS = 64000  # Limite de memória - o orçamento de tokens é aplicado no ContextBuilder
+
+# Janela de contexto enviada ao modelo
+CONTEXT_TOKEN_BUDGET = 6144  # Tokens de prompt (system + histórico + mensagem atual)
+CONTEXT_CHARS_PER_TOKEN = 3.5  # Estimativa inicial - calibrada com o prompt_eval_count do Ollama
+CONTEXT_SUMMARY_RATIO = 0.1  # Fração do orçamento para o resumo dos turnos descartados
+CONTEXT_TOKENIZER_URL = None  # Endpoint opcional de tokenização exata (ex.: llama.cpp /tokenize)
+CONTEXT_MEMORY_RATIO = 0.1  # Fração do orçamento para as memórias relevantes à mensagem atual
+MEMORY_SEARCH_TOP_K = 5  # Memórias salvas (FTS5) injetadas no contexto por mensagem
+
+# Resumo incremental dos turnos que saem da janela (gerado em background)
+CONTEXT_SUMMARIZER_ENABLED = True
+CONTEXT_SUMMARY_MAX_CHARS = 1500
+CONTEXT_SUMMARY_MAX_TOKENS = 384  # num_predict da chamada de resumo
+CONTEXT_SUMMARY_CACHE_SIZE = 1000  # Resumos mantidos em memória (LRU)
+
 #  NOVO: Configurações de limpeza automática
 AUTO_CLEANUP_ENABLED = True
 CLEANUP_ORPHANED_DATA_INTERVAL = 3600  # 1 hora
 CLEANUP_OLD_SESSIONS_DAYS = 7  # Limpar sessões após 7 dias
 DATABASE_VACUUM_INTERVAL = 86400  # 24 horas - otimizar banco
+MEMORY_SESSION_TOUCH_INTERVAL = 300  # Leituras atualizam o "visto por último" da sessão no máximo a cada 5 min
+DB_CLEANUP_BATCH_SIZE = 500  # Linhas apagadas por transação (o lock de escrita é liberado entre lotes)
+DB_CLEANUP_SLICE_SECONDS = 0.25  # Tempo máximo de cada fatia de limpeza
+DB_CLEANUP_SLICE_PAUSE = 1.0  # Pausa entre fatias quando ainda há o que apagar
+
+# Manutenção agendada do banco (PRAGMA optimize, ANALYZE, incremental vacuum)
+MAINTENANCE_CHECK_INTERVAL = 60  # Segundos entre verificações de tarefas vencidas
+MAINTENANCE_MAX_ACTIVE_REQUESTS = 0  # "Baixo tráfego": no máximo isso de requests em andamento no worker
+MAINTENANCE_MAX_DELAY_FACTOR = 2  # Tarefa atrasada mais que N intervalos roda mesmo com tráfego
+MAINTENANCE_LOCK_TTL = 900  # Lease do worker que está rodando a manutenção
+MAINTENANCE_VACUUM_PAGES = 2000  # Páginas liberadas por incremental_vacuum (0 = todas)
+MAINTENANCE_ANALYSIS_LIMIT = 1000  # Linhas amostradas por índice no ANALYZE
+
+# Pool de conexões SQLite (memória da IA + feedbacks)
+DB_POOL_SIZE = 8  # Conexões ociosas mantidas abertas
+DB_BUSY_TIMEOUT_MS = 5000  # Espera pelo lock de escrita antes de "database is locked"
+DB_MMAP_SIZE = 64 * 1024 * 1024  # Leituras via mmap em vez de read()
+DB_CACHED_STATEMENTS = 128  # Statements preparados mantidos por conexão
 
 # Configurações da IA
 AI_BASE_URL = "http://localhost:11434/api/chat"
@@ -38,6 +89,60 @@ AI_TEMPERATURE = 0.5
 AI_MAX_TOKENS = 1024
 AI_TIMEOUT = 300
 
+# Cache de prompt do Ollama: prefixo estático + modelo sempre carregado
+CHAT_SYSTEM_PROMPT = "Você é o Titan, um assistente inteligente."  # Prefixo idêntico para todas as sessões
+AI_KEEP_ALIVE = "30m"  # Tempo que o modelo fica carregado após a última chamada (-1 = sempre)
+AI_NUM_BATCH = 128  # Opção de carga do runner - mudar entre chamadas força recarregar o modelo
+AI_WARMUP_ON_START = True  # Carregar modelo + prefixo em cada backend ao iniciar
+
+# Cache de contexto por sessão (LRU com lock por faixa)
+CONTEXT_CACHE_MAX_ENTRIES = 2000
+CONTEXT_CACHE_MAX_BYTES = 8 * 1024 * 1024
+CONTEXT_CACHE_TTL = 3600  # Expiração por entrada
+CONTEXT_CACHE_STRIPES = 16  # Locks independentes - threads do Flask não disputam o mesmo lock
+CONTEXT_CACHE_BACKEND = 'sqlite'  # 'sqlite' = compartilhado entre workers (gunicorn) | 'local' = só o processo
+CONTEXT_CACHE_SHARED_FILE = BASE_DIR / 'shared_cache.db'
+CONTEXT_CACHE_SYNC_INTERVAL = 0.25  # Segundos entre leituras do log de invalidações
+MEMORY_CACHE_TTL = 300  # Leituras da memória (buscar_dados/listar_categorias) - invalidadas a cada escrita
+
+# Cache exato de respostas (opt-in) - só sem tools e com temperatura baixa (saída ~determinística)
+RESPONSE_CACHE_ENABLED = False
+RESPONSE_CACHE_MAX_TEMPERATURE = 0.3  # Acima disso a resposta não é reaproveitada
+RESPONSE_CACHE_TTL = 3600
+RESPONSE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+RESPONSE_CACHE_MAX_ENTRY_BYTES = 256 * 1024
+
+# Cache semântico (opt-in) - embeddings do Ollama + índice vetorial em memória
+SEMANTIC_CACHE_ENABLED = False
+SEMANTIC_CACHE_EMBED_MODEL = "nomic-embed-text"
+SEMANTIC_CACHE_THRESHOLD = 0.92  # Similaridade de cosseno mínima para reaproveitar a resposta
+SEMANTIC_CACHE_MAX_ENTRIES = 256  # Por escopo (sessão, ou global sem isolamento)
+SEMANTIC_CACHE_MAX_SCOPES = 1000
+SEMANTIC_CACHE_TTL = 3600
+
+# Backends Ollama (balanceamento por menor número de gerações em andamento)
+# Ex.: [{"url": "http://10.0.0.2:11434/api/chat", "weight": 2}, {"url": AI_BASE_URL, "weight": 1}]
+AI_BACKENDS = [
+    {"url": AI_BASE_URL, "weight": 1},
+]
+AI_STICKY_SESSIONS_MAX = 10000  # Sessões fixadas a um backend (LRU)
+
+# Pool HTTP keep-alive para o Ollama
+AI_HTTP_POOL_SIZE = 10
+AI_HTTP_MAX_RETRIES = 2  # Retries apenas em falha de conexão
+AI_HTTP_CONNECT_TIMEOUT = 5
+AI_HEALTH_TIMEOUT = 3
+AI_ASYNC_MAX_CONNECTIONS = 200  # Streams simultâneos no caminho ASGI
+
+# Monitor de saúde do Ollama (probe em background)
+AI_HEALTH_INTERVAL = 10  # segundos entre probes
+AI_HEALTH_TTL = 30  # estado mais velho que isso é considerado desconhecido
+AI_HEALTH_FAIL_OPEN = False  # estado desconhecido: False = recusar, True = tentar mesmo assim
+
+# Protocolo de streaming (/chat-stream)
+STREAM_PROTOCOL_VERSION = 2  # 2 = deltas com seq + verificação periódica
+STREAM_CHECKPOINT_INTERVAL = 64  # Eventos de conteúdo entre verificações (tamanho + crc32)
+
 # Flask
 SECRET_KEY = 'titan_secret_key_dev_environment'
 DEBUG = True
@@ -0,0 +1,89 @@
+"""
+Migração do histórico de conversas em arquivos para o backend SQLite
+
+Importa em lote todos os chats.json (formato antigo) e chats.log de
+chats/sessions/ para o banco de conversas. Conversas já importadas são
+ignoradas, então pode ser executado mais de uma vez.
+
+Depois da migração, use CHAT_STORE_BACKEND = 'sqlite' no config.py.
+
+Uso: python migrar_chats.py [--db chats/chats.db] [--dry-run]
+"""
+import argparse
+from collections import defaultdict
+
+from config import SESSIONS_DIR, CHAT_STORE_DB_FILE
+from models.json_codec import codec
+
+
+def ler_conversas(session_dir, log):
+    """Conversas dos arquivos de uma pasta de sessão (log primeiro, depois o chats.json antigo)"""
+    conversas = []
+    log_file = session_dir / 'chats.log'
+    if log_file.is_file():
+        conversas.extend(log.read_all(log_file)[0])
+
+    legacy_file = session_dir / 'chats.json'
+    if legacy_file.is_file():
+        data = codec.read_file(legacy_file)
+        if isinstance(data, list):
+            ids = {c.get('id') for c in conversas}
+            conversas.extend(c for c in data if isinstance(c, dict) and c.get('id') not in ids)
+    return conversas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', default=str(CHAT_STORE_DB_FILE))
+    parser.add_argument('--dry-run', action='store_true', help="Só conta o que seria importado")
+    args = parser.parse_args()
+
+    from models.chat_log import ChatLogStore
+    from models.chat_manager import ChatManager
+    from models.chat_store import SQLiteChatStore
+
+    store = SQLiteChatStore(db_file=args.db)
+    manager = ChatManager(store=store)  # Mesmas validações de session_id da aplicação
+    log = ChatLogStore()
+
+    totais = defaultdict(int)
+    for session_dir in sorted(SESSIONS_DIR.iterdir()):
+        if not session_dir.is_dir() or session_dir.is_symlink():
+            continue
+
+        try:
+            conversas = ler_conversas(session_dir, log)
+        except Exception as e:
+            print(f"❌ {session_dir.name}: erro ao ler ({str(e)[:100]})")
+            totais['erros'] += 1
+            continue
+
+        por_sessao = defaultdict(list)
+        for chat in conversas:
+            session_id = chat.get('session_id')
+            try:
+                manager._validate_session_id(session_id)
+            except ValueError:
+                totais['invalidas'] += 1
+                continue
+            # Isolamento: a pasta é o prefixo do session_id dono da conversa
+            if session_id[:8] != session_dir.name or not chat.get('id'):
+                totais['invalidas'] += 1
+                continue
+            por_sessao[session_id].append(chat)
+
+        for session_id, chats in por_sessao.items():
+            chats = chats[:1000]
+            importadas = len(chats) if args.dry_run else store.import_chats(session_id, chats)
+            totais['sessoes'] += 1
+            totais['importadas'] += importadas
+            totais['ignoradas'] += len(chats) - importadas
+            print(f"📦 {session_id[:8]}...: {importadas} de {len(chats)} conversas importadas")
+
+    modo = " (dry-run)" if args.dry_run else ""
+    print(f"✅ Migração concluída{modo}: {totais['importadas']} conversas de {totais['sessoes']} sessões, "
+          f"{totais['ignoradas']} já existentes, {totais['invalidas']} inválidas, {totais['erros']} erros")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,106 +1,578 @@
 from flask_caching import Cache
 from functools import wraps
+import inspect
+from collections import OrderedDict
+import hashlib
+import json
+import math
+import sys
+import threading
 import time
+from config import (CONTEXT_CACHE_MAX_ENTRIES, CONTEXT_CACHE_MAX_BYTES, CONTEXT_CACHE_TTL, CONTEXT_CACHE_STRIPES,
+                    CONTEXT_CACHE_SYNC_INTERVAL,
+                    RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_MAX_ENTRY_BYTES,
+                    SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_MAX_ENTRIES, SEMANTIC_CACHE_MAX_SCOPES,
+                    SEMANTIC_CACHE_TTL, ENFORCE_SESSION_ISOLATION)
+
+try:
+    import numpy as np  # Opcional - acelera a busca vetorial
+except ImportError:
+    np = None
+from models.shared_cache import create_cache_backend
+from models.json_codec import codec
 
 # Cache global do Flask
 cache = Cache()
 
-class ContextCache:
-    """Cache inteligente para contexto de sessões"""
+class _CacheStripe:
+    """Uma faixa do LRU: lock próprio, OrderedDict e contagem de bytes"""
+    
+    __slots__ = ('lock', 'entries', 'sessions', 'bytes', 'invalidated')
     
     def __init__(self):
-        self._context_cache = {}        # Cache dos contextos
-        self._context_dirty = set()     # Sessões que precisam recarregar
-        self._last_access = {}          # Último acesso para limpeza
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # (session_id, chave) -> (valor, tamanho, expira_em)
+        self.sessions = {}  # session_id -> {chaves} (invalidação da sessão inteira)
+        self.bytes = 0
+        self.invalidated = {}  # session_id -> time.monotonic() da última invalidação
+    
+    def drop(self, entry_key):
+        _, size, _ = self.entries.pop(entry_key)
+        self.bytes -= size
+        session_id, key = entry_key
+        keys = self.sessions.get(session_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.sessions[session_id]
+    
+    def drop_session(self, session_id):
+        for key in list(self.sessions.get(session_id, ())):
+            self.drop((session_id, key))
+
+
+class ContextCache:
+    """Cache inteligente para contexto de sessões (LRU limitado, lock por faixa)
+    
+    Cada sessão pode ter várias chaves (key); invalidate_context limpa todas.
+    Com backend compartilhado: memória local na frente, backend atrás e
+    invalidações propagadas para todos os workers.
+    """
+    
+    def __init__(self, max_entries=CONTEXT_CACHE_MAX_ENTRIES, max_bytes=CONTEXT_CACHE_MAX_BYTES,
+                 ttl=CONTEXT_CACHE_TTL, stripes=CONTEXT_CACHE_STRIPES, backend=None,
+                 sync_interval=CONTEXT_CACHE_SYNC_INTERVAL):
+        self.ttl = ttl
+        self.backend = backend
+        self.sync_interval = sync_interval
+        self._sync_lock = threading.Lock()
+        self._last_sync = time.time()
+        self._stats_lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0, 'expired': 0, 'invalidations': 0,
+                      'shared_hits': 0, 'remote_invalidations': 0, 'backend_errors': 0, 'stale_skips': 0}
+        self._invalidation_seq = self._backend_call('last_invalidation', default=0)
+        # Todas as chaves de uma sessão ficam na mesma faixa
+        self._stripes = [_CacheStripe() for _ in range(stripes)]
+        # Limites por faixa - cada faixa faz sua própria eviction em O(1)
+        self._max_entries = max(1, max_entries // stripes)
+        self._max_bytes = max(1, max_bytes // stripes)
         
-        print("🧠 ContextCache inicializado")
+        print(f"🧠 ContextCache inicializado - {max_entries} entradas, {max_bytes // 1024}KB, {stripes} faixas")
     
-    def get_context(self, session_id):
-        """Busca contexto do cache (retorna None se precisa recarregar)"""
+    def _stripe(self, session_id):
+        return self._stripes[hash(session_id) % len(self._stripes)]
+    
+    def _count(self, counter, amount=1):
+        with self._stats_lock:
+            self.stats[counter] += amount
+    
+    @staticmethod
+    def _size_of(value):
+        """Tamanho serializado - sys.getsizeof é raso (um dict grande contaria ~184 bytes)"""
+        if isinstance(value, str):
+            return len(value.encode('utf-8'))
+        try:
+            return len(codec.dumps(value))
+        except (TypeError, ValueError):
+            return sys.getsizeof(value)
+    
+    @staticmethod
+    def _backend_key(session_id, key):
+        return f"{session_id}\x1f{key or ''}"
+    
+    def _backend_call(self, method, *args, default=None):
+        """Backend compartilhado é best-effort - falha vira miss, nunca erro"""
+        if self.backend is None:
+            return default
+        try:
+            return getattr(self.backend, method)(*args)
+        except Exception as e:
+            self._count('backend_errors')
+            print(f"❌ Erro no cache compartilhado ({method}): {str(e)[:100]}")
+            return default
+    
+    def _drop_local(self, session_id):
+        stripe = self._stripe(session_id)
+        with stripe.lock:
+            stripe.drop_session(session_id)
+            stripe.invalidated[session_id] = time.monotonic()
+    
+    def _sync_invalidations(self, force=False):
+        """Aplica invalidações feitas por outros workers (no máximo a cada sync_interval)"""
+        if self.backend is None or (not force and time.time() - self._last_sync < self.sync_interval):
+            return
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_sync = time.time()
+            seq, sessions = self._backend_call('invalidations_since', self._invalidation_seq,
+                                               default=(self._invalidation_seq, []))
+            for session_id in sessions:
+                self._drop_local(session_id)
+            self._invalidation_seq = seq
+            if sessions:
+                self._count('remote_invalidations', len(sessions))
+        finally:
+            self._sync_lock.release()
+    
+    def lookup(self, session_id, key=None):
+        """(encontrado, valor) - distingue valor ausente de valor cacheado"""
         if not session_id:
-            return None
-            
-        # Se está marcado como sujo, precisa recarregar
-        if session_id in self._context_dirty:
-            print(f"🔄 Cache MISS - Session {session_id[:8]}... marcada como suja")
-            return None
+            return False, None
+        
+        self._sync_invalidations()
+        entry_key = (session_id, key)
+        stripe = self._stripe(session_id)
+        with stripe.lock:
+            entry = stripe.entries.get(entry_key)
+            if entry is not None and entry[2] < time.time():
+                stripe.drop(entry_key)
+                entry = None
+                self._count('expired')
+            if entry is not None:
+                stripe.entries.move_to_end(entry_key)
         
-        # Se existe no cache, usar
-        if session_id in self._context_cache:
-            self._last_access[session_id] = time.time()
-            print(f"⚡ Cache HIT - Session {session_id[:8]}...")
-            return self._context_cache[session_id]
+        if entry is not None:
+            self._count('hits')
+            return True, entry[0]
         
-        # Cache vazio para esta sessão
-        print(f"📭 Cache EMPTY - Session {session_id[:8]}...")
-        return None
+        shared = self._backend_call('get', self._backend_key(session_id, key))
+        if shared is not None:
+            # Outro worker já calculou este valor - trazer para a memória local
+            value, expires_at = shared
+            self._store_local(session_id, key, value, expires_at)
+            self._count('shared_hits')
+            return True, value
+        
+        self._count('misses')
+        return False, None
+    
+    def get_context(self, session_id, key=None):
+        """Busca contexto do cache (retorna None se precisa recarregar)"""
+        found, value = self.lookup(session_id, key)
+        if session_id:
+            print(f"{'⚡ Cache HIT' if found else '📭 Cache MISS'} - Session {session_id[:8]}...")
+        return value
+    
+    def _store_local(self, session_id, key, context_data, expires_at, since=None):
+        """Tamanho guardado, ou None se a sessão foi invalidada depois de `since`"""
+        size = self._size_of(context_data)
+        if size > self._max_bytes:
+            return size
+        
+        entry_key = (session_id, key)
+        evicted = 0
+        stripe = self._stripe(session_id)
+        with stripe.lock:
+            if since is not None and stripe.invalidated.get(session_id, float('-inf')) >= since:
+                return None
+            if entry_key in stripe.entries:
+                stripe.drop(entry_key)
+            stripe.entries[entry_key] = (context_data, size, expires_at)
+            stripe.sessions.setdefault(session_id, set()).add(key)
+            stripe.bytes += size
+            
+            while len(stripe.entries) > self._max_entries or stripe.bytes > self._max_bytes:
+                stripe.drop(next(iter(stripe.entries)))
+                evicted += 1
+        
+        if evicted:
+            self._count('evictions', evicted)
+        return size
     
-    def set_context(self, session_id, context_data):
-        """Salva contexto no cache e marca como limpo"""
+    def set_context(self, session_id, context_data, ttl=None, key=None, since=None):
+        """Salva contexto no cache (expira após ttl segundos)
+        
+        since: time.monotonic() de quando o valor começou a ser calculado. Se a
+        sessão foi invalidada depois disso (inclusive por outro worker), o valor
+        já nasceu velho e não é guardado.
+        """
         if not session_id:
             return
-            
-        self._context_cache[session_id] = context_data
-        self._context_dirty.discard(session_id)
-        self._last_access[session_id] = time.time()
         
-        print(f"💾 Context cached - Session {session_id[:8]}... ({len(context_data)} chars)")
+        if since is not None:
+            self._sync_invalidations(force=True)
+        expires_at = time.time() + (ttl or self.ttl)
+        size = self._store_local(session_id, key, context_data, expires_at, since)
+        if size is None:
+            self._count('stale_skips')
+            print(f"⏭️ Contexto calculado antes de uma invalidação - não cacheado (Session {session_id[:8]}...)")
+            return
+        self._backend_call('set', self._backend_key(session_id, key), context_data, expires_at)
+        
+        self._count('sets')
+        print(f"💾 Context cached - Session {session_id[:8]}... ({size} bytes)")
     
     def invalidate_context(self, session_id):
-        """Marca contexto como sujo (vai recarregar na próxima)"""
+        """Descarta tudo da sessão em todos os workers (vai recarregar na próxima)"""
         if not session_id:
             return
-            
-        self._context_dirty.add(session_id)
+        
+        self._drop_local(session_id)
+        self._backend_call('invalidate', session_id)
+        
+        self._count('invalidations')
         print(f"🗑️ Context invalidated - Session {session_id[:8]}...")
     
     def cleanup_old_cache(self):
-        """Remove cache antigo (sessões não acessadas há mais de 1 hora)"""
+        """Remove entradas expiradas (o LRU já limita o tamanho)"""
         now = time.time()
-        old_sessions = []
-        
-        for session_id, last_access in self._last_access.items():
-            if now - last_access > 3600:  # 1 hora
-                old_sessions.append(session_id)
+        removed = 0
         
-        for session_id in old_sessions:
-            self._context_cache.pop(session_id, None)
-            self._context_dirty.discard(session_id)
-            self._last_access.pop(session_id, None)
-            print(f"🧹 Cache expired - Session {session_id[:8]}...")
+        horizon = time.monotonic() - self.ttl
+        for stripe in self._stripes:
+            with stripe.lock:
+                expired = [key for key, entry in stripe.entries.items() if entry[2] < now]
+                for key in expired:
+                    stripe.drop(key)
+                # Marcas de invalidação só importam para cálculos em andamento
+                for session_id in [s for s, at in stripe.invalidated.items() if at < horizon]:
+                    del stripe.invalidated[session_id]
+            removed += len(expired)
         
-        return len(old_sessions)
+        removed += self._backend_call('cleanup', default=0)
+        if removed:
+            self._count('expired', removed)
+        return removed
     
     def get_stats(self):
         """Estatísticas do cache"""
-        return {
-            'cached_sessions': len(self._context_cache),
-            'dirty_sessions': len(self._context_dirty),
-            'total_tracked': len(self._last_access)
-        }
+        entries = sessions = total_bytes = 0
+        for stripe in self._stripes:
+            with stripe.lock:
+                entries += len(stripe.entries)
+                sessions += len(stripe.sessions)
+                total_bytes += stripe.bytes
+        
+        with self._stats_lock:
+            stats = dict(self.stats)
+        lookups = stats['hits'] + stats['misses']
+        stats.update({
+            'cached_sessions': sessions,
+            'entries': entries,
+            'bytes': total_bytes,
+            'backend': type(self.backend).__name__ if self.backend else 'local',
+            'hit_rate': round(stats['hits'] / lookups, 3) if lookups else 0
+        })
+        return stats
+
+class ResponseCache:
+    """Cache exato de respostas da IA (LRU + TTL, limitado em bytes)"""
+    
+    def __init__(self, ttl=RESPONSE_CACHE_TTL, max_bytes=RESPONSE_CACHE_MAX_BYTES,
+                 max_entry_bytes=RESPONSE_CACHE_MAX_ENTRY_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries = OrderedDict()  # key -> (expira_em, tamanho, resposta, pensamento)
+        self._bytes = 0
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'expired': 0}
+        
+        print(f"🗄️ ResponseCache inicializado - {max_bytes // (1024 * 1024)}MB, TTL {ttl}s")
+    
+    @staticmethod
+    def make_key(model, options, messages):
+        """Hash de modelo + opções + mensagens normalizadas (espaços colapsados)"""
+        normalized = [
+            {'role': m.get('role'), 'content': ' '.join((m.get('content') or '').split())}
+            for m in messages
+        ]
+        raw = json.dumps({'model': model, 'options': options, 'messages': normalized},
+                         sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+    
+    def _drop(self, key):
+        _, size, _, _ = self._entries.pop(key)
+        self._bytes -= size
+    
+    def get(self, key):
+        """(resposta, pensamento) ou None"""
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            
+            if entry[0] < time.time():
+                self._drop(key)
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[2], entry[3]
+    
+    def set(self, key, answer, thinking=None):
+        thinking = thinking or ''
+        size = len(key) + len(answer.encode('utf-8')) + len(thinking.encode('utf-8'))
+        if size > self.max_entry_bytes:
+            return False
+        
+        with self.lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.time() + self.ttl, size, answer, thinking)
+            self._bytes += size
+            self.stats['stores'] += 1
+            
+            while self._bytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+                self.stats['evictions'] += 1
+        return True
+    
+    def clear(self):
+        with self.lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats.update({'entries': len(self._entries), 'bytes': self._bytes, 'max_bytes': self.max_bytes})
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0
+        return stats
+
+class _VectorIndex:
+    """Índice vetorial em memória de um escopo (vetores normalizados, busca por produto escalar)"""
+    
+    def __init__(self):
+        self.vectors = []
+        self.entries = []  # (expira_em, resposta, pensamento, tempo_geracao)
+        self._matrix = None
+    
+    def add(self, vector, entry, max_entries):
+        self.vectors.append(vector)
+        self.entries.append(entry)
+        if len(self.vectors) > max_entries:
+            del self.vectors[0]
+            del self.entries[0]
+        self._matrix = None
+    
+    def purge_expired(self, now):
+        keep = [i for i, entry in enumerate(self.entries) if entry[0] >= now]
+        if len(keep) != len(self.entries):
+            self.vectors = [self.vectors[i] for i in keep]
+            self.entries = [self.entries[i] for i in keep]
+            self._matrix = None
+        return len(self.entries)
+    
+    def nearest(self, vector):
+        """(similaridade, índice) do vizinho mais próximo"""
+        if not self.vectors:
+            return -1.0, None
+        
+        if np is not None:
+            if self._matrix is None:
+                self._matrix = np.array(self.vectors, dtype=np.float32)
+            scores = self._matrix @ np.array(vector, dtype=np.float32)
+            best = int(scores.argmax())
+            return float(scores[best]), best
+        
+        best, best_score = None, -1.0
+        for i, candidate in enumerate(self.vectors):
+            score = sum(a * b for a, b in zip(candidate, vector))
+            if score > best_score:
+                best, best_score = i, score
+        return best_score, best
+
+
+class SemanticCache:
+    """Cache semântico de respostas: mensagens parafraseadas reaproveitam a resposta"""
+    
+    def __init__(self, threshold=SEMANTIC_CACHE_THRESHOLD, max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+                 max_scopes=SEMANTIC_CACHE_MAX_SCOPES, ttl=SEMANTIC_CACHE_TTL):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_scopes = max_scopes
+        self.ttl = ttl
+        self._scopes = OrderedDict()  # escopo -> _VectorIndex (LRU)
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'latency_saved': 0.0}
+        
+        print(f"🧭 SemanticCache inicializado - limiar {threshold}, {'numpy' if np is not None else 'python puro'}")
+    
+    @staticmethod
+    def scope_for(session_id, model):
+        """Com isolamento ativo o cache NUNCA cruza sessões"""
+        if ENFORCE_SESSION_ISOLATION:
+            if not session_id:
+                return None
+            return f"{model}:{session_id}"
+        return f"{model}:global"
+    
+    @staticmethod
+    def normalize(vector):
+        norm = math.sqrt(sum(v * v for v in vector))
+        if not norm:
+            return None
+        return [v / norm for v in vector]
+    
+    def lookup(self, scope, vector):
+        """(resposta, pensamento, similaridade) do vizinho acima do limiar, ou None"""
+        start = time.time()
+        vector = self.normalize(vector) if vector else None
+        if not scope or vector is None:
+            return None
+        
+        with self.lock:
+            index = self._scopes.get(scope)
+            if index is None or not index.purge_expired(start):
+                self.stats['misses'] += 1
+                return None
+            
+            self._scopes.move_to_end(scope)
+            similarity, best = index.nearest(vector)
+            if best is None or similarity < self.threshold:
+                self.stats['misses'] += 1
+                return None
+            
+            _, answer, thinking, generation_time = index.entries[best]
+            self.stats['hits'] += 1
+            self.stats['latency_saved'] += max(0.0, generation_time - (time.time() - start))
+            return answer, thinking, similarity
+    
+    def add(self, scope, vector, answer, thinking=None, generation_time=0.0):
+        vector = self.normalize(vector) if vector else None
+        if not scope or vector is None or not answer:
+            return False
+        
+        with self.lock:
+            index = self._scopes.get(scope)
+            if index is None:
+                index = self._scopes[scope] = _VectorIndex()
+            self._scopes.move_to_end(scope)
+            index.add(vector, (time.time() + self.ttl, answer, thinking or '', generation_time), self.max_entries)
+            self.stats['stores'] += 1
+            
+            while len(self._scopes) > self.max_scopes:
+                self._scopes.popitem(last=False)
+        return True
+    
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['scopes'] = len(self._scopes)
+            stats['entries'] = sum(len(index.entries) for index in self._scopes.values())
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0
+        stats['latency_saved'] = round(stats['latency_saved'], 2)
+        stats['threshold'] = self.threshold
+        return stats
 
 # Instância global
-context_cache = ContextCache()
+context_cache = ContextCache(backend=create_cache_backend())
+response_cache = ResponseCache()
+semantic_cache = SemanticCache()
 
-def cache_context(timeout=300):
-    """Decorator para cachear funções que retornam contexto"""
+_NOT_CACHEABLE = object()
+
+
+def _default_cache_if(result):
+    """Não cachear falhas ({'status': 'erro'}) nem None"""
+    return result is not None and not (isinstance(result, dict) and result.get('status') == 'erro')
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error')
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def memoize(ttl=300, key_func=None, session_arg='session_id', cache=None, cache_if=_default_cache_if):
+    """Memoização por sessão com TTL e single-flight
+    
+    - session_id é achado pelo nome do parâmetro (posicional ou keyword)
+    - key_func(argumentos) -> chave dentro da sessão (padrão: demais argumentos)
+    - só uma thread calcula uma chave ausente; as outras esperam o resultado
+    - invalidate_context(session_id) descarta todas as chaves da sessão, inclusive
+      o resultado de um cálculo que começou antes da invalidação
+    """
     def decorator(f):
+        signature = inspect.signature(f)
+        namespace = f"{f.__module__}.{f.__qualname__}"
+        flights = {}
+        flights_lock = threading.Lock()
+        
+        def make_key(arguments):
+            if key_func is not None:
+                return f"{namespace}:{key_func(arguments)}"
+            rest = sorted((name, value) for name, value in arguments.items()
+                          if name not in (session_arg, 'self', 'cls'))
+            return f"{namespace}:{rest!r}"
+        
         @wraps(f)
         def wrapper(*args, **kwargs):
-            # Tentar usar cache primeiro
-            session_id = kwargs.get('session_id')
-            cached = context_cache.get_context(session_id)
+            store = cache or context_cache
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            session_id = bound.arguments.get(session_arg)
+            if not session_id:
+                return f(*args, **kwargs)
             
-            if cached is not None:
-                return cached
+            key = make_key(bound.arguments)
+            found, value = store.lookup(session_id, key)
+            if found:
+                return value
             
-            # Cache miss - executar função
-            result = f(*args, **kwargs)
+            flight_key = (session_id, key)
+            with flights_lock:
+                flight = flights.get(flight_key)
+                leader = flight is None
+                if leader:
+                    flight = flights[flight_key] = _Flight()
             
-            # Salvar no cache
-            if result and session_id:
-                context_cache.set_context(session_id, result)
+            if not leader:
+                # Outra thread já está calculando esta chave
+                flight.done.wait()
+                if flight.error is not None:
+                    raise flight.error
+                return flight.result
             
-            return result
+            try:
+                # Invalidação durante o cálculo (ex.: salvar_dados) descarta o resultado
+                started = time.monotonic()
+                flight.result = f(*args, **kwargs)
+                if cache_if(flight.result):
+                    store.set_context(session_id, flight.result, ttl=ttl, key=key, since=started)
+                return flight.result
+            except Exception as e:
+                flight.error = e
+                raise
+            finally:
+                with flights_lock:
+                    flights.pop(flight_key, None)
+                flight.done.set()
+        
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
+
+
+def cache_context(timeout=300):
+    """Decorator para cachear funções que retornam contexto (compatível - usa memoize)"""
+    return memoize(ttl=timeout)
@@ -0,0 +1,204 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from config import MAX_BACKUPS, BACKUP_COALESCE_WINDOW
+from models.json_codec import codec
+
+try:
+    import fcntl  # Lock entre processos (gunicorn) - indisponível no Windows
+except ImportError:
+    fcntl = None
+
+OBJECT_NAME = re.compile(r'^[0-9a-f]{64}$')
+
+
+class ChatBackupStore:
+    """Backups incrementais das conversas, endereçados por conteúdo
+
+    Cada conversa vira um objeto objects/<sha256>.json gravado uma única vez;
+    um snapshot é só a lista (id, hash) da sessão naquele momento, guardada no
+    manifest.json. Conversas que não mudaram entre backups não são regravadas.
+
+    Gravar um snapshot (reler o manifest, reusar/gravar objetos, podar, salvar)
+    roda sob flock exclusivo no diretório de backup da sessão, e a restauração
+    sob flock compartilhado: outro worker não perde snapshots nem apaga um
+    objeto que acabou de ser reaproveitado ou que está sendo lido.
+    """
+
+    def __init__(self, max_snapshots=MAX_BACKUPS, coalesce_window=BACKUP_COALESCE_WINDOW):
+        self.max_snapshots = max_snapshots
+        self.coalesce_window = coalesce_window
+        self.lock = threading.Lock()
+        self._manifests = {}  # diretório -> (mtime_ns do manifest.json, manifest)
+        self.stats = {
+            'snapshots': 0,
+            'coalesced': 0,
+            'objects_written': 0,
+            'objects_reused': 0,
+            'bytes_written': 0,
+            'objects_removed': 0
+        }
+
+    @contextmanager
+    def _dir_lock(self, backup_dir, shared=False):
+        """flock no diretório de backup da sessão (chamar com self.lock, nessa ordem)"""
+        path = backup_dir / '.lock'
+        created = not path.exists()
+        with open(path, 'a+b') as f:
+            if created:
+                os.chmod(path, 0o600)
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            yield  # Fechar o arquivo libera o lock
+
+    # ===== MANIFEST =====
+    def _manifest(self, backup_dir, fresh=False):
+        """Manifest em memória, recarregado só se outro worker alterou o arquivo
+
+        fresh=True ignora o cache (mtime pode não mudar entre duas gravações rápidas);
+        usado sob o flock, antes de modificar o manifest.
+        """
+        path = backup_dir / 'manifest.json'
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return {'snapshots': []}
+
+        cached = self._manifests.get(str(backup_dir))
+        if cached and cached[0] == mtime and not fresh:
+            return cached[1]
+
+        manifest = codec.read_file(path)
+        self._manifests[str(backup_dir)] = (mtime, manifest)
+        return manifest
+
+    def _save_manifest(self, backup_dir, manifest):
+        path = backup_dir / 'manifest.json'
+        codec.write_file(path, manifest)
+        self._manifests[str(backup_dir)] = (path.stat().st_mtime_ns, manifest)
+
+    # ===== OBJETOS =====
+    def _write_object(self, objects_dir, chat):
+        """Grava a conversa se o conteúdo ainda não existe -> (hash, bytes gravados)
+
+        O hash é do JSON canônico (chaves ordenadas), antes da compressão.
+        """
+        data = codec.dumps(chat, sort_keys=True)
+        digest = hashlib.sha256(data).hexdigest()
+        path = objects_dir / f"{digest}.json"
+        if path.exists():
+            return digest, 0
+        return digest, codec.write_bytes(path, data)
+
+    # ===== SNAPSHOTS =====
+    def is_due(self, backup_dir):
+        """False se já existe backup dentro da janela de coalescência"""
+        with self.lock:
+            snapshots = self._manifest(backup_dir)['snapshots']
+            due = not snapshots or time.time() - snapshots[-1]['created_at'] >= self.coalesce_window
+            if not due:
+                self.stats['coalesced'] += 1
+        return due
+
+    def snapshot(self, backup_dir, chats, force=False):
+        """Registra o estado das conversas -> resumo do backup (ou None se coalescido)"""
+        objects_dir = backup_dir / 'objects'
+        objects_dir.mkdir(exist_ok=True)
+
+        with self.lock, self._dir_lock(backup_dir):
+            manifest = self._manifest(backup_dir, fresh=True)
+            snapshots = manifest['snapshots']
+            if not force and snapshots and time.time() - snapshots[-1]['created_at'] < self.coalesce_window:
+                self.stats['coalesced'] += 1
+                return None
+
+            entries, written, bytes_written = [], 0, 0
+            for chat in chats:
+                if not isinstance(chat, dict) or not chat.get('id'):
+                    continue
+                digest, size = self._write_object(objects_dir, chat)
+                entries.append([chat['id'], digest])
+                if size:
+                    written += 1
+                    bytes_written += size
+
+            snapshot = {
+                'id': datetime.now().strftime('%Y%m%d_%H%M%S_%f'),
+                'created_at': time.time(),
+                'chats': entries
+            }
+            manifest = {'snapshots': snapshots + [snapshot]}
+            removed = self._prune(objects_dir, manifest)
+            self._save_manifest(backup_dir, manifest)
+
+            self.stats['snapshots'] += 1
+            self.stats['objects_written'] += written
+            self.stats['objects_reused'] += len(entries) - written
+            self.stats['bytes_written'] += bytes_written
+            self.stats['objects_removed'] += removed
+
+        return {
+            'snapshot_id': snapshot['id'],
+            'total_chats': len(entries),
+            'objetos_novos': written,
+            'bytes_gravados': bytes_written,
+            'objetos_removidos': removed
+        }
+
+    def _prune(self, objects_dir, manifest):
+        """Descarta os snapshots além do limite e os objetos que só eles usavam -> objetos removidos"""
+        excess = len(manifest['snapshots']) - self.max_snapshots
+        if excess <= 0:
+            return 0
+
+        dropped = manifest['snapshots'][:excess]
+        manifest['snapshots'] = manifest['snapshots'][excess:]
+        referenced = {digest for snap in manifest['snapshots'] for _, digest in snap['chats']}
+
+        removed = 0
+        for digest in {digest for snap in dropped for _, digest in snap['chats']} - referenced:
+            if OBJECT_NAME.match(digest):
+                try:
+                    (objects_dir / f"{digest}.json").unlink()
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    def list_snapshots(self, backup_dir):
+        """Snapshots retidos, mais recente primeiro"""
+        with self.lock:
+            snapshots = self._manifest(backup_dir)['snapshots']
+        return [{
+            'snapshot_id': snap['id'],
+            'created_at': datetime.fromtimestamp(snap['created_at']).isoformat(),
+            'total_chats': len(snap['chats'])
+        } for snap in reversed(snapshots)]
+
+    def restore(self, backup_dir, snapshot_id=None):
+        """Conversas de um snapshot (padrão: o mais recente) ou None se não existir"""
+        with self.lock, self._dir_lock(backup_dir, shared=True):
+            snapshots = self._manifest(backup_dir, fresh=True)['snapshots']
+            snapshot = next((snap for snap in reversed(snapshots) if snapshot_id in (None, snap['id'])), None)
+            if snapshot is None:
+                return None
+
+            # Objetos lidos sob o lock: um snapshot concorrente não os poda no meio da leitura
+            chats = []
+            for _, digest in snapshot['chats']:
+                if not OBJECT_NAME.match(digest):
+                    raise ValueError("Manifest de backup inválido")
+                chats.append(codec.read_file(backup_dir / 'objects' / f"{digest}.json"))
+        return chats
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats)
+
+
+# Instância global
+chat_backups = ChatBackupStore()
@@ -0,0 +1,382 @@
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from models.json_codec import codec
+from config import (CHAT_LOG_COMPACT_RATIO, CHAT_LOG_COMPACT_MIN_BYTES, CHAT_LOG_COMPACT_INTERVAL,
+                    CHAT_LOG_INDEX_CACHE_SIZE)
+
+try:
+    import fcntl  # Lock entre processos (gunicorn) - indisponível no Windows
+except ImportError:
+    fcntl = None
+
+# Separa o cabeçalho do registro (op, seq, id, metadados) do JSON da conversa;
+# JSON compacto nunca contém tab cru (dentro de strings ele vira \t)
+RECORD_SEP = b'\t'
+
+
+def chat_meta(chat):
+    """Resumo da conversa para a listagem (sem as mensagens)"""
+    messages = chat.get('messages') if isinstance(chat.get('messages'), list) else []
+    last = messages[-1] if messages and isinstance(messages[-1], dict) else {}
+    return {
+        'id': chat.get('id'),
+        'title': chat.get('title'),
+        'session_id': chat.get('session_id'),
+        'created_at': chat.get('created_at'),
+        'updated_at': chat.get('updated_at'),
+        'message_count': len(messages),
+        'preview': str(last.get('content') or '')[:60],
+        'is_pinned': bool(chat.get('is_pinned')),
+        'thinking_mode': bool(chat.get('thinking_mode'))
+    }
+
+
+class _LogIndex:
+    """Índice em memória de um log: id da conversa -> (offset, tamanho, seq, metadados)"""
+    __slots__ = ('inode', 'end', 'entries', 'live_bytes', 'next_seq')
+
+    def __init__(self, inode):
+        self.inode = inode
+        self.end = 0  # Fim do último registro completo
+        self.entries = {}
+        self.live_bytes = 0
+        self.next_seq = 1
+
+    @property
+    def dead_bytes(self):
+        return self.end - self.live_bytes
+
+
+class ChatLogStore:
+    """Conversas de uma sessão em um log append-only (um registro JSON compacto por linha)
+
+    Salvar uma conversa acrescenta só o registro dela (O(mensagem) de I/O) e o índice
+    em memória aponta para a versão mais recente, com os metadados usados na listagem
+    (título, datas, nº de mensagens). Versões substituídas e exclusões viram espaço
+    morto, recuperado pela compactação em background.
+
+    Cada registro 'put' é `{"op":"put","seq","id","meta"}<TAB>{conversa}`: montar o
+    índice (início a frio, troca de inode, saída do LRU) decodifica só o cabeçalho,
+    nunca o corpo das conversas. Registros antigos (`{"op":"put","seq","chat"}`)
+    continuam legíveis e voltam ao formato novo na próxima compactação.
+    """
+
+    def __init__(self, compact_ratio=CHAT_LOG_COMPACT_RATIO, compact_min_bytes=CHAT_LOG_COMPACT_MIN_BYTES,
+                 compact_interval=CHAT_LOG_COMPACT_INTERVAL, index_cache_size=CHAT_LOG_INDEX_CACHE_SIZE):
+        self.compact_ratio = compact_ratio
+        self.compact_min_bytes = compact_min_bytes
+        self.compact_interval = compact_interval
+        self.index_cache_size = index_cache_size
+        self.lock = threading.Lock()
+        self._path_locks = [threading.RLock() for _ in range(64)]
+        self._indexes = OrderedDict()  # caminho -> _LogIndex (LRU)
+        self._pending = set()  # Logs com espaço morto suficiente para compactar
+        self._thread = None
+        self.stats = {
+            'appends': 0,
+            'bytes_appended': 0,
+            'index_scans': 0,
+            'compactions': 0,
+            'bytes_reclaimed': 0
+        }
+
+    def _path_lock(self, path):
+        return self._path_locks[hash(str(path)) % len(self._path_locks)]
+
+    # ===== ÍNDICE =====
+    def _scan(self, f, index):
+        """Lê os registros completos a partir de index.end (outro worker pode ter acrescentado)"""
+        f.seek(index.end)
+        offset = index.end
+        for line in f:
+            if not line.endswith(b'\n'):
+                break  # Registro pela metade (queda no meio da escrita) - ignorado
+            length = len(line)
+            head, sep, _ = line.partition(RECORD_SEP)
+            try:
+                record = codec.loads(head if sep else line)
+            except ValueError:
+                record = None
+            if isinstance(record, dict):
+                self._apply(index, record, offset, length)
+            offset += length
+            index.end = offset
+
+        with self.lock:
+            self.stats['index_scans'] += 1
+
+    @staticmethod
+    def _apply(index, record, offset, length):
+        """Aplica o cabeçalho de um registro ao índice"""
+        if record.get('op') == 'put':
+            if isinstance(record.get('meta'), dict):
+                chat_id, meta = record.get('id'), record['meta']
+            elif isinstance(record.get('chat'), dict):
+                chat_id, meta = record['chat'].get('id'), chat_meta(record['chat'])  # Registro antigo
+            else:
+                return
+            old = index.entries.get(chat_id)
+            if old:
+                index.live_bytes -= old[1]
+            seq = record.get('seq') or index.next_seq
+            index.entries[chat_id] = (offset, length, seq, meta)
+            index.live_bytes += length
+            index.next_seq = max(index.next_seq, seq + 1)
+        elif record.get('op') == 'del':
+            old = index.entries.pop(record.get('id'), None)
+            if old:
+                index.live_bytes -= old[1]
+
+    def _index(self, path, f):
+        """Índice atualizado para o arquivo aberto em f (chamar com o lock do caminho)"""
+        key = str(path)
+        st = os.fstat(f.fileno())
+        with self.lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+
+        # Arquivo trocado (compactação por outro worker) ou truncado: reconstrói
+        if index is None or index.inode != st.st_ino or st.st_size < index.end:
+            index = _LogIndex(st.st_ino)
+        if st.st_size > index.end:
+            self._scan(f, index)
+
+        with self.lock:
+            self._indexes[key] = index
+            self._indexes.move_to_end(key)
+            while len(self._indexes) > self.index_cache_size:
+                self._indexes.popitem(last=False)
+        return index
+
+    @staticmethod
+    def _encode(record):
+        """Registro -> (linha gravada, cabeçalho aplicado ao índice)"""
+        if record.get('op') != 'put':
+            return codec.dumps(record) + b'\n', record
+        chat = record['chat']
+        header = {'op': 'put', 'seq': record['seq'], 'id': chat.get('id'), 'meta': chat_meta(chat)}
+        return codec.dumps(header) + RECORD_SEP + codec.dumps(chat) + b'\n', header
+
+    @staticmethod
+    def _read_record(f, entry):
+        offset, length = entry[:2]
+        f.seek(offset)
+        data = f.read(length)
+        _, sep, body = data.partition(RECORD_SEP)
+        return codec.loads(body) if sep else codec.loads(data)['chat']
+
+    # ===== LEITURA =====
+    def read_all(self, path):
+        """Conversas vivas, mais nova primeiro -> (lista, bytes vivos)"""
+        if not os.path.exists(path):
+            return [], 0
+        with self._path_lock(path), open(path, 'rb') as f:
+            index = self._index(path, f)
+            entries = sorted(index.entries.values(), key=lambda e: e[2], reverse=True)
+            return [self._read_record(f, entry) for entry in entries], index.live_bytes
+
+    def read(self, path, chat_id):
+        """Uma conversa pelo id (um seek + uma leitura) ou None"""
+        if not os.path.exists(path):
+            return None
+        with self._path_lock(path), open(path, 'rb') as f:
+            entry = self._index(path, f).entries.get(chat_id)
+            return self._read_record(f, entry) if entry else None
+
+    def list(self, path):
+        """Metadados das conversas, mais nova primeiro, sem ler os registros"""
+        if not os.path.exists(path):
+            return []
+        with self._path_lock(path), open(path, 'rb') as f:
+            entries = sorted(self._index(path, f).entries.values(), key=lambda e: e[2], reverse=True)
+        return [dict(entry[3]) for entry in entries]
+
+    # ===== ESCRITA =====
+    def _open_for_append(self, path):
+        """Abre o log com lock exclusivo, garantindo que é o arquivo atual (não um já compactado)"""
+        while True:
+            created = not os.path.exists(path)
+            f = open(path, 'a+b')
+            if created:
+                os.chmod(path, 0o600)
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                if os.fstat(f.fileno()).st_ino == os.stat(path).st_ino:
+                    return f
+            except FileNotFoundError:
+                pass
+            f.close()
+
+    def _append(self, path, make_record):
+        """Acrescenta um registro -> (índice, registro); make_record(índice) monta o registro"""
+        with self._path_lock(path):
+            f = self._open_for_append(path)
+            try:
+                index = self._index(path, f)
+                record = make_record(index)
+                if record is None:
+                    return index, None
+
+                f.seek(0, os.SEEK_END)
+                if f.tell() != index.end:
+                    f.truncate(index.end)  # Descarta registro incompleto no fim
+                line, header = self._encode(record)
+                f.write(line)
+                f.flush()
+                self._apply(index, header, index.end, len(line))
+                index.end += len(line)
+            finally:
+                f.close()
+
+        with self.lock:
+            self.stats['appends'] += 1
+            self.stats['bytes_appended'] += len(line)
+            if index.end >= self.compact_min_bytes and index.dead_bytes >= index.live_bytes * self.compact_ratio:
+                self._pending.add(str(path))
+        return index, record
+
+    def put(self, path, chat):
+        """Grava a versão nova da conversa -> 'criada' ou 'atualizada'"""
+        action = {}
+
+        def make_record(index):
+            entry = index.entries.get(chat['id'])
+            action['value'] = 'atualizada' if entry else 'criada'
+            # Atualização mantém a posição da conversa na lista; nova vai para o topo
+            return {'op': 'put', 'seq': entry[2] if entry else index.next_seq, 'chat': chat}
+
+        self._append(path, make_record)
+        return action['value']
+
+    def delete(self, path, chat_id):
+        """Marca a conversa como excluída -> True se existia"""
+        if not os.path.exists(path):
+            return False
+        _, record = self._append(path, lambda index: {'op': 'del', 'id': chat_id}
+                                 if chat_id in index.entries else None)
+        return record is not None
+
+    def rewrite(self, path, chats):
+        """Substitui o log inteiro pela lista (mais nova primeiro) - escrita atômica"""
+        path = str(path)
+        with self._path_lock(path):
+            lock_file = self._open_for_append(path)  # Cria o log se preciso: o flock vale também na 1ª escrita
+            try:
+                self._write_compacted(path, [(chat, len(chats) - i) for i, chat in enumerate(chats)])
+            finally:
+                lock_file.close()
+
+    def import_once(self, path, source, backup_path, load):
+        """Importa um arquivo antigo de conversas para o log uma única vez -> conversas importadas
+
+        Sob o lock do caminho + flock, re-checa se `source` ainda existe (outra
+        thread/worker pode ter acabado de importar). load(source) devolve a lista
+        (mais nova primeiro) ou None se o arquivo não é importável. Conversas já
+        gravadas no log são mais novas e prevalecem. Ao final `source` vira `backup_path`.
+        """
+        path = str(path)
+        with self._path_lock(path):
+            f = self._open_for_append(path)
+            try:
+                if not os.path.exists(source):
+                    return 0
+                chats = load(source)
+                if chats is None:
+                    return 0
+
+                index = self._index(path, f)
+                current = [(self._read_record(f, entry), entry[2]) for entry in index.entries.values()]
+                known = {chat.get('id') for chat, _ in current}
+                imported = [chat for chat in chats if chat.get('id') not in known]
+                # Importadas abaixo das conversas do log (seq menor = mais antiga)
+                merged = [(chat, len(imported) - i) for i, chat in enumerate(imported)]
+                merged += [(chat, seq + len(imported)) for chat, seq in current]
+                self._write_compacted(path, merged)
+                os.replace(source, backup_path)
+            finally:
+                f.close()
+        return len(imported)
+
+    def _write_compacted(self, path, chats_with_seq):
+        directory, name = os.path.split(path)
+        fd, tmp_path = tempfile.mkstemp(dir=directory or '.', prefix=f".{name}.", suffix='.tmp')  # Já nasce 0600
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chat, seq in sorted(chats_with_seq, key=lambda c: c[1]):
+                    line, _ = self._encode({'op': 'put', 'seq': seq, 'chat': chat})
+                    f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+        with open(path, 'rb') as f:
+            self._index(path, f)
+
+    # ===== COMPACTAÇÃO =====
+    def compact(self, path):
+        """Reescreve o log só com as versões vivas -> bytes recuperados"""
+        path = str(path)
+        if not os.path.exists(path):
+            return 0
+        with self._path_lock(path):
+            f = self._open_for_append(path)
+            try:
+                index = self._index(path, f)
+                before = index.end
+                chats = [(self._read_record(f, entry), entry[2]) for entry in index.entries.values()]
+                self._write_compacted(path, chats)
+            finally:
+                f.close()
+            after = os.path.getsize(path)
+
+        reclaimed = max(0, before - after)
+        with self.lock:
+            self.stats['compactions'] += 1
+            self.stats['bytes_reclaimed'] += reclaimed
+        return reclaimed
+
+    def compact_pending(self):
+        with self.lock:
+            pending, self._pending = self._pending, set()
+        reclaimed = 0
+        for path in pending:
+            try:
+                reclaimed += self.compact(path)
+            except Exception as e:
+                print(f"❌ Erro ao compactar log de chats: {str(e)[:100]}")
+        if reclaimed:
+            print(f"🗜️ Logs de chats compactados: {len(pending)} arquivos, {reclaimed // 1024}KB recuperados")
+        return reclaimed
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._worker, daemon=True, name="chat-log-compactor")
+        self._thread.start()
+
+    def _worker(self):
+        while True:
+            time.sleep(self.compact_interval)
+            self.compact_pending()
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['indexes_cached'] = len(self._indexes)
+            stats['pending_compaction'] = len(self._pending)
+        return stats
+
+
+# Instância global
+chat_log = ChatLogStore()
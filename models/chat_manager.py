@@ -1,13 +1,17 @@
-import json
-import shutil
 import os
 import re
 from datetime import datetime
 from pathlib import Path
-from config import CHAT_HISTORY_FILE, BACKUPS_DIR, EXPORTS_DIR, MAX_BACKUPS
+from config import CHAT_HISTORY_FILE, BACKUPS_DIR, EXPORTS_DIR, AUTO_BACKUP
+from models.chat_backup import chat_backups
+from models.chat_store import create_chat_store
+from models.json_codec import codec
 
 class ChatManager:
-    def __init__(self):
+    def __init__(self, store=None, backups=chat_backups):
+        # Backend de armazenamento (CHAT_STORE_BACKEND): log por sessão ou SQLite
+        self.store = store or create_chat_store(path_for=self._get_log_file)
+        self.backups = backups
         self.base_history_dir = Path(CHAT_HISTORY_FILE).parent / "sessions"
         self.base_history_dir.mkdir(exist_ok=True)
         
@@ -70,14 +74,17 @@ class ChatManager:
         print(f"🔒 Diretório seguro criado: {resolved_session_dir}")
         return resolved_session_dir
     
-    def _get_session_file(self, session_id):
+    SESSION_FILES = ("chats.log", "chats.json", "summary.json")
+    
+    def _get_session_file(self, session_id, safe_filename="chats.log"):
         """🔒 BLINDADO: Retorna arquivo específico da sessão"""
         try:
             # 1. Obter diretório seguro
             session_dir = self._get_safe_session_dir(session_id)
             
             # 2. Nome do arquivo fixo (não baseado em input do usuário)
-            safe_filename = "chats.json"
+            if safe_filename not in self.SESSION_FILES:
+                raise ValueError("Arquivo de sessão não permitido")
             
             # 3. Construir caminho final
             session_file = session_dir / safe_filename
@@ -119,45 +126,57 @@ class ChatManager:
         
         return filename
     
+    def _get_log_file(self, session_id):
+        """🔒 Log append-only da sessão (backend 'log'), importando o chats.json antigo na primeira vez"""
+        log_file = self._get_session_file(session_id)
+        legacy_file = self._get_session_file(session_id, "chats.json")
+        if not legacy_file.exists():
+            return log_file
+        
+        def load_legacy(path):
+            data = codec.read_file(path)
+            if not isinstance(data, list):
+                return None
+            return [chat for chat in data[:1000] if isinstance(chat, dict)]
+        
+        # Sob lock do log (threads + workers): só uma requisição importa, as outras
+        # esperam e encontram o chats.json já renomeado
+        imported = self.store.log.import_once(log_file, legacy_file, legacy_file.with_suffix('.json.backup'),
+                                              load_legacy)
+        if imported:
+            print(f"📦 chats.json da sessão {session_id[:8]}... convertido para log: {imported} conversas")
+        return log_file
+    
     def load_history(self, session_id=None):
         """🔒 SEGURO: Carregar histórico APENAS da sessão específica"""
         if not session_id:
             return []
         
         try:
-            session_file = self._get_session_file(session_id)
-            
-            if session_file.exists():
-                # Verificar tamanho do arquivo (proteção DoS)
-                file_size = session_file.stat().st_size
-                if file_size > 50 * 1024 * 1024:  # 50MB máximo
-                    print(f"⚠️ Arquivo muito grande: {file_size} bytes")
-                    return []
-                
-                with open(session_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                # Validar estrutura dos dados
-                if not isinstance(data, list):
-                    print(f"❌ Estrutura inválida do arquivo")
-                    return []
-                
-                # Limitar número de conversas (proteção memória)
-                if len(data) > 1000:
-                    print(f"⚠️ Muitas conversas, limitando a 1000")
-                    data = data[:1000]
-                
-                print(f"📂 Histórico carregado SEGURAMENTE da sessão {session_id[:8]}...: {len(data)} conversas")
-                return data
-            
-            print(f"📂 Nenhum histórico para sessão {session_id[:8]}... - criando novo")
-            return []
+            data, live_bytes = self.store.read_all(self._validate_session_id(session_id))
+            
+            if not data:
+                print(f"📂 Nenhum histórico para sessão {session_id[:8]}... - criando novo")
+                return []
+            
+            # Verificar tamanho do histórico (proteção DoS)
+            if live_bytes > 50 * 1024 * 1024:  # 50MB máximo
+                print(f"⚠️ Histórico muito grande: {live_bytes} bytes")
+                return []
+            
+            # Limitar número de conversas (proteção memória)
+            if len(data) > 1000:
+                print(f"⚠️ Muitas conversas, limitando a 1000")
+                data = data[:1000]
+            
+            print(f"📂 Histórico carregado SEGURAMENTE da sessão {session_id[:8]}...: {len(data)} conversas")
+            return data
             
         except Exception as e:
             print(f"❌ Erro SEGURO ao carregar histórico da sessão {session_id[:8]}...: {str(e)[:100]}")
             return []
     
-    def save_history(self, chat_history, session_id=None):
+    def save_history(self, chat_history, session_id=None, backup=AUTO_BACKUP):
         if not session_id:
             print("❌ session_id é obrigatório para salvar histórico")
             return False
@@ -171,14 +190,10 @@ class ChatManager:
             chat_history = chat_history[:1000]
         
         try:
-            session_file = self._get_session_file(session_id)
-        
-            if session_file.exists():
+            safe_session_id = self._validate_session_id(session_id)
+            if backup:
                 self._create_backup(session_id)
         
-            session_dir = session_file.parent
-            session_dir.mkdir(parents=True, exist_ok=True)
-        
         # Adicionar thinking ao chat_history se presente
             updated_history = []
             for chat in chat_history:
@@ -188,10 +203,8 @@ class ChatManager:
                         chat['thinking'] = last_message['thinking']
                 updated_history.append(chat)
         
-            with open(session_file, 'w', encoding='utf-8') as f:
-                json.dump(updated_history, f, ensure_ascii=False, indent=2)
-        
-            os.chmod(session_file, 0o600)
+            # Lista inteira: substitui o histórico da sessão de uma vez (escrita atômica)
+            self.store.rewrite(safe_session_id, updated_history)
         
             print(f"💾 Histórico salvo SEGURAMENTE para sessão {session_id[:8]}...: {len(updated_history)} conversas")
             return True
@@ -200,6 +213,58 @@ class ChatManager:
             print(f"❌ Erro SEGURO ao salvar histórico da sessão {session_id[:8]}...: {str(e)[:100]}")
             return False
     
+    def load_summary(self, session_id):
+        """🔒 SEGURO: Resumo acumulado da conversa da sessão (ou None)"""
+        if not session_id:
+            return None
+        
+        try:
+            summary_file = self._get_session_file(session_id, "summary.json")
+            if not summary_file.exists():
+                return None
+            
+            data = codec.read_file(summary_file)
+            
+            # Verificação DUPLA de segurança (diretório usa só o prefixo do session_id)
+            if not isinstance(data, dict) or data.get('session_id') != session_id:
+                return None
+            return data
+            
+        except Exception as e:
+            print(f"❌ Erro SEGURO ao carregar resumo da sessão {session_id[:8]}...: {str(e)[:100]}")
+            return None
+    
+    def save_summary(self, session_id, summary_data):
+        """🔒 SEGURO: Salvar resumo da conversa ao lado dos chats da sessão"""
+        if not session_id or not isinstance(summary_data, dict):
+            return False
+        
+        try:
+            summary_file = self._get_session_file(session_id, "summary.json")
+            data = dict(summary_data, session_id=session_id, updated_at=datetime.now().isoformat())
+            
+            # Escrita atômica - o leitor nunca vê um resumo pela metade
+            codec.write_file(summary_file, data)
+            return True
+            
+        except Exception as e:
+            print(f"❌ Erro SEGURO ao salvar resumo da sessão {session_id[:8]}...: {str(e)[:100]}")
+            return False
+    
+    def delete_summary(self, session_id):
+        """🔒 SEGURO: Remover resumo da sessão (nova conversa)"""
+        if not session_id:
+            return False
+        
+        try:
+            summary_file = self._get_session_file(session_id, "summary.json")
+            if summary_file.exists():
+                summary_file.unlink()
+            return True
+        except Exception as e:
+            print(f"❌ Erro SEGURO ao remover resumo da sessão {session_id[:8]}...: {str(e)[:100]}")
+            return False
+    
     def _get_safe_backup_dir(self, session_id):
         """🔒 Diretório seguro para backups"""
         safe_session_id = self._validate_session_id(session_id)
@@ -216,68 +281,81 @@ class ChatManager:
         resolved_backup.mkdir(parents=True, exist_ok=True)
         return resolved_backup
     
-    def _create_backup(self, session_id):
-        """🔒 SEGURO: Criar backup automático da sessão"""
+    def _create_backup(self, session_id, force=False):
+        """🔒 SEGURO: Backup incremental automático da sessão (só conversas alteradas)"""
         try:
-            session_file = self._get_session_file(session_id)
-            if not session_file.exists():
+            backup_dir = self._get_safe_backup_dir(session_id)
+            
+            # Coalescência: no máximo um backup por janela (sem carregar o histórico)
+            if not force and not self.backups.is_due(backup_dir):
                 return
             
-            # Gerar timestamp seguro
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            # Sanitizar timestamp (paranoia)
-            timestamp = re.sub(r'[^\w]', '_', timestamp)
+            history = self.load_history(session_id=session_id)
+            if not history:
+                return
             
-            backup_dir = self._get_safe_backup_dir(session_id)
-            backup_filename = f'backup_{timestamp}.json'
-            backup_file = backup_dir / backup_filename
+            result = self.backups.snapshot(backup_dir, history, force=force)
+            if result:
+                print(f"🔄 Backup SEGURO criado para sessão {session_id[:8]}...: {result['snapshot_id']} "
+                      f"({result['objetos_novos']} de {result['total_chats']} conversas gravadas)")
             
-            # Verificar se backup file está seguro
-            resolved_backup_file = backup_file.resolve()
-            try:
-                resolved_backup_file.relative_to(backup_dir)
-            except ValueError:
-                raise ValueError("Tentativa de escapar diretório de backup")
+        except Exception as e:
+            print(f"❌ Erro SEGURO ao criar backup da sessão {session_id[:8]}...: {str(e)[:100]}")
+    
+    def list_backups(self, session_id=None):
+        """🔒 SEGURO: Pontos de restauração retidos DA SESSÃO"""
+        if not session_id:
+            return {'status': 'erro', 'message': 'session_id é obrigatório'}
+        
+        try:
+            backups = self.backups.list_snapshots(self._get_safe_backup_dir(session_id))
+            return {'status': 'sucesso', 'backups': backups, 'total': len(backups)}
+        except Exception as e:
+            print(f"❌ Erro SEGURO ao listar backups da sessão {session_id[:8]}...: {str(e)[:100]}")
+            return {'status': 'erro', 'message': 'Erro ao listar backups'}
+    
+    def restore_backup(self, session_id=None, snapshot_id=None):
+        """🔒 SEGURO: Restaurar o histórico DA SESSÃO a partir de um backup (padrão: o mais recente)"""
+        if not session_id:
+            return {'status': 'erro', 'message': 'session_id é obrigatório'}
+        
+        try:
+            chats = self.backups.restore(self._get_safe_backup_dir(session_id), snapshot_id)
+            if chats is None:
+                return {'status': 'erro', 'message': 'Backup não encontrado'}
             
-            shutil.copy2(session_file, resolved_backup_file)
+            # Verificação DUPLA de segurança (diretório de backup usa só o prefixo do session_id)
+            chats = [chat for chat in chats if chat.get('session_id') == session_id]
             
-            # Permissões seguras
-            os.chmod(resolved_backup_file, 0o600)
+            # Estado atual vira um ponto de restauração antes de ser substituído
+            self._create_backup(session_id, force=True)
+            if not self.save_history(chats, session_id=session_id, backup=False):
+                return {'status': 'erro', 'message': 'Falha ao restaurar backup'}
             
-            # Limpar backups antigos da sessão
-            self._cleanup_old_backups(session_id)
-            print(f"🔄 Backup SEGURO criado para sessão {session_id[:8]}...: {backup_file.name}")
+            print(f"♻️ Backup restaurado SEGURAMENTE na sessão {session_id[:8]}...: {len(chats)} conversas")
+            return {'status': 'sucesso', 'total_chats': len(chats)}
             
         except Exception as e:
-            print(f"❌ Erro SEGURO ao criar backup da sessão {session_id[:8]}...: {str(e)[:100]}")
+            print(f"❌ Erro SEGURO ao restaurar backup da sessão {session_id[:8]}...: {str(e)[:100]}")
+            return {'status': 'erro', 'message': 'Erro ao restaurar backup'}
     
-    def _cleanup_old_backups(self, session_id):
-        """🔒 SEGURO: Manter apenas os últimos backups da sessão"""
+    INDEX_ONLY_FIELDS = ("message_count", "preview")
+    
+    def list_chats(self, session_id=None, limit=None, offset=0):
+        """🔒 SEGURO: Página da lista da sessão só com os metadados (sem carregar mensagens)"""
+        if not session_id:
+            return {'status': 'erro', 'message': 'session_id é obrigatório'}
+        
         try:
-            backup_dir = self._get_safe_backup_dir(session_id)
-            
-            # Listar apenas arquivos .json que começam com 'backup_'
-            backups = []
-            for file in backup_dir.iterdir():
-                if (file.is_file() and 
-                    file.name.startswith('backup_') and 
-                    file.name.endswith('.json') and
-                    len(file.name) < 50):  # Limitar tamanho do nome
-                    backups.append(file)
-            
-            # Ordenar por data de modificação
-            backups.sort(key=lambda x: x.stat().st_mtime)
-            
-            # Remover backups antigos
-            while len(backups) > MAX_BACKUPS:
-                oldest = backups.pop(0)
-                # Verificação final antes de deletar
-                if oldest.parent == backup_dir:
-                    oldest.unlink()
-                    print(f"🗑️ Backup antigo removido SEGURAMENTE da sessão {session_id[:8]}...: {oldest.name}")
-                
+            limit = min(int(limit), 1000) if limit else 1000  # Proteção memória
+            offset = max(int(offset or 0), 0)
+            chats, total = self.store.list(self._validate_session_id(session_id), limit=limit, offset=offset)
+            # Verificação DUPLA de segurança
+            chats = [chat for chat in chats if chat.get('session_id') == session_id]
+            return {'status': 'sucesso', 'chats': chats, 'total': total, 'limit': limit, 'offset': offset}
         except Exception as e:
-            print(f"❌ Erro SEGURO ao limpar backups da sessão {session_id[:8]}...: {str(e)[:100]}")
+            print(f"❌ Erro SEGURO ao listar chats da sessão {session_id[:8]}...: {str(e)[:100]}")
+            return {'status': 'erro', 'message': 'Erro ao listar conversas'}
     
     def get_chat_by_id(self, chat_id, session_id=None):
         """🔒 SEGURO: Buscar chat por ID APENAS na sessão específica"""
@@ -294,18 +372,18 @@ class ChatManager:
             print("❌ chat_id muito longo")
             return None
         
-        history = self.load_history(session_id=session_id)
+        try:
+            chat = self.store.read(self._validate_session_id(session_id), chat_id)
+        except Exception as e:
+            print(f"❌ Erro SEGURO ao buscar chat da sessão {session_id[:8]}...: {str(e)[:100]}")
+            return None
         
-        for chat in history:
-            if not isinstance(chat, dict):
-                continue
-                
-            if chat.get('id') == chat_id:
-                # Verificação DUPLA de segurança
-                if chat.get('session_id') != session_id:
-                    print(f"🚫 ALERTA DE SEGURANÇA: Chat {chat_id[:20]} com session_id inconsistente!")
-                    return None
-                return chat
+        if chat is not None:
+            # Verificação DUPLA de segurança
+            if chat.get('session_id') != session_id:
+                print(f"🚫 ALERTA DE SEGURANÇA: Chat {chat_id[:20]} com session_id inconsistente!")
+                return None
+            return chat
         
         print(f"❌ Chat {chat_id[:20]} não encontrado na sessão {session_id[:8]}...")
         return None
@@ -336,42 +414,25 @@ class ChatManager:
             if len(chat_data['messages']) > 500:
                 chat_data['messages'] = chat_data['messages'][:500]
         
-        # Carregar histórico APENAS da sessão
-        history = self.load_history(session_id=session_id)
+        # Campos calculados pelo índice (o cliente pode reenviar o que recebeu na listagem)
+        for field in self.INDEX_ONLY_FIELDS:
+            chat_data.pop(field, None)
+        
         chat_id = chat_data.get('id')
         
-        # Verificar se é atualização ou nova conversa
-        existing_index = next((i for i, chat in enumerate(history) 
-                              if isinstance(chat, dict) and chat.get('id') == chat_id), -1)
-        
-        if existing_index >= 0:
-            # Atualizar conversa existente
-            history[existing_index] = chat_data
-            action = 'atualizada'
-            print(f"🔄 Conversa atualizada SEGURAMENTE na sessão {session_id[:8]}...: {chat_data.get('title', 'Sem título')[:30]}")
-        else:
-            # Nova conversa
-            history.insert(0, chat_data)
-            action = 'criada'
-            print(f"🆕 Nova conversa criada SEGURAMENTE na sessão {session_id[:8]}...: {chat_data.get('title', 'Sem título')[:30]}")
-        
-        # Salvar SEM backup automático
+        # Acrescenta só esta conversa ao log da sessão (O(mensagem), sem reescrever o histórico)
         try:
-            session_file = self._get_session_file(session_id)
-            
-            # Criar backup manual antes de salvar
-            if session_file.exists():
-                backup_content = session_file.read_text(encoding='utf-8')
-                backup_file = session_file.with_suffix('.json.backup')
-                backup_file.write_text(backup_content, encoding='utf-8')
-            
-            with open(session_file, 'w', encoding='utf-8') as f:
-                json.dump(history, f, ensure_ascii=False, indent=2)
+            safe_session_id = self._validate_session_id(session_id)
+            # Ponto de restauração antes de gravar (coalescido: no máximo um por janela)
+            if AUTO_BACKUP:
+                self._create_backup(session_id)
             
-            # Permissões seguras
-            os.chmod(session_file, 0o600)
+            action = self.store.put(safe_session_id, chat_data)
             
-            print(f"💾 Histórico salvo SEGURAMENTE para sessão {session_id[:8]}... SEM backup: {len(history)} conversas")
+            if action == 'atualizada':
+                print(f"🔄 Conversa atualizada SEGURAMENTE na sessão {session_id[:8]}...: {chat_data.get('title', 'Sem título')[:30]}")
+            else:
+                print(f"🆕 Nova conversa criada SEGURAMENTE na sessão {session_id[:8]}...: {chat_data.get('title', 'Sem título')[:30]}")
             return {'status': 'sucesso', 'action': action, 'chat_id': chat_id}
         
         except Exception as e:
@@ -388,30 +449,22 @@ class ChatManager:
             print("❌ chat_id inválido")
             return {'status': 'erro', 'message': 'chat_id inválido'}
         
-        # Carregar histórico APENAS da sessão
-        history = self.load_history(session_id=session_id)
-        
-        # Encontrar e remover o chat com validação DUPLA
-        chat_to_delete = None
-        history_filtered = []
-        
-        for chat in history:
-            if not isinstance(chat, dict):
-                continue
-                
-            if chat.get('id') == chat_id:
-                # Verificação DUPLA de segurança
-                if chat.get('session_id') != session_id:
-                    print(f"🚫 ALERTA DE SEGURANÇA: Tentativa de deletar chat de outra sessão!")
-                    return {'status': 'erro', 'message': 'Chat não encontrado ou sem permissão'}
-                chat_to_delete = chat
-            else:
-                history_filtered.append(chat)
+        # Verificação DUPLA de segurança antes de gravar a exclusão
+        chat_to_delete = self.get_chat_by_id(chat_id, session_id=session_id)
+        if not chat_to_delete:
+            return {'status': 'erro', 'message': 'Conversa não encontrada'}
         
-        if chat_to_delete:
-            if self.save_history(history_filtered, session_id=session_id):
+        try:
+            safe_session_id = self._validate_session_id(session_id)
+            # Exclusão é destrutiva: sempre deixa um ponto de restauração com a conversa (fura a coalescência)
+            if AUTO_BACKUP:
+                self._create_backup(session_id, force=True)
+
+            if self.store.delete(safe_session_id, chat_id):
                 print(f"🗑️ Conversa excluída SEGURAMENTE da sessão {session_id[:8]}...: {chat_to_delete.get('title', 'Sem título')[:30]}")
                 return {'status': 'sucesso', 'message': 'Conversa excluída'}
+        except Exception as e:
+            print(f"❌ Erro SEGURO ao excluir chat da sessão {session_id[:8]}...: {str(e)[:100]}")
             return {'status': 'erro', 'message': 'Falha ao salvar após exclusão'}
         
         return {'status': 'erro', 'message': 'Conversa não encontrada'}
@@ -439,7 +492,7 @@ class ChatManager:
                 safe_title = safe_title[:30]
             
             # Nome do arquivo seguro
-            filename = f"chat_{session_id[:8]}_{safe_title}_{timestamp}.json"
+            filename = f"chat_{session_id[:8]}_{safe_title}_{timestamp}.json{codec.suffix}"
             filename = re.sub(r'[^\w\-_\.]', '_', filename)
             
             # Diretório de export seguro
@@ -456,11 +509,8 @@ class ChatManager:
             # Criar diretório se necessário
             export_base.mkdir(parents=True, exist_ok=True)
             
-            with open(resolved_export, 'w', encoding='utf-8') as f:
-                json.dump(chat, f, ensure_ascii=False, indent=2)
-            
-            # Permissões seguras
-            os.chmod(resolved_export, 0o600)
+            # JSON compacto (e comprimido, se configurado) com permissões seguras
+            codec.write_file(resolved_export, chat)
             
             print(f"📤 Conversa exportada SEGURAMENTE da sessão {session_id[:8]}...: {filename}")
             return {
@@ -486,7 +536,7 @@ class ChatManager:
             timestamp = re.sub(r'[^\w]', '_', timestamp)
             
             backup_dir = self._get_safe_backup_dir(session_id)
-            backup_filename = f'manual_backup_{timestamp}.json'
+            backup_filename = f'manual_backup_{timestamp}.json{codec.suffix}'
             backup_file = backup_dir / backup_filename
             
             # Verificação final de segurança
@@ -496,11 +546,7 @@ class ChatManager:
             except ValueError:
                 raise ValueError("Tentativa de escapar diretório de backup")
             
-            with open(resolved_backup_file, 'w', encoding='utf-8') as f:
-                json.dump(history, f, ensure_ascii=False, indent=2)
-            
-            # Permissões seguras
-            os.chmod(resolved_backup_file, 0o600)
+            codec.write_file(resolved_backup_file, history)
             
             print(f"💾 Backup manual SEGURO criado para sessão {session_id[:8]}...: {backup_file.name}")
             return {
@@ -519,42 +565,16 @@ class ChatManager:
             return {'status': 'erro', 'message': 'session_id é obrigatório'}
         
         try:
-            history = self.load_history(session_id=session_id)
-            
-            if not history:
-                return {
-                    'session_id': session_id[:8] + "...",
-                    'total_chats': 0,
-                    'total_messages': 0,
-                    'oldest_chat': None,
-                    'newest_chat': None,
-                    'file_size': 0
-                }
-            
-            # Calcular estatísticas com validação
-            total_messages = 0
-            dates = []
-            
-            for chat in history:
-                if isinstance(chat, dict):
-                    messages = chat.get('messages', [])
-                    if isinstance(messages, list):
-                        total_messages += len(messages)
-                    
-                    created_at = chat.get('created_at')
-                    if created_at and isinstance(created_at, str):
-                        dates.append(created_at)
-            
-            session_file = self._get_session_file(session_id)
-            file_size = session_file.stat().st_size if session_file.exists() else 0
+            # Agregado do backend - não carrega as conversas
+            stats = self.store.stats(self._validate_session_id(session_id))
             
             return {
                 'session_id': session_id[:8] + "...",
-                'total_chats': len(history),
-                'total_messages': total_messages,
-                'oldest_chat': min(dates) if dates else None,
-                'newest_chat': max(dates) if dates else None,
-                'file_size': min(file_size, 100 * 1024 * 1024)  # Limitar retorno
+                'total_chats': stats['total_chats'],
+                'total_messages': stats['total_messages'],
+                'oldest_chat': stats['oldest_chat'],
+                'newest_chat': stats['newest_chat'],
+                'file_size': min(stats['size_bytes'], 100 * 1024 * 1024)  # Limitar retorno
             }
             
         except Exception as e:
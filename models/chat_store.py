@@ -0,0 +1,276 @@
+import os
+from config import CHAT_STORE_BACKEND, CHAT_STORE_DB_FILE
+from models.chat_log import chat_log, chat_meta
+from models.db_pool import SQLitePool
+from models.json_codec import codec
+
+
+class LogChatStore:
+    """Backend de arquivos: chats.log append-only por sessão (ChatLogStore)
+
+    path_for(session_id) resolve o arquivo da sessão com as validações de
+    path traversal do ChatManager.
+    """
+
+    def __init__(self, path_for, log=chat_log):
+        self.path_for = path_for
+        self.log = log
+
+    def list(self, session_id, limit=None, offset=0):
+        """(metadados da página, total) - mais nova primeiro"""
+        chats = [chat for chat in self.log.list(self.path_for(session_id)) if chat.get('session_id') == session_id]
+        end = offset + limit if limit else None
+        return chats[offset:end], len(chats)
+
+    def read_all(self, session_id):
+        """(conversas completas, bytes)"""
+        return self.log.read_all(self.path_for(session_id))
+
+    def read(self, session_id, chat_id):
+        return self.log.read(self.path_for(session_id), chat_id)
+
+    def put(self, session_id, chat):
+        return self.log.put(self.path_for(session_id), chat)
+
+    def delete(self, session_id, chat_id):
+        return self.log.delete(self.path_for(session_id), chat_id)
+
+    def rewrite(self, session_id, chats):
+        self.log.rewrite(self.path_for(session_id), chats)
+
+    def stats(self, session_id):
+        chats, _ = self.list(session_id)
+        dates = [chat['created_at'] for chat in chats if isinstance(chat.get('created_at'), str)]
+        path = self.path_for(session_id)
+        return {
+            'total_chats': len(chats),
+            'total_messages': sum(chat['message_count'] for chat in chats),
+            'oldest_chat': min(dates) if dates else None,
+            'newest_chat': max(dates) if dates else None,
+            'size_bytes': os.path.getsize(path) if os.path.exists(path) else 0
+        }
+
+    def start(self):
+        self.log.start()  # Compactação em background
+
+    def get_stats(self):
+        return dict(self.log.get_stats(), backend='log')
+
+
+class SQLiteChatStore:
+    """Backend SQLite: tabelas chats + chat_messages em um banco WAL compartilhado
+
+    Escritas de vários workers são serializadas pelo SQLite; a listagem
+    paginada e as estatísticas saem só da tabela chats, sem ler mensagens.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS chats (
+            session_id TEXT NOT NULL,
+            chat_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            title TEXT,
+            created_at TEXT,
+            updated_at TEXT,
+            message_count INTEGER NOT NULL DEFAULT 0,
+            preview TEXT,
+            is_pinned INTEGER NOT NULL DEFAULT 0,
+            thinking_mode INTEGER NOT NULL DEFAULT 0,
+            tamanho INTEGER NOT NULL DEFAULT 0,
+            dados TEXT NOT NULL,
+            PRIMARY KEY (session_id, chat_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_chats_sessao_seq ON chats(session_id, seq);
+
+        CREATE TABLE IF NOT EXISTS chat_messages (
+            session_id TEXT NOT NULL,
+            chat_id TEXT NOT NULL,
+            posicao INTEGER NOT NULL,
+            role TEXT,
+            dados TEXT NOT NULL,
+            PRIMARY KEY (session_id, chat_id, posicao)
+        ) WITHOUT ROWID;
+    """
+
+    UPSERT_CHAT_SQL = """
+        INSERT INTO chats (session_id, chat_id, seq, title, created_at, updated_at, message_count,
+                           preview, is_pinned, thinking_mode, tamanho, dados)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(session_id, chat_id) DO UPDATE SET
+            seq = excluded.seq,
+            title = excluded.title,
+            created_at = excluded.created_at,
+            updated_at = excluded.updated_at,
+            message_count = excluded.message_count,
+            preview = excluded.preview,
+            is_pinned = excluded.is_pinned,
+            thinking_mode = excluded.thinking_mode,
+            tamanho = excluded.tamanho,
+            dados = excluded.dados
+    """
+
+    # O cliente reenvia a conversa inteira a cada save - só as mensagens que mudaram são reescritas
+    UPSERT_MESSAGE_SQL = """
+        INSERT INTO chat_messages (session_id, chat_id, posicao, role, dados) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(session_id, chat_id, posicao) DO UPDATE SET role = excluded.role, dados = excluded.dados
+        WHERE chat_messages.dados IS NOT excluded.dados
+    """
+
+    LIST_SQL = """
+        SELECT chat_id, title, session_id, created_at, updated_at, message_count, preview, is_pinned, thinking_mode
+        FROM chats WHERE session_id = ? ORDER BY seq DESC LIMIT ? OFFSET ?
+    """
+
+    STATS_SQL = """
+        SELECT COUNT(*), COALESCE(SUM(message_count), 0), MIN(created_at), MAX(created_at), COALESCE(SUM(tamanho), 0)
+        FROM chats WHERE session_id = ?
+    """
+
+    META_FIELDS = ('id', 'title', 'session_id', 'created_at', 'updated_at', 'message_count', 'preview',
+                   'is_pinned', 'thinking_mode')
+
+    def __init__(self, db_file=CHAT_STORE_DB_FILE, pool=None):
+        self.pool = pool or SQLitePool(db_file)
+        with self.pool.connection() as conn:
+            conn.executescript(self.SCHEMA)
+        print(f"🗄️ Histórico de conversas em SQLite: {self.pool.db_file}")
+
+    @staticmethod
+    def _dumps(value):
+        return codec.dumps(value).decode('utf-8')
+
+    def _put(self, conn, session_id, chat, seq=None):
+        """Grava a conversa na transação aberta -> 'criada' ou 'atualizada'"""
+        chat_id = chat['id']
+        row = conn.execute("SELECT seq FROM chats WHERE session_id = ? AND chat_id = ?", (session_id, chat_id)).fetchone()
+        if seq is None:
+            # Atualização mantém a posição da conversa na lista; nova vai para o topo
+            seq = row[0] if row else conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) + 1 FROM chats WHERE session_id = ?", (session_id,)).fetchone()[0]
+
+        messages = chat.get('messages') if isinstance(chat.get('messages'), list) else []
+        encoded = [self._dumps(message) for message in messages]
+        dados = self._dumps({key: value for key, value in chat.items() if key != 'messages'})
+        meta = chat_meta(chat)
+
+        conn.execute(self.UPSERT_CHAT_SQL, (
+            session_id, chat_id, seq, meta['title'], meta['created_at'], meta['updated_at'], meta['message_count'],
+            meta['preview'], meta['is_pinned'], meta['thinking_mode'], len(dados) + sum(map(len, encoded)), dados
+        ))
+        conn.executemany(self.UPSERT_MESSAGE_SQL, [
+            (session_id, chat_id, position, message.get('role') if isinstance(message, dict) else None, data)
+            for position, (message, data) in enumerate(zip(messages, encoded))
+        ])
+        conn.execute("DELETE FROM chat_messages WHERE session_id = ? AND chat_id = ? AND posicao >= ?",
+                     (session_id, chat_id, len(messages)))
+        return 'atualizada' if row else 'criada'
+
+    # Mensagens em ordem de posição - varredura da chave primária, sem ordenação extra
+    SESSION_MESSAGES_SQL = "SELECT chat_id, dados FROM chat_messages WHERE session_id = ? ORDER BY chat_id, posicao"
+    CHAT_MESSAGES_SQL = "SELECT chat_id, dados FROM chat_messages WHERE session_id = ? AND chat_id = ? ORDER BY posicao"
+
+    @staticmethod
+    def _load(rows, message_rows):
+        """Conversas completas a partir das linhas (chat_id, dados) de chats, na ordem recebida,
+        e de chat_messages (agrupadas aqui, não com IN (?, ?, ...) - limite de variáveis do SQLite)"""
+        chats = {chat_id: codec.loads(dados) for chat_id, dados in rows}
+        for chat in chats.values():
+            chat['messages'] = []
+
+        for chat_id, dados in message_rows:
+            chat = chats.get(chat_id)
+            if chat is not None:
+                chat['messages'].append(codec.loads(dados))
+        return list(chats.values())
+
+    # ===== INTERFACE =====
+    def list(self, session_id, limit=None, offset=0):
+        """(metadados da página, total) - mais nova primeiro"""
+        with self.pool.connection() as conn:
+            rows = conn.execute(self.LIST_SQL, (session_id, limit if limit else -1, offset)).fetchall()
+            total = conn.execute("SELECT COUNT(*) FROM chats WHERE session_id = ?", (session_id,)).fetchone()[0]
+
+        chats = [dict(zip(self.META_FIELDS, row)) for row in rows]
+        for chat in chats:
+            chat['is_pinned'] = bool(chat['is_pinned'])
+            chat['thinking_mode'] = bool(chat['thinking_mode'])
+        return chats, total
+
+    def read_all(self, session_id):
+        """(conversas completas, bytes)"""
+        with self.pool.connection() as conn:
+            rows = conn.execute("SELECT chat_id, dados FROM chats WHERE session_id = ? ORDER BY seq DESC",
+                                (session_id,)).fetchall()
+            size = conn.execute("SELECT COALESCE(SUM(tamanho), 0) FROM chats WHERE session_id = ?",
+                                (session_id,)).fetchone()[0]
+            messages = conn.execute(self.SESSION_MESSAGES_SQL, (session_id,)) if rows else ()
+            return self._load(rows, messages), size
+
+    def read(self, session_id, chat_id):
+        with self.pool.connection() as conn:
+            rows = conn.execute("SELECT chat_id, dados FROM chats WHERE session_id = ? AND chat_id = ?",
+                                (session_id, chat_id)).fetchall()
+            messages = conn.execute(self.CHAT_MESSAGES_SQL, (session_id, chat_id)) if rows else ()
+            chats = self._load(rows, messages)
+        return chats[0] if chats else None
+
+    def put(self, session_id, chat):
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")  # MAX(seq) + upsert sem corrida entre workers
+            return self._put(conn, session_id, chat)
+
+    def delete(self, session_id, chat_id):
+        with self.pool.connection() as conn:
+            deleted = conn.execute("DELETE FROM chats WHERE session_id = ? AND chat_id = ? RETURNING chat_id",
+                                   (session_id, chat_id)).fetchall()
+            conn.execute("DELETE FROM chat_messages WHERE session_id = ? AND chat_id = ?", (session_id, chat_id))
+        return bool(deleted)
+
+    def rewrite(self, session_id, chats):
+        """Substitui todas as conversas da sessão pela lista (mais nova primeiro) em uma transação"""
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM chats WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM chat_messages WHERE session_id = ?", (session_id,))
+            for i, chat in enumerate(chats):
+                self._put(conn, session_id, chat, seq=len(chats) - i)
+
+    def import_chats(self, session_id, chats):
+        """Migração: grava as conversas que ainda não existem (mantendo a ordem) -> quantidade importada"""
+        imported = 0
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            existing = {row[0] for row in conn.execute("SELECT chat_id FROM chats WHERE session_id = ?", (session_id,))}
+            base = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM chats WHERE session_id = ?",
+                                (session_id,)).fetchone()[0]
+            new_chats = [chat for chat in chats if chat.get('id') not in existing]
+            for i, chat in enumerate(new_chats):
+                self._put(conn, session_id, chat, seq=base + len(new_chats) - i)
+                imported += 1
+        return imported
+
+    def stats(self, session_id):
+        with self.pool.connection() as conn:
+            total, messages, oldest, newest, size = conn.execute(self.STATS_SQL, (session_id,)).fetchone()
+        return {
+            'total_chats': total,
+            'total_messages': messages,
+            'oldest_chat': oldest,
+            'newest_chat': newest,
+            'size_bytes': size
+        }
+
+    def start(self):
+        pass  # Sem tarefas em background (o SQLite cuida da concorrência)
+
+    def get_stats(self):
+        return dict(self.pool.get_stats(), backend='sqlite')
+
+
+def create_chat_store(path_for, kind=CHAT_STORE_BACKEND):
+    """Backend de armazenamento do ChatManager"""
+    if kind == 'sqlite':
+        return SQLiteChatStore()
+    if kind == 'log':
+        return LogChatStore(path_for)
+    raise ValueError(f"Backend de conversas desconhecido: {kind}")
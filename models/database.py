@@ -1,80 +1,298 @@
+import re
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
 from datetime import datetime
-from config import DATABASE_FILE
+from config import (MEMORY_CACHE_TTL, MEMORY_SEARCH_TOP_K, MEMORY_SESSION_TOUCH_INTERVAL, CLEANUP_OLD_SESSIONS_DAYS,
+                    DB_CLEANUP_BATCH_SIZE, DB_CLEANUP_SLICE_SECONDS)
+from models.cache_manager import memoize, context_cache
+from models.db_pool import db_pool
+
+# Insere ou atualiza pela UNIQUE(session_id, chave); RETURNING versao diz qual dos dois aconteceu
+UPSERT_SQL = """
+    INSERT INTO dados_salvos (session_id, chave, valor, categoria)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(session_id, chave) DO UPDATE SET
+        valor = excluded.valor,
+        categoria = excluded.categoria,
+        data_atualizacao = CURRENT_TIMESTAMP,
+        versao = versao + 1
+    RETURNING versao
+"""
+
+# Índice FTS5 de conteúdo externo (sem duplicar o texto) sincronizado por triggers
+FTS_SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS dados_salvos_fts USING fts5(
+        chave, valor, categoria,
+        content='dados_salvos', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS dados_salvos_fts_ai AFTER INSERT ON dados_salvos BEGIN
+        INSERT INTO dados_salvos_fts(rowid, chave, valor, categoria)
+        VALUES (new.id, new.chave, new.valor, new.categoria);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS dados_salvos_fts_ad AFTER DELETE ON dados_salvos BEGIN
+        INSERT INTO dados_salvos_fts(dados_salvos_fts, rowid, chave, valor, categoria)
+        VALUES ('delete', old.id, old.chave, old.valor, old.categoria);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS dados_salvos_fts_au AFTER UPDATE OF chave, valor, categoria ON dados_salvos BEGIN
+        INSERT INTO dados_salvos_fts(dados_salvos_fts, rowid, chave, valor, categoria)
+        VALUES ('delete', old.id, old.chave, old.valor, old.categoria);
+        INSERT INTO dados_salvos_fts(rowid, chave, valor, categoria)
+        VALUES (new.id, new.chave, new.valor, new.categoria);
+    END
+    """
+]
+
+# Palavras que não ajudam a achar memórias relevantes
+STOPWORDS = {
+    'que', 'qual', 'quais', 'com', 'para', 'por', 'uma', 'uns', 'umas', 'dos', 'das', 'nos', 'nas',
+    'meu', 'minha', 'meus', 'minhas', 'seu', 'sua', 'voce', 'você', 'ele', 'ela', 'isso', 'isto',
+    'esse', 'essa', 'este', 'esta', 'como', 'mais', 'mas', 'tem', 'ter', 'sou', 'foi', 'ser',
+    'sobre', 'quando', 'onde', 'sim', 'não', 'nao', 'the', 'and', 'you', 'what'
+}
+
+# Consultas quentes (usadas pelos métodos e pela verificação de plano)
+BUSCAR_CHAVE_SQL = """
+    SELECT chave, valor, categoria, data_criacao, data_atualizacao
+    FROM dados_salvos WHERE session_id = ? AND chave = ?
+"""
+LISTAR_RECENTES_SQL = """
+    SELECT chave, valor, categoria, data_criacao
+    FROM dados_salvos
+    WHERE session_id = ?
+    ORDER BY data_atualizacao DESC LIMIT 20
+"""
+LISTAR_POR_CATEGORIA_SQL = """
+    SELECT chave, valor, categoria, data_criacao
+    FROM dados_salvos
+    WHERE session_id = ? AND categoria = ?
+    ORDER BY data_atualizacao DESC LIMIT 20
+"""
+LISTAR_CATEGORIAS_SQL = """
+    SELECT categoria, COUNT(*) as total
+    FROM dados_salvos
+    WHERE session_id = ?
+    GROUP BY categoria
+    ORDER BY total DESC
+"""
+
+# Migrações versionadas (PRAGMA user_version) - só acrescentar no fim, nunca alterar uma já aplicada
+MIGRATIONS = [
+    (1, "índices de listagem por sessão", [
+        # Listagem sem categoria: ordem de data_atualizacao vem do índice (sem ordenação em memória)
+        "CREATE INDEX IF NOT EXISTS idx_dados_sessao_recentes ON dados_salvos(session_id, data_atualizacao)",
+        # Listagem por categoria (mesmo efeito) + listar_categorias só no índice, sem ler as linhas
+        "CREATE INDEX IF NOT EXISTS idx_dados_sessao_categoria ON dados_salvos(session_id, categoria, data_atualizacao)",
+    ]),
+    (2, "último acesso por sessão", [
+        """
+        CREATE TABLE IF NOT EXISTS sessoes_memoria (
+            session_id TEXT PRIMARY KEY,
+            ultimo_acesso INTEGER NOT NULL
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_sessoes_memoria_acesso ON sessoes_memoria(ultimo_acesso)",
+        # Sessões que já tinham dados: último acesso = última escrita
+        """
+        INSERT OR IGNORE INTO sessoes_memoria (session_id, ultimo_acesso)
+        SELECT session_id, CAST(strftime('%s', MAX(data_atualizacao)) AS INTEGER)
+        FROM dados_salvos GROUP BY session_id
+        """,
+        # Escritas atualizam o último acesso na mesma transação; leituras usam registrar_acesso()
+        """
+        CREATE TRIGGER IF NOT EXISTS dados_salvos_acesso_ai AFTER INSERT ON dados_salvos BEGIN
+            INSERT INTO sessoes_memoria (session_id, ultimo_acesso)
+            VALUES (new.session_id, CAST(strftime('%s', 'now') AS INTEGER))
+            ON CONFLICT(session_id) DO UPDATE SET ultimo_acesso = excluded.ultimo_acesso;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS dados_salvos_acesso_au AFTER UPDATE ON dados_salvos BEGIN
+            INSERT INTO sessoes_memoria (session_id, ultimo_acesso)
+            VALUES (new.session_id, CAST(strftime('%s', 'now') AS INTEGER))
+            ON CONFLICT(session_id) DO UPDATE SET ultimo_acesso = excluded.ultimo_acesso;
+        END
+        """,
+    ]),
+    (3, "controle da manutenção agendada", [
+        # Última execução de cada tarefa (compartilhada entre workers)
+        """
+        CREATE TABLE IF NOT EXISTS manutencao_tarefas (
+            nome TEXT PRIMARY KEY,
+            ultima_execucao REAL NOT NULL,
+            duracao_ms REAL NOT NULL,
+            resultado TEXT
+        )
+        """,
+        # Lease: só um worker roda a manutenção por vez
+        """
+        CREATE TABLE IF NOT EXISTS manutencao_lock (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            dono TEXT NOT NULL,
+            expira_em REAL NOT NULL
+        )
+        """,
+    ]),
+]
+
+REGISTRAR_ACESSO_SQL = """
+    INSERT INTO sessoes_memoria (session_id, ultimo_acesso) VALUES (?, ?)
+    ON CONFLICT(session_id) DO UPDATE SET ultimo_acesso = MAX(ultimo_acesso, excluded.ultimo_acesso)
+"""
+
+# Limpeza por idade em lotes: linhas das sessões inativas (índice de ultimo_acesso, sem varrer dados_salvos)
+LIMPAR_DADOS_INATIVOS_SQL = """
+    DELETE FROM dados_salvos WHERE id IN (
+        SELECT d.id FROM sessoes_memoria s
+        JOIN dados_salvos d ON d.session_id = s.session_id
+        WHERE s.ultimo_acesso < ? AND s.session_id != 'legacy'
+        LIMIT ?
+    )
+    RETURNING session_id
+"""
+LIMPAR_SESSOES_VAZIAS_SQL = """
+    DELETE FROM sessoes_memoria WHERE session_id IN (
+        SELECT s.session_id FROM sessoes_memoria s
+        WHERE s.ultimo_acesso < ? AND s.session_id != 'legacy'
+          AND NOT EXISTS (SELECT 1 FROM dados_salvos d WHERE d.session_id = s.session_id)
+        LIMIT ?
+    )
+"""
+
+# Plano esperado de cada consulta quente: (nome, sql, nº de parâmetros, trecho obrigatório, trechos proibidos)
+QUERY_PLANS = [
+    ("buscar_chave", BUSCAR_CHAVE_SQL, 2,
+     "USING INDEX sqlite_autoindex_dados_salvos_1 (session_id=? AND chave=?)", ["SCAN", "TEMP B-TREE"]),
+    ("listar_recentes", LISTAR_RECENTES_SQL, 1,
+     "USING INDEX idx_dados_sessao_recentes (session_id=?)", ["SCAN", "TEMP B-TREE"]),
+    ("listar_por_categoria", LISTAR_POR_CATEGORIA_SQL, 2,
+     "USING INDEX idx_dados_sessao_categoria (session_id=? AND categoria=?)", ["SCAN", "TEMP B-TREE"]),
+    # ORDER BY total (agregado) sempre ordena em memória - só as categorias, não as linhas
+    ("listar_categorias", LISTAR_CATEGORIAS_SQL, 1,
+     "USING COVERING INDEX idx_dados_sessao_categoria (session_id=?)", ["SCAN", "TEMP B-TREE FOR GROUP BY"]),
+    ("limpar_dados_inativos", LIMPAR_DADOS_INATIVOS_SQL, 2,
+     "USING COVERING INDEX idx_sessoes_memoria_acesso (ultimo_acesso<?)", ["SCAN", "TEMP B-TREE"]),
+]
 
 class DatabaseManager:
-    def __init__(self):
-        self.db_file = DATABASE_FILE
+    def __init__(self, pool=db_pool):
+        self.pool = pool
+        self.db_file = pool.db_file
+        self._acessos = OrderedDict()  # session_id -> último registrar_acesso gravado (throttle)
+        self._acessos_lock = threading.Lock()
         self.init_database()
 
     def init_database(self):
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-
-        # 🔧 CORREÇÃO: Adicionar coluna session_id
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS dados_salvos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id TEXT NOT NULL,
-                chave TEXT NOT NULL,
-                valor TEXT NOT NULL,
-                categoria TEXT DEFAULT 'geral',
-                data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(session_id, chave)
-            )
-        """)
-
-        # 🔧 MIGRAÇÃO: Verificar se precisa migrar dados antigos
-        cursor.execute("PRAGMA table_info(dados_salvos)")
-        colunas = [coluna[1] for coluna in cursor.fetchall()]
-
-        if 'session_id' not in colunas:
-            print("🔄 Migrando banco de dados para suporte a sessões...")
-            cursor.execute("ALTER TABLE dados_salvos ADD COLUMN session_id TEXT DEFAULT 'legacy'")
-            print("✅ Migração concluída!")
-
-        conn.commit()
-        conn.close()
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+
+            # 🔧 CORREÇÃO: Adicionar coluna session_id
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS dados_salvos (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    chave TEXT NOT NULL,
+                    valor TEXT NOT NULL,
+                    categoria TEXT DEFAULT 'geral',
+                    data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    versao INTEGER NOT NULL DEFAULT 1,
+                    UNIQUE(session_id, chave)
+                )
+            """)
+
+            # 🔧 MIGRAÇÃO: Verificar se precisa migrar dados antigos
+            cursor.execute("PRAGMA table_info(dados_salvos)")
+            colunas = [coluna[1] for coluna in cursor.fetchall()]
+
+            if 'session_id' not in colunas:
+                print("🔄 Migrando banco de dados para suporte a sessões...")
+                cursor.execute("ALTER TABLE dados_salvos ADD COLUMN session_id TEXT DEFAULT 'legacy'")
+                print("✅ Migração concluída!")
+
+            # Versão da linha: 1 = inserida agora, >1 = atualizada (resultado do UPSERT)
+            if 'versao' not in colunas:
+                cursor.execute("ALTER TABLE dados_salvos ADD COLUMN versao INTEGER NOT NULL DEFAULT 1")
+
+            self.fts_enabled = self._init_fts(cursor)
+
+        self._migrate()
+        for problema in self.verificar_planos_consulta()['problemas']:
+            print(f"⚠️ Plano de consulta inesperado - {problema}")
         print(f"💾 Banco de dados inicializado: {self.db_file}")
 
+    def _migrate(self):
+        """Aplica as MIGRATIONS pendentes, cada uma na sua transação"""
+        for numero, descricao, statements in MIGRATIONS:
+            with self.pool.connection() as conn:
+                # IMMEDIATE: outro worker subindo ao mesmo tempo espera e depois vê a versão nova
+                conn.execute("BEGIN IMMEDIATE")
+                if conn.execute("PRAGMA user_version").fetchone()[0] >= numero:
+                    conn.rollback()
+                    continue
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {int(numero)}")
+            print(f"🔄 Migração {numero} aplicada: {descricao}")
+
+    def verificar_planos_consulta(self):
+        """EXPLAIN QUERY PLAN das consultas quentes contra o plano esperado (detecta índice perdido)"""
+        planos = {}
+        problemas = []
+        # Conexão avulsa: EXPLAIN guardado no cache de statements do pool não reflete índices novos/removidos
+        with closing(sqlite3.connect(self.db_file)) as conn:
+            for nome, sql, n_params, esperado, proibidos in QUERY_PLANS:
+                linhas = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, ("",) * n_params)]
+                planos[nome] = linhas
+                plano = " | ".join(linhas)
+                if esperado not in plano:
+                    problemas.append(f"{nome}: esperado '{esperado}', obtido '{plano}'")
+                for proibido in proibidos:
+                    if proibido in plano:
+                        problemas.append(f"{nome}: '{proibido}' no plano '{plano}'")
+        return {"status": "sucesso" if not problemas else "erro", "planos": planos, "problemas": problemas}
+
+    @staticmethod
+    def _init_fts(cursor):
+        """Cria o índice de busca textual; False se o SQLite não tiver FTS5 (busca cai para LIKE)"""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'dados_salvos_fts'")
+        novo = cursor.fetchone() is None
+        try:
+            for statement in FTS_SCHEMA:
+                cursor.execute(statement)
+        except sqlite3.OperationalError as e:
+            print(f"⚠️ FTS5 indisponível, busca de memórias por LIKE: {e}")
+            return False
+
+        if novo:
+            # Indexar o que já estava salvo antes do índice existir
+            cursor.execute("INSERT INTO dados_salvos_fts(dados_salvos_fts) VALUES ('rebuild')")
+            print("🔎 Índice de busca das memórias criado")
+        return True
+
     def get_connection(self):
-        return sqlite3.connect(self.db_file)
+        """Conexão do pool (use com 'with' - commit/rollback e devolução automáticos)"""
+        return self.pool.connection()
 
     def salvar_dados(self, chave, valor, categoria="geral", session_id=None):
         if not session_id:
             return {"status": "erro", "mensagem": "session_id é obrigatório"}
 
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            with self.get_connection() as conn:
+                operacao = self._upsert(conn, session_id, chave, valor, categoria)
 
-            # 🔧 CORREÇÃO: Buscar por session_id E chave
-            cursor.execute(
-                'SELECT valor FROM dados_salvos WHERE session_id = ? AND chave = ?',
-                (session_id, chave)
-            )
-            resultado_existente = cursor.fetchone()
-
-            if resultado_existente:
-                valor_antigo = resultado_existente[0]
-                # 🔧 CORREÇÃO: Atualizar com session_id
-                cursor.execute("""
-                    UPDATE dados_salvos 
-                    SET valor = ?, categoria = ?, data_atualizacao = CURRENT_TIMESTAMP 
-                    WHERE session_id = ? AND chave = ?
-                """, (valor, categoria, session_id, chave))
-                operacao = "atualizado"
-            else:
-                # 🔧 CORREÇÃO: Inserir com session_id
-                cursor.execute("""
-                    INSERT INTO dados_salvos (session_id, chave, valor, categoria)
-                    VALUES (?, ?, ?, ?)
-                """, (session_id, chave, valor, categoria))
-                operacao = "salvo"
-
-            conn.commit()
-            conn.close()
+            context_cache.invalidate_context(session_id)
 
             print(f"💾 Dado {operacao} para sessão {session_id[:8]}...: {chave} = {valor}")
 
@@ -89,107 +307,186 @@ class DatabaseManager:
         except Exception as e:
             return {"status": "erro", "mensagem": str(e)}
 
-    def buscar_dados(self, chave=None, categoria=None, session_id=None):
+    @staticmethod
+    def _upsert(conn, session_id, chave, valor, categoria):
+        """INSERT ou UPDATE atômico (uma instrução, sem SELECT antes) -> 'salvo' | 'atualizado'"""
+        versao = conn.execute(UPSERT_SQL, (session_id, chave, valor, categoria)).fetchone()[0]
+        return "salvo" if versao == 1 else "atualizado"
+
+    def salvar_dados_lote(self, itens, session_id=None):
+        """Salva vários pares chave/valor da sessão em uma única transação
+
+        itens: [{"chave", "valor", "categoria"?}, ...] - um resultado por item, na mesma ordem
+        """
         if not session_id:
             return {"status": "erro", "mensagem": "session_id é obrigatório"}
 
+        resultados = []
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-
-            if chave:
-                # 🔧 CORREÇÃO: Buscar por session_id E chave
-                cursor.execute("""
-                    SELECT chave, valor, categoria, data_criacao, data_atualizacao
-                    FROM dados_salvos WHERE session_id = ? AND chave = ?
-                """, (session_id, chave))
-                resultado = cursor.fetchone()
-
-                if resultado:
-                    conn.close()
-                    return {
+            with self.get_connection() as conn:
+                for item in itens:
+                    chave = item.get('chave')
+                    valor = item.get('valor')
+                    if not chave or not valor:
+                        resultados.append({"status": "erro", "mensagem": "chave e valor são obrigatórios"})
+                        continue
+
+                    operacao = self._upsert(conn, session_id, chave, valor, item.get('categoria') or 'geral')
+                    resultados.append({
                         "status": "sucesso",
-                        "encontrado": True,
-                        "chave": resultado[0],
-                        "valor": resultado[1],
+                        "chave": chave,
+                        "valor": valor,
+                        "operacao": operacao,
                         "session_id": session_id[:8] + "..."
-                    }
-                else:
-                    conn.close()
-                    return {
-                        "status": "sucesso",
-                        "encontrado": False,
-                        "mensagem": f"Nenhum dado encontrado para '{chave}' na sessão atual"
-                    }
-            else:
-                # 🔧 CORREÇÃO: Listar apenas dados da sessão
-                query = """
-                    SELECT chave, valor, categoria, data_criacao
-                    FROM dados_salvos
-                    WHERE session_id = ?
-                """
-                params = [session_id]
-                
-                if categoria:
-                    query += " AND categoria = ?"
-                    params.append(categoria)
-                
-                query += " ORDER BY data_atualizacao DESC LIMIT 20"
-                
-                cursor.execute(query, params)
-                resultados = cursor.fetchall()
-
-                dados = []
-                for resultado in resultados:
-                    dados.append({
-                        "chave": resultado[0],
-                        "valor": resultado[1],
-                        "categoria": resultado[2],
-                        "criado_em": resultado[3]
                     })
 
-                conn.close()
-                return {
-                    "status": "sucesso",
-                    "total_encontrados": len(dados),
-                    "dados": dados,
-                    "session_id": session_id[:8] + "..."
-                }
+        except Exception as e:
+            return {"status": "erro", "mensagem": str(e)}
+
+        salvos = sum(1 for r in resultados if r['status'] == 'sucesso')
+        if salvos:
+            context_cache.invalidate_context(session_id)
+        print(f"💾 Lote salvo para sessão {session_id[:8]}...: {salvos}/{len(itens)} dados em uma transação")
+
+        return {
+            "status": "sucesso",
+            "total_salvos": salvos,
+            "resultados": resultados,
+            "session_id": session_id[:8] + "..."
+        }
+
+    @memoize(ttl=MEMORY_CACHE_TTL)
+    def buscar_dados(self, chave=None, categoria=None, session_id=None):
+        if not session_id:
+            return {"status": "erro", "mensagem": "session_id é obrigatório"}
+
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+
+                if chave:
+                    # 🔧 CORREÇÃO: Buscar por session_id E chave
+                    cursor.execute(BUSCAR_CHAVE_SQL, (session_id, chave))
+                    resultado = cursor.fetchone()
+
+                    if resultado:
+                        return {
+                            "status": "sucesso",
+                            "encontrado": True,
+                            "chave": resultado[0],
+                            "valor": resultado[1],
+                            "session_id": session_id[:8] + "..."
+                        }
+                    else:
+                        return {
+                            "status": "sucesso",
+                            "encontrado": False,
+                            "mensagem": f"Nenhum dado encontrado para '{chave}' na sessão atual"
+                        }
+                elif categoria:
+                    # 🔧 CORREÇÃO: Listar apenas dados da sessão
+                    cursor.execute(LISTAR_POR_CATEGORIA_SQL, (session_id, categoria))
+                    resultados = cursor.fetchall()
+                else:
+                    cursor.execute(LISTAR_RECENTES_SQL, (session_id,))
+                    resultados = cursor.fetchall()
+
+            dados = []
+            for resultado in resultados:
+                dados.append({
+                    "chave": resultado[0],
+                    "valor": resultado[1],
+                    "categoria": resultado[2],
+                    "criado_em": resultado[3]
+                })
+
+            return {
+                "status": "sucesso",
+                "total_encontrados": len(dados),
+                "dados": dados,
+                "session_id": session_id[:8] + "..."
+            }
 
         except Exception as e:
             return {"status": "erro", "mensagem": str(e)}
 
-    # 🆕 NOVA FUNÇÃO: Deletar dados com isolamento
-    def deletar_dados(self, chave, session_id=None):
+    @staticmethod
+    def _termos_busca(texto, max_termos=16):
+        """Palavras relevantes do texto (sem stopwords, sem repetição, na ordem)"""
+        termos = []
+        for palavra in re.findall(r"\w+", (texto or "").lower()):
+            if len(palavra) >= 3 and palavra not in STOPWORDS and palavra not in termos:
+                termos.append(palavra)
+        return termos[:max_termos]
+
+    def buscar_relevantes(self, consulta, session_id=None, limite=MEMORY_SEARCH_TOP_K):
+        """Memórias da sessão mais relevantes para o texto (ranking BM25 do FTS5)"""
         if not session_id:
             return {"status": "erro", "mensagem": "session_id é obrigatório"}
 
+        termos = self._termos_busca(consulta)
+        if not termos:
+            return {"status": "sucesso", "total_encontrados": 0, "dados": [], "session_id": session_id[:8] + "..."}
+
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            limite = max(1, min(int(limite or MEMORY_SEARCH_TOP_K), 20))
+            with self.get_connection() as conn:
+                if self.fts_enabled:
+                    # Termos entre aspas (sem sintaxe FTS vinda do usuário) + prefixo: "viag"* acha "viagem"
+                    match = " OR ".join(f'"{termo}"*' for termo in termos)
+                    resultados = conn.execute("""
+                        SELECT d.chave, d.valor, d.categoria, bm25(dados_salvos_fts, 3.0, 1.0, 0.5) AS score
+                        FROM dados_salvos_fts
+                        JOIN dados_salvos d ON d.id = dados_salvos_fts.rowid
+                        WHERE dados_salvos_fts MATCH ? AND d.session_id = ?
+                        ORDER BY score
+                        LIMIT ?
+                    """, (match, session_id, limite)).fetchall()
+                else:
+                    filtros = " OR ".join("(chave LIKE ? OR valor LIKE ?)" for _ in termos)
+                    params = [session_id]
+                    for termo in termos:
+                        params += [f"%{termo}%", f"%{termo}%"]
+                    resultados = conn.execute(f"""
+                        SELECT chave, valor, categoria, 0 AS score
+                        FROM dados_salvos WHERE session_id = ? AND ({filtros})
+                        ORDER BY data_atualizacao DESC LIMIT ?
+                    """, params + [limite]).fetchall()
+
+            dados = [
+                {"chave": r[0], "valor": r[1], "categoria": r[2], "relevancia": round(-r[3], 3)}
+                for r in resultados
+            ]
+            return {
+                "status": "sucesso",
+                "total_encontrados": len(dados),
+                "dados": dados,
+                "session_id": session_id[:8] + "..."
+            }
+
+        except Exception as e:
+            return {"status": "erro", "mensagem": str(e)}
 
-            # Verificar se o dado existe na sessão
-            cursor.execute(
-                'SELECT valor FROM dados_salvos WHERE session_id = ? AND chave = ?',
-                (session_id, chave)
-            )
-            resultado_existente = cursor.fetchone()
+    # 🆕 NOVA FUNÇÃO: Deletar dados com isolamento
+    def deletar_dados(self, chave, session_id=None):
+        if not session_id:
+            return {"status": "erro", "mensagem": "session_id é obrigatório"}
 
-            if not resultado_existente:
-                conn.close()
+        try:
+            with self.get_connection() as conn:
+                # Verificação e remoção na mesma instrução
+                removido = conn.execute(
+                    'DELETE FROM dados_salvos WHERE session_id = ? AND chave = ? RETURNING valor',
+                    (session_id, chave)
+                ).fetchone()
+
+            if not removido:
                 return {
                     "status": "erro",
                     "mensagem": f"Dado '{chave}' não encontrado na sessão atual"
                 }
 
-            # Deletar o dado
-            cursor.execute(
-                'DELETE FROM dados_salvos WHERE session_id = ? AND chave = ?',
-                (session_id, chave)
-            )
-
-            conn.commit()
-            conn.close()
+            context_cache.invalidate_context(session_id)
 
             print(f"🗑️ Dado deletado da sessão {session_id[:8]}...: {chave}")
 
@@ -204,25 +501,16 @@ class DatabaseManager:
             return {"status": "erro", "mensagem": str(e)}
 
     # 🆕 NOVA FUNÇÃO: Listar categorias com isolamento
+    @memoize(ttl=MEMORY_CACHE_TTL)
     def listar_categorias(self, session_id=None):
         if not session_id:
             return {"status": "erro", "mensagem": "session_id é obrigatório"}
 
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            with self.get_connection() as conn:
+                # Buscar categorias únicas da sessão
+                resultados = conn.execute(LISTAR_CATEGORIAS_SQL, (session_id,)).fetchall()
 
-            # Buscar categorias únicas da sessão
-            cursor.execute("""
-                SELECT categoria, COUNT(*) as total
-                FROM dados_salvos 
-                WHERE session_id = ? 
-                GROUP BY categoria 
-                ORDER BY total DESC
-            """, (session_id,))
-            
-            resultados = cursor.fetchall()
-            
             categorias = []
             for resultado in resultados:
                 categorias.append({
@@ -230,8 +518,6 @@ class DatabaseManager:
                     "total_itens": resultado[1]
                 })
 
-            conn.close()
-
             return {
                 "status": "sucesso",
                 "categorias": categorias,
@@ -242,37 +528,76 @@ class DatabaseManager:
         except Exception as e:
             return {"status": "erro", "mensagem": str(e)}
 
-    def cleanup_expired_sessions(self, active_session_ids):
-        """🧹 NOVO: Limpar dados de sessões expiradas"""
+    def registrar_acesso(self, session_id):
+        """Marca a sessão como vista agora (no máximo uma escrita a cada MEMORY_SESSION_TOUCH_INTERVAL)"""
+        if not session_id:
+            return False
+
+        agora = time.time()
+        with self._acessos_lock:
+            if agora - self._acessos.get(session_id, 0) < MEMORY_SESSION_TOUCH_INTERVAL:
+                return False
+            self._acessos[session_id] = agora
+            self._acessos.move_to_end(session_id)
+            while len(self._acessos) > 10000:
+                self._acessos.popitem(last=False)
+
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Buscar todas as sessões no banco
-            cursor.execute("SELECT DISTINCT session_id FROM dados_salvos")
-            all_sessions = [row[0] for row in cursor.fetchall()]
-            
-            # Identificar sessões órfãs  
-            orphaned_sessions = [sid for sid in all_sessions if sid not in active_session_ids and sid != 'legacy']
-            
-            if orphaned_sessions:
-                # Deletar dados órfãos
-                placeholders = ','.join(['?' for _ in orphaned_sessions])
-                cursor.execute(f"DELETE FROM dados_salvos WHERE session_id IN ({placeholders})", orphaned_sessions)
-                deleted_count = cursor.rowcount
-                
-                conn.commit()
-                print(f"🧹 Limpeza automática: {deleted_count} dados órfãos removidos de {len(orphaned_sessions)} sessões")
-                
-                conn.close()
-                return {"status": "sucesso", "deleted_count": deleted_count, "orphaned_sessions": len(orphaned_sessions)}
-            
-            conn.close()
-            return {"status": "sucesso", "deleted_count": 0, "orphaned_sessions": 0}
-            
+            with self.get_connection() as conn:
+                conn.execute(REGISTRAR_ACESSO_SQL, (session_id, int(agora)))
+            return True
+        except Exception as e:
+            print(f"❌ Erro ao registrar acesso: {e}")
+            return False
+
+    def limpar_sessoes_inativas(self, max_idade_dias=CLEANUP_OLD_SESSIONS_DAYS, lote=DB_CLEANUP_BATCH_SIZE,
+                                tempo_maximo=DB_CLEANUP_SLICE_SECONDS):
+        """🧹 Uma fatia da limpeza por idade: lotes pequenos até acabar ou esgotar tempo_maximo
+
+        'completo' = False quando ainda sobrou o que apagar (chamar de novo depois).
+        """
+        inicio = time.perf_counter()
+        limite = int(time.time() - max_idade_dias * 86400)
+        deleted_count = 0
+        sessions_removed = 0
+        sessoes = set()
+        completo = False
+
+        try:
+            while time.perf_counter() - inicio < tempo_maximo:
+                # Uma transação curta por lote - requisições conseguem escrever entre um lote e outro
+                with self.get_connection() as conn:
+                    apagadas = [row[0] for row in conn.execute(LIMPAR_DADOS_INATIVOS_SQL, (limite, lote))]
+                deleted_count += len(apagadas)
+                sessoes.update(apagadas)
+                if len(apagadas) < lote:
+                    with self.get_connection() as conn:
+                        removidas = conn.execute(LIMPAR_SESSOES_VAZIAS_SQL, (limite, lote)).rowcount
+                    sessions_removed += removidas
+                    if removidas < lote:
+                        completo = True
+                        break
+
         except Exception as e:
             print(f"❌ Erro na limpeza automática: {e}")
-            return {"status": "erro", "mensagem": str(e)}
+            return {"status": "erro", "mensagem": str(e), "deleted_count": deleted_count}
+
+        finally:
+            for sid in sessoes:
+                context_cache.invalidate_context(sid)
+
+        elapsed_ms = round((time.perf_counter() - inicio) * 1000, 1)
+        if deleted_count or sessions_removed:
+            print(f"🧹 Limpeza automática: {deleted_count} dados de {len(sessoes)} sessões inativas removidos em {elapsed_ms}ms")
+
+        return {
+            "status": "sucesso",
+            "deleted_count": deleted_count,
+            "sessions_cleaned": len(sessoes),
+            "sessions_removed": sessions_removed,
+            "elapsed_ms": elapsed_ms,
+            "completo": completo
+        }
 
 # Instância global
 db_manager = DatabaseManager()
\ No newline at end of file
@@ -0,0 +1,106 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from config import DATABASE_FILE, DB_POOL_SIZE, DB_BUSY_TIMEOUT_MS, DB_MMAP_SIZE, DB_CACHED_STATEMENTS
+
+
+class SQLitePool:
+    """Conexões SQLite persistentes compartilhadas pelos managers (memória, feedbacks)
+
+    Cada thread usa uma conexão com exclusividade enquanto está dentro de
+    connection(); ao sair, a conexão volta para a fila e é reaproveitada pela
+    próxima thread - funciona tanto com threads de longa duração (gunicorn)
+    quanto com uma thread por requisição (servidor do Flask).
+    """
+
+    def __init__(self, db_file=DATABASE_FILE, size=DB_POOL_SIZE, busy_timeout_ms=DB_BUSY_TIMEOUT_MS,
+                 mmap_size=DB_MMAP_SIZE, cached_statements=DB_CACHED_STATEMENTS):
+        self.db_file = str(db_file)
+        self.size = size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+        self.lock = threading.Lock()
+        self._idle = queue.LifoQueue()  # LIFO: a conexão mais quente (cache de páginas) sai primeiro
+        self._pid = os.getpid()
+        self.stats = {
+            'checkouts': 0,
+            'connections_opened': 0,
+            'connections_closed': 0,
+            'rollbacks': 0
+        }
+
+    def _connect(self):
+        # check_same_thread=False: a conexão troca de thread entre checkouts, nunca é usada por duas ao mesmo tempo
+        conn = sqlite3.connect(self.db_file, timeout=self.busy_timeout_ms / 1000,
+                               check_same_thread=False, cached_statements=self.cached_statements)
+        conn.execute("PRAGMA journal_mode=WAL")  # Leitores não bloqueiam o escritor
+        conn.execute("PRAGMA synchronous=NORMAL")  # Seguro com WAL - fsync só no checkpoint
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        with self.lock:
+            self.stats['connections_opened'] += 1
+        return conn
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self.lock:
+            self.stats['connections_closed'] += 1
+
+    def _checkout(self):
+        if os.getpid() != self._pid:
+            # Processo filho (fork do gunicorn): conexões herdadas não podem ser usadas
+            self._idle = queue.LifoQueue()
+            self._pid = os.getpid()
+        with self.lock:
+            self.stats['checkouts'] += 1
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def _checkin(self, conn):
+        if self._idle.qsize() >= self.size:
+            self._close(conn)
+        else:
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Conexão exclusiva da thread - commit ao sair, rollback em exceção"""
+        conn = self._checkout()
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+                with self.lock:
+                    self.stats['rollbacks'] += 1
+            raise
+        finally:
+            self._checkin(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+        stats['idle'] = self._idle.qsize()
+        stats['size'] = self.size
+        return stats
+
+
+# Instância global
+db_pool = SQLitePool()
@@ -0,0 +1,126 @@
+import gzip
+import json
+import os
+import tempfile
+from config import CHAT_FILE_COMPRESSION, CHAT_FILE_COMPRESSION_LEVEL
+
+try:
+    import orjson  # Opcional - serialização bem mais rápida que o json da stdlib
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard  # Opcional - compressão zstd
+except ImportError:
+    zstandard = None
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+class JSONCodec:
+    """Serialização dos arquivos de conversa
+
+    JSON sempre compacto (indent só quando pedido), com orjson quando instalado
+    e o json da stdlib como fallback. Arquivos podem ser gravados com gzip/zstd;
+    a leitura detecta a compressão pelos bytes mágicos, então arquivos antigos
+    (JSON puro) continuam legíveis.
+    """
+
+    SUFFIXES = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+    def __init__(self, compression=CHAT_FILE_COMPRESSION, level=CHAT_FILE_COMPRESSION_LEVEL, use_orjson=True):
+        if compression not in self.SUFFIXES:
+            raise ValueError(f"Compressão desconhecida: {compression}")
+        if compression == 'zstd' and zstandard is None:
+            print("⚠️ zstandard não instalado - arquivos de conversa usarão gzip")
+            compression = 'gzip'
+        self.compression = compression
+        self.level = level
+        self.fast = use_orjson and orjson is not None
+
+    @property
+    def backend(self):
+        return 'orjson' if self.fast else 'json'
+
+    @property
+    def suffix(self):
+        """Extensão extra dos arquivos gravados com compressão ('', '.gz', '.zst')"""
+        return self.SUFFIXES[self.compression]
+
+    # ===== JSON =====
+    def dumps(self, obj, sort_keys=False, indent=False):
+        """bytes UTF-8 (nunca contém quebra de linha sem indent - seguro para logs por linha)"""
+        if self.fast:
+            option = orjson.OPT_NON_STR_KEYS
+            if sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            if indent:
+                option |= orjson.OPT_INDENT_2
+            try:
+                return orjson.dumps(obj, option=option)
+            except TypeError:
+                pass  # Ex.: inteiro maior que 64 bits - a stdlib aceita
+        separators = None if indent else (',', ':')
+        return json.dumps(obj, ensure_ascii=False, sort_keys=sort_keys, indent=2 if indent else None,
+                          separators=separators).encode('utf-8')
+
+    def loads(self, data):
+        if self.fast:
+            return orjson.loads(data)
+        return json.loads(data)
+
+    # ===== COMPRESSÃO =====
+    def compress(self, data):
+        if self.compression == 'gzip':
+            return gzip.compress(data, compresslevel=self.level, mtime=0)
+        if self.compression == 'zstd':
+            return zstandard.ZstdCompressor(level=self.level).compress(data)
+        return data
+
+    @staticmethod
+    def decompress(data):
+        if data[:2] == GZIP_MAGIC:
+            return gzip.decompress(data)
+        if data[:4] == ZSTD_MAGIC:
+            if zstandard is None:
+                raise ValueError("Arquivo comprimido com zstd, mas zstandard não está instalado")
+            return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+        return data
+
+    # ===== ARQUIVOS =====
+    def write_bytes(self, path, data, compress=True):
+        """Escrita atômica (tmp único + fsync + replace) com permissão 0600 -> bytes gravados
+
+        O tmp tem nome único no mesmo diretório: dois workers gravando o mesmo
+        arquivo não compartilham o tmp, e o fsync garante que o replace nunca
+        publica um arquivo vazio após uma queda de energia.
+        """
+        if compress:
+            data = self.compress(data)
+        directory, name = os.path.split(os.fspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory or '.', prefix=f".{name}.", suffix='.tmp')  # Já nasce 0600
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        return len(data)
+
+    def write_file(self, path, obj, indent=False, compress=True):
+        return self.write_bytes(path, self.dumps(obj, indent=indent), compress=compress)
+
+    def read_file(self, path):
+        with open(path, 'rb') as f:
+            return self.loads(self.decompress(f.read()))
+
+
+# Instância global
+codec = JSONCodec()
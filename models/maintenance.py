@@ -0,0 +1,220 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from config import (AUTO_CLEANUP_ENABLED, CLEANUP_ORPHANED_DATA_INTERVAL, DATABASE_VACUUM_INTERVAL,
+                    DB_CLEANUP_SLICE_PAUSE, MAINTENANCE_CHECK_INTERVAL, MAINTENANCE_MAX_ACTIVE_REQUESTS,
+                    MAINTENANCE_MAX_DELAY_FACTOR, MAINTENANCE_LOCK_TTL, MAINTENANCE_VACUUM_PAGES,
+                    MAINTENANCE_ANALYSIS_LIMIT)
+from models.database import db_manager
+from models.request_manager import request_manager
+
+
+class MaintenanceScheduler:
+    """Manutenção periódica do titan_memory.db em horário de baixo tráfego
+
+    A última execução de cada tarefa fica no próprio banco e um lease garante
+    que só um worker (gunicorn) rode a manutenção por vez.
+    """
+
+    def __init__(self, database=db_manager, check_interval=MAINTENANCE_CHECK_INTERVAL,
+                 max_active_requests=MAINTENANCE_MAX_ACTIVE_REQUESTS, lock_ttl=MAINTENANCE_LOCK_TTL):
+        self.database = database
+        self.check_interval = check_interval
+        self.max_active_requests = max_active_requests
+        self.lock_ttl = lock_ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lock = threading.Lock()
+        self._thread = None
+        self._started_at = time.time()
+
+        # nome -> (intervalo em segundos, função)
+        self.tasks = {
+            'optimize': (CLEANUP_ORPHANED_DATA_INTERVAL, self._task_optimize),
+            'analyze': (DATABASE_VACUUM_INTERVAL, self._task_analyze),
+            'vacuum': (DATABASE_VACUUM_INTERVAL, self._task_vacuum),
+        }
+        if AUTO_CLEANUP_ENABLED:
+            self.tasks['limpeza_memoria'] = (CLEANUP_ORPHANED_DATA_INTERVAL, self._task_limpeza_memoria)
+
+        self.stats = {
+            'runs': 0,
+            'skipped_busy': 0,
+            'skipped_locked': 0,
+            'failures': 0,
+            'last_runs': {}  # nome -> {'duracao_ms', 'resultado', 'executado_em'}
+        }
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._worker, daemon=True, name="db-maintenance")
+        self._thread.start()
+        print(f"🛠️ Manutenção do banco agendada: {', '.join(self.tasks)}")
+
+    def _worker(self):
+        while True:
+            time.sleep(self.check_interval)
+            try:
+                self.run_pending()
+            except Exception as e:
+                print(f"❌ Erro na manutenção do banco: {str(e)[:100]}")
+
+    # ===== AGENDAMENTO =====
+    def _last_runs(self):
+        with self.database.get_connection() as conn:
+            return dict(conn.execute("SELECT nome, ultima_execucao FROM manutencao_tarefas").fetchall())
+
+    def _due_tasks(self, now):
+        """[(nome, atrasada_demais)] das tarefas vencidas
+
+        Tarefa que nunca rodou (ex.: VACUUM completo de conversão) vence na
+        hora, mas o atraso conta a partir da subida do scheduler - ela espera
+        baixo tráfego em vez de furar a fila logo no primeiro deploy.
+        """
+        last_runs = self._last_runs()
+        due = []
+        for name, (interval, _) in self.tasks.items():
+            elapsed = now - last_runs.get(name, self._started_at - interval)
+            if elapsed >= interval:
+                due.append((name, elapsed >= interval * MAINTENANCE_MAX_DELAY_FACTOR))
+        return due
+
+    def _acquire(self):
+        """Lease entre workers (linha única em manutencao_lock)"""
+        now = time.time()
+        with self.database.get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT dono, expira_em FROM manutencao_lock WHERE id = 1").fetchone()
+            if row and row[0] != self.owner and row[1] > now:
+                conn.rollback()
+                return False
+            conn.execute("""
+                INSERT INTO manutencao_lock (id, dono, expira_em) VALUES (1, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET dono = excluded.dono, expira_em = excluded.expira_em
+            """, (self.owner, now + self.lock_ttl))
+        return True
+
+    def _release(self):
+        with self.database.get_connection() as conn:
+            conn.execute("DELETE FROM manutencao_lock WHERE id = 1 AND dono = ?", (self.owner,))
+
+    def run_pending(self, force=False):
+        """Roda as tarefas vencidas (force=True ignora tráfego e intervalos) -> {nome: resultado}"""
+        now = time.time()
+        due = [(name, True) for name in self.tasks] if force else self._due_tasks(now)
+        if not due:
+            return {}
+
+        busy = request_manager.get_active_count() > self.max_active_requests
+        if busy and not force:
+            due = [(name, overdue) for name, overdue in due if overdue]
+            if not due:
+                with self.lock:
+                    self.stats['skipped_busy'] += 1
+                return {}
+
+        if not self._acquire():
+            with self.lock:
+                self.stats['skipped_locked'] += 1
+            return {}
+
+        names = [name for name, _ in due]
+        results = {}
+        try:
+            if not force:
+                # Outro worker pode ter rodado a tarefa entre a verificação e o lease
+                still_due = {name for name, _ in self._due_tasks(time.time())}
+                names = [name for name in names if name in still_due]
+            for name in names:
+                results[name] = self._run_task(name)
+        finally:
+            self._release()
+        return results
+
+    def _run_task(self, name):
+        _, task = self.tasks[name]
+        start = time.perf_counter()
+        try:
+            result = task()
+            status = 'sucesso'
+        except Exception as e:
+            result = {'erro': str(e)[:200]}
+            status = 'erro'
+        duration_ms = round((time.perf_counter() - start) * 1000, 1)
+
+        with self.database.get_connection() as conn:
+            conn.execute("""
+                INSERT INTO manutencao_tarefas (nome, ultima_execucao, duracao_ms, resultado) VALUES (?, ?, ?, ?)
+                ON CONFLICT(nome) DO UPDATE SET ultima_execucao = excluded.ultima_execucao,
+                    duracao_ms = excluded.duracao_ms, resultado = excluded.resultado
+            """, (name, time.time(), duration_ms, json.dumps(result, ensure_ascii=False)))
+
+        with self.lock:
+            self.stats['runs'] += 1
+            if status == 'erro':
+                self.stats['failures'] += 1
+            self.stats['last_runs'][name] = {
+                'status': status,
+                'duracao_ms': duration_ms,
+                'resultado': result,
+                'executado_em': time.time()
+            }
+
+        icon = "🛠️" if status == 'sucesso' else "❌"
+        print(f"{icon} Manutenção '{name}': {status} em {duration_ms}ms - {result}")
+        return {'status': status, 'duracao_ms': duration_ms, **result}
+
+    # ===== TAREFAS =====
+    def _task_optimize(self):
+        with self.database.get_connection() as conn:
+            conn.execute("PRAGMA optimize")
+        return {}
+
+    def _task_analyze(self):
+        with self.database.get_connection() as conn:
+            # Amostragem limitada: tempo previsível mesmo com a tabela grande
+            conn.execute(f"PRAGMA analysis_limit = {int(MAINTENANCE_ANALYSIS_LIMIT)}")
+            conn.execute("ANALYZE")
+        return {}
+
+    def _task_vacuum(self):
+        with self.database.get_connection() as conn:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                # Uma vez: converte o arquivo para auto_vacuum incremental (exige um VACUUM completo)
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("VACUUM")
+                return {'modo': 'completo (conversão para incremental)'}
+
+            livres = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if livres:
+                conn.execute(f"PRAGMA incremental_vacuum({int(MAINTENANCE_VACUUM_PAGES)})").fetchall()
+            restantes = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return {'modo': 'incremental', 'paginas_liberadas': livres - restantes, 'paginas_livres': restantes}
+
+    def _task_limpeza_memoria(self):
+        """Memória de sessões inativas em fatias curtas, com pausa entre elas"""
+        total = {'deleted_count': 0, 'sessions_cleaned': 0, 'db_ms': 0.0}
+        while True:
+            resultado = self.database.limpar_sessoes_inativas()
+            if resultado['status'] != 'sucesso':
+                raise RuntimeError(resultado.get('mensagem'))
+            total['deleted_count'] += resultado['deleted_count']
+            total['sessions_cleaned'] += resultado['sessions_cleaned']
+            total['db_ms'] = round(total['db_ms'] + resultado['elapsed_ms'], 1)
+            if resultado['completo']:
+                return total
+            time.sleep(DB_CLEANUP_SLICE_PAUSE)  # Devolve o banco para as requisições entre fatias
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['last_runs'] = dict(self.stats['last_runs'])
+        stats['tasks'] = {name: interval for name, (interval, _) in self.tasks.items()}
+        return stats
+
+
+# Instância global
+maintenance_scheduler = MaintenanceScheduler()
@@ -41,7 +41,8 @@ class RequestManager:
             thread_id=threading.current_thread().ident
         )
         
-        self.active_requests[request_id] = request
+        with self.lock:
+            self.active_requests[request_id] = request
         print(f"🚀 Request {request_id[:8]}... iniciada para sessão {session_id[:8]}...")
         
         return request_id
@@ -65,11 +66,12 @@ class RequestManager:
     def cancel_session_requests(self, session_id: str):
         """Cancela todas as requests de uma sessão"""
         cancelled_count = 0
-        for request in self.active_requests.values():
-            if request.session_id == session_id and not request.cancelled:
-                request.cancelled = True
-                cancelled_count += 1
-                print(f"🛑 Request {request.id[:8]}... da sessão {session_id[:8]}... cancelada")
+        with self.lock:
+            for request in self.active_requests.values():
+                if request.session_id == session_id and not request.cancelled:
+                    request.cancelled = True
+                    cancelled_count += 1
+                    print(f"🛑 Request {request.id[:8]}... da sessão {session_id[:8]}... cancelada")
         
         if cancelled_count > 0:
             print(f"🛑 Total: {cancelled_count} requests canceladas da sessão {session_id[:8]}...")
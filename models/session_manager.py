@@ -4,11 +4,13 @@ import uuid
 from datetime import datetime
 from collections import defaultdict
 import queue
-from config import MAX_USUARIOS_SIMULTANEOS, TIMEOUT_SESSAO, CLEANUP_INTERVAL, TEMPO_RESPOSTA_ESTIMADO
+from config import (MAX_USUARIOS_SIMULTANEOS, TIMEOUT_SESSAO, CLEANUP_INTERVAL, TEMPO_RESPOSTA_ESTIMADO,
+                    CHAT_HISTORY_MAX_MESSAGES, CHAT_HISTORY_MAX_CHARS)
 
 class SessionManager:
     def __init__(self):
         self.sessoes_ativas = {}
+        self.historicos = {}  # session_id -> {'mensagens': [...], 'turnos': n, 'ultima_atividade': t}
         self.fila_espera = queue.Queue()
         self.lock = threading.Lock()
         self.stats = {
@@ -38,8 +40,7 @@ class SessionManager:
                     'ip': user_ip,
                     'inicio': time.time(),
                     'ultima_atividade': time.time(),
-                    'requests_count': 0,
-                    'chat_history': []
+                    'requests_count': 0
                 }
                 if user_ip not in self.stats['usuarios_unicos_hoje']:
                     self.stats['usuarios_unicos_hoje'].append(user_ip)
@@ -88,25 +89,60 @@ class SessionManager:
                     print(f"🔍 [DEBUG] {sid[:8]}... IP:{dados['ip']} Inativo:{tempo_inativo:.1f}s Requests:{dados['requests_count']}")
             print(f"🔍 [DEBUG] ===============================")
     
+    def _limitar_historico(self, history):
+        """Mantém as mensagens mais novas dentro do limite de chars (não de contagem cega)"""
+        history = history[-CHAT_HISTORY_MAX_MESSAGES:]
+        total_chars = 0
+        inicio = len(history)
+        for i in range(len(history) - 1, -1, -1):
+            total_chars += len(history[i].get('content') or '')
+            if total_chars > CHAT_HISTORY_MAX_CHARS:
+                break
+            inicio = i
+        return history[inicio:]
+    
     def get_chat_history(self, session_id):
         """Retorna histórico de chat da sessão"""
         with self.lock:
-            if session_id in self.sessoes_ativas:
-                return self.sessoes_ativas[session_id].get('chat_history', [])
-            return []
+            historico = self.historicos.get(session_id)
+            return list(historico['mensagens']) if historico else []
     
     def update_chat_history(self, session_id, history):
         """Atualiza histórico de chat da sessão"""
+        if not session_id:
+            return False
         with self.lock:
+            # Limitar histórico para evitar uso excessivo de memória
+            mensagens = self._limitar_historico(list(history))
+            turnos = self.historicos.get(session_id, {}).get('turnos', 0)
+            self.historicos[session_id] = {'mensagens': mensagens, 'turnos': turnos, 'ultima_atividade': time.time()}
             if session_id in self.sessoes_ativas:
-                # Limitar histórico para evitar uso excessivo de memória
-                self.sessoes_ativas[session_id]['chat_history'] = history[-20:]
                 self.sessoes_ativas[session_id]['ultima_atividade'] = time.time()
-                print(f"📝 [SESSION] Histórico atualizado para {session_id[:8]}...: {len(history)} mensagens")
-                return True
-            else:
-                print(f"❌ [SESSION] Tentativa de atualizar histórico de sessão inexistente: {session_id[:8]}...")
-                return False
+            print(f"📝 [SESSION] Histórico atualizado para {session_id[:8]}...: {len(mensagens)} mensagens")
+            return True
+    
+    def append_chat_turn(self, session_id, user_content, assistant_content):
+        """Registra um turno (pergunta + resposta) no histórico da sessão"""
+        if not session_id or not user_content or not assistant_content:
+            return False
+        with self.lock:
+            historico = self.historicos.setdefault(session_id, {'mensagens': [], 'turnos': 0, 'ultima_atividade': 0})
+            # Número do turno sempre crescente (o resumo incremental sabe até onde já resumiu)
+            historico['turnos'] += 1
+            turno = historico['turnos']
+            historico['mensagens'].append({'role': 'user', 'content': user_content, 'turn': turno})
+            historico['mensagens'].append({'role': 'assistant', 'content': assistant_content, 'turn': turno})
+            historico['mensagens'] = self._limitar_historico(historico['mensagens'])
+            historico['ultima_atividade'] = time.time()
+            return True
+    
+    def ensure_turn_counter(self, session_id, minimo):
+        """Garante numeração de turnos acima do que já foi resumido (ex.: após reinício)"""
+        if not session_id or not minimo:
+            return
+        with self.lock:
+            historico = self.historicos.setdefault(session_id, {'mensagens': [], 'turnos': 0, 'ultima_atividade': time.time()})
+            historico['turnos'] = max(historico['turnos'], minimo)
     
     def remover_sessao(self, session_id, motivo="manual"):
         """Remove sessão específica"""
@@ -114,6 +150,7 @@ class SessionManager:
             if session_id in self.sessoes_ativas:
                 ip = self.sessoes_ativas[session_id]['ip']
                 del self.sessoes_ativas[session_id]
+                self.historicos.pop(session_id, None)
                 print(f"🗑️ Sessão removida: {session_id[:8]}... - {motivo} (IP: {ip})")
                 print(f"👥 Ativos: {len(self.sessoes_ativas)}/{MAX_USUARIOS_SIMULTANEOS}")
                 return True
@@ -162,6 +199,11 @@ class SessionManager:
                         # Aumentar tolerância - só remover após 1 hora de inatividade
                         if tempo_inativo > TIMEOUT_SESSAO:
                             sessoes_expiradas.append((sid, dados['ip'], tempo_inativo))
+                    
+                    # Históricos de sessões que não passaram pelo criar_sessao
+                    for sid, historico in list(self.historicos.items()):
+                        if sid not in self.sessoes_ativas and agora - historico['ultima_atividade'] > TIMEOUT_SESSAO:
+                            del self.historicos[sid]
                 
                 for sid, ip, tempo_inativo in sessoes_expiradas:
                     self.remover_sessao(sid, f"timeout ({tempo_inativo:.0f}s)")
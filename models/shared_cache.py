@@ -0,0 +1,108 @@
+import json
+import sqlite3
+import threading
+import time
+from config import CONTEXT_CACHE_BACKEND, CONTEXT_CACHE_SHARED_FILE, CONTEXT_CACHE_TTL
+
+
+class SQLiteCacheBackend:
+    """Cache compartilhado entre workers (arquivo SQLite local, sem serviço externo)
+
+    Invalidações vão para uma tabela de log com sequência crescente; cada
+    processo lê o que veio depois da última sequência vista e limpa o cache local.
+    """
+
+    def __init__(self, db_file=CONTEXT_CACHE_SHARED_FILE, invalidation_log_ttl=CONTEXT_CACHE_TTL):
+        self.db_file = str(db_file)
+        self.invalidation_log_ttl = invalidation_log_ttl
+        self._local = threading.local()
+        self.init_database()
+        print(f"🤝 Cache compartilhado (SQLite): {self.db_file}")
+
+    def init_database(self):
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                chave TEXT PRIMARY KEY,
+                valor TEXT NOT NULL,
+                expira_em REAL NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_invalidations (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                chave TEXT NOT NULL,
+                criado_em REAL NOT NULL
+            )
+        """)
+        conn.commit()
+
+    def _connection(self):
+        """Uma conexão por thread (sqlite3 não compartilha conexões entre threads)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")  # Leitores não bloqueiam o escritor
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """(valor, expira_em) ou None"""
+        row = self._connection().execute(
+            "SELECT valor, expira_em FROM cache_entries WHERE chave = ? AND expira_em > ?",
+            (key, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, value, expires_at):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO cache_entries (chave, valor, expira_em) VALUES (?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), expires_at)
+        )
+
+    def invalidate(self, session_id):
+        """Remove as entradas da sessão e publica a invalidação para os outros workers"""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Chaves são "session_id\x1fchave" - faixa da chave primária, sem varrer a tabela
+            conn.execute("DELETE FROM cache_entries WHERE chave >= ? AND chave < ?",
+                         (session_id + "\x1f", session_id + "\x20"))
+            conn.execute("INSERT INTO cache_invalidations (chave, criado_em) VALUES (?, ?)", (session_id, time.time()))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def last_invalidation(self):
+        row = self._connection().execute("SELECT MAX(seq) FROM cache_invalidations").fetchone()
+        return row[0] or 0
+
+    def invalidations_since(self, seq):
+        """(última sequência, sessões invalidadas depois de seq)"""
+        rows = self._connection().execute(
+            "SELECT seq, chave FROM cache_invalidations WHERE seq > ? ORDER BY seq", (seq,)
+        ).fetchall()
+        if not rows:
+            return seq, []
+        return rows[-1][0], [row[1] for row in rows]
+
+    def cleanup(self):
+        """Remove entradas expiradas e log de invalidação antigo"""
+        now = time.time()
+        conn = self._connection()
+        removed = conn.execute("DELETE FROM cache_entries WHERE expira_em <= ?", (now,)).rowcount
+        conn.execute("DELETE FROM cache_invalidations WHERE criado_em < ?", (now - self.invalidation_log_ttl,))
+        return removed
+
+
+def create_cache_backend(kind=CONTEXT_CACHE_BACKEND):
+    """Backend compartilhado do ContextCache ('local' = só memória do processo)"""
+    if kind == 'sqlite':
+        return SQLiteCacheBackend()
+    if kind in (None, 'local'):
+        return None
+    raise ValueError(f"Backend de cache desconhecido: {kind}")
@@ -70,6 +70,28 @@ class ToolsManager:
                     }
                 }
             },
+            {
+                "type": "function",
+                "function": {
+                    "name": "buscar_memorias",
+                    "description": "Busca na memória da sessão as informações mais relevantes para um assunto (busca por palavras, ordenada por relevância)",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "consulta": {
+                                "type": "string",
+                                "description": "Assunto ou palavras a procurar (ex: 'viagem férias', 'linguagem de programação favorita')"
+                            },
+                            "limite": {
+                                "type": "integer",
+                                "description": "Quantidade máxima de resultados (padrão 5)",
+                                "default": 5
+                            }
+                        },
+                        "required": ["consulta"]
+                    }
+                }
+            },
             {
                 "type": "function",
                 "function": {
@@ -124,6 +146,7 @@ class ToolsManager:
             "obter_data_hora": obter_data_hora,
             "salvar_dados": self._wrapper_salvar_dados,
             "buscar_dados": self._wrapper_buscar_dados,
+            "buscar_memorias": self._wrapper_buscar_memorias,
             "deletar_dados": self._wrapper_deletar_dados,
             "listar_categorias": self._wrapper_listar_categorias,
             "search_web_comprehensive": self._wrapper_search_web
@@ -159,7 +182,23 @@ class ToolsManager:
             return resultado
         except Exception as e:
             return {"status": "erro", "mensagem": f"Erro ao salvar: {str(e)}"}
-    
+
+    def execute_salvar_lote(self, lista_argumentos, session_id):
+        """Várias chamadas de salvar_dados do mesmo turno em uma transação -> um resultado por chamada"""
+        if not session_id:
+            return [{"status": "erro", "mensagem": "session_id é obrigatório"} for _ in lista_argumentos]
+
+        print(f"💾 Salvando lote: {len(lista_argumentos)} dados")
+        try:
+            from models.database import db_manager
+            resultado = db_manager.salvar_dados_lote(lista_argumentos, session_id=session_id)
+        except Exception as e:
+            resultado = {"status": "erro", "mensagem": f"Erro ao salvar: {str(e)}"}
+
+        if resultado['status'] != 'sucesso':
+            return [resultado for _ in lista_argumentos]
+        return resultado['resultados']
+
     def _wrapper_buscar_dados(self, **argumentos):
         """Wrapper otimizado para buscar_dados"""
         session_id = argumentos.pop('session_id', None)
@@ -176,6 +215,22 @@ class ToolsManager:
         except Exception as e:
             return {"status": "erro", "mensagem": f"Erro ao buscar: {str(e)}"}
     
+    def _wrapper_buscar_memorias(self, **argumentos):
+        """Wrapper para a busca ranqueada (FTS5) nas memórias"""
+        session_id = argumentos.pop('session_id', None)
+        if not session_id:
+            return {"status": "erro", "mensagem": "session_id é obrigatório"}
+        
+        consulta = argumentos.get('consulta')
+        if not consulta:
+            return {"status": "erro", "mensagem": "consulta é obrigatória"}
+        
+        try:
+            from models.database import db_manager
+            return db_manager.buscar_relevantes(consulta, session_id, argumentos.get('limite'))
+        except Exception as e:
+            return {"status": "erro", "mensagem": f"Erro ao buscar: {str(e)}"}
+    
     def _wrapper_deletar_dados(self, **argumentos):
         """Wrapper otimizado para deletar_dados"""
         session_id = argumentos.pop('session_id', None)
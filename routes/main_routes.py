@@ -7,9 +7,16 @@ from pathlib import Path
 from flask import Blueprint, request, jsonify, session, render_template, Response, stream_with_context
 from models.session_manager import session_manager
 from models.database import db_manager
+from models.db_pool import db_pool
+from models.maintenance import maintenance_scheduler
+from models.chat_manager import chat_manager
 from utils.ai_client import ai_client
 from models.request_manager import request_manager
-from models.cache_manager import context_cache, cache_context
+from models.cache_manager import context_cache, response_cache, semantic_cache
+from utils.stream_protocol import StreamEncoder, negotiate_protocol, find_stream
+from utils.context_builder import context_builder
+from utils.conversation_summarizer import conversation_summarizer
+from config import CHAT_SYSTEM_PROMPT
 import requests
 # ===== SEGURANÇA: IMPORTS ADICIONAIS =====
 from flask_wtf.csrf import CSRFProtect, validate_csrf
@@ -106,30 +113,20 @@ def status():
         'maximo_usuarios': status_data['maximo_usuarios'],
         'disponivel': status_data['usuarios_ativos'] < status_data['maximo_usuarios'],
         'fila_espera': status_data['fila_espera'],
-        'stats': status_data['stats']
+        'stats': status_data['stats'],
+        'ollama': ai_client.backends.get_status()
     })
 
-@cache_context(timeout=300)
-def get_user_context(session_id):
-    """Busca contexto do usuário com cache inteligente"""
+def get_user_context(session_id, mensagem):
+    """Memórias salvas mais relevantes para a mensagem (FTS5) - sem cache: muda a cada mensagem"""
     try:
-        dados_contexto_result = db_manager.buscar_dados(session_id=session_id)
-        
-        if (dados_contexto_result['status'] == 'sucesso' and 
-            dados_contexto_result.get('dados') and 
-            len(dados_contexto_result['dados']) > 0):
-            
-            contexto_dados = "Informações conhecidas sobre você:\n"
-            for dado in dados_contexto_result['dados'][:5]:
-                contexto_dados += f"- {dado['chave']}: {dado['valor']}\n"
-            
-            return contexto_dados
-        else:
-            return "Primeira conversa - ainda não sei nada sobre você."
-            
+        resultado = db_manager.buscar_relevantes(mensagem, session_id=session_id)
+        if resultado['status'] == 'sucesso':
+            return resultado['dados']
+        print(f"❌ Erro ao buscar contexto: {resultado.get('mensagem')}")
     except Exception as e:
         print(f"❌ Erro ao buscar contexto: {e}")
-        return "Erro ao acessar dados salvos."
+    return []
 
 def processar_thinking_mode(mensagem, frontend_thinking_mode, session_data=None):
     """
@@ -162,6 +159,35 @@ def processar_thinking_mode(mensagem, frontend_thinking_mode, session_data=None)
     
     return default_mode, mensagem
 
+def montar_mensagens_chat(mensagem, session_id):
+    """Mensagens enviadas ao modelo (compartilhado com o caminho ASGI)"""
+    # ✅ HISTÓRICO DENTRO DO ORÇAMENTO DE TOKENS - turnos mais recentes primeiro
+    db_manager.registrar_acesso(session_id)  # "Visto por último" da memória (limpeza por idade)
+    resumo = conversation_summarizer.get_summary(session_id) or {}
+    session_manager.ensure_turn_counter(session_id, resumo.get('summarized_until', 0))
+    historico = session_manager.get_chat_history(session_id)
+
+    messages, info = context_builder.build(
+        CHAT_SYSTEM_PROMPT, historico, mensagem,
+        summary=resumo.get('summary'),
+        summarized_until=resumo.get('summarized_until', 0),
+        memories=get_user_context(session_id, mensagem)
+    )
+    if info['turns_dropped']:
+        # ✅ RESUMO INCREMENTAL EM BACKGROUND - só os turnos que ainda não estão no resumo
+        conversation_summarizer.schedule(session_id, info['dropped'])
+        print(f"🧮 [CONTEXTO] {info['turns_included']} turnos incluídos, {info['turns_dropped']} resumidos (~{info['estimated_tokens']} tokens, {info['tokens_saved']} economizados)")
+    return messages
+
+def registrar_turno(session_id, mensagem, messages, chunk):
+    """Guarda o turno concluído no histórico e calibra a estimativa de tokens"""
+    if chunk.get('type') != 'done':
+        return
+    session_manager.append_chat_turn(session_id, mensagem, chunk.get('final_content', ''))
+    prompt_tokens = chunk.get('stats', {}).get('prompt_eval_count')
+    if prompt_tokens:
+        context_builder.calibrate(context_builder.estimate_messages(messages), prompt_tokens)
+
 @main_bp.route('/chat-stream', methods=['POST'])
 def chat_stream():
     """🌊 CHAT STREAMING ULTRA-OTIMIZADO"""
@@ -170,17 +196,14 @@ def chat_stream():
         data = request.get_json()
         mensagem = data.get('mensagem', '').strip()
         thinking_mode = data.get('thinking_mode', False)
+        stream_protocol = negotiate_protocol(data.get('stream_protocol', 1))
         
         if not mensagem:
             return jsonify({'error': 'Mensagem obrigatória'}), 400
 
         # ✅ VERIFICAR OLLAMA RÁPIDO
-        try:
-            test_response = requests.get("http://localhost:11434/api/tags")
-            if test_response.status_code != 200:
-                return jsonify({'error': 'Ollama indisponível'}), 503
-        except:
-            return jsonify({'error': 'Ollama offline'}), 503
+        if not ai_client.backends.is_available():
+            return jsonify({'error': 'Ollama indisponível'}), 503
 
         # ✅ SESSÃO SIMPLIFICADA
         session_id = session.get('titan_session_id')
@@ -188,30 +211,31 @@ def chat_stream():
             session_id = str(uuid.uuid4())
             session['titan_session_id'] = session_id
 
-        # ✅ REQUEST MANAGER SIMPLES
-        request_id = str(uuid.uuid4())
-        
-        # ✅ MENSAGENS DIRETAS - SEM CONTEXTO PESADO
-        messages = [
-            {"role": "system", "content": "Você é o Titan, um assistente inteligente."},
-            {"role": "user", "content": mensagem}
-        ]
+        messages = montar_mensagens_chat(mensagem, session_id)
 
         # ✅ STREAM GENERATOR OTIMIZADO
         def generate():
+            encoder = StreamEncoder(protocol=stream_protocol, session_id=session_id)
+            # ✅ REQUEST REGISTRADA - conta como tráfego ativo (manutenção espera) e pode ser cancelada
+            request_id = request_manager.start_request(session_id)
             try:
+                yield from encoder.start()
+
                 for chunk in ai_client.send_message_streaming(
                     messages,
                     thinking_mode=thinking_mode,
                     session_id=session_id,
                     request_id=request_id
                 ):
-                    # ✅ YIELD DIRETO - SEM PROCESSAMENTO
-                    yield f"data: {json.dumps(chunk, ensure_ascii=False, separators=(',', ':'))}\n\n"
+                    # ✅ SÓ DELTAS NO FIO - texto completo só em reescrita ou resync
+                    yield from encoder.encode(chunk)
+                    registrar_turno(session_id, mensagem, messages, chunk)
                     
             except Exception as e:
-                error_chunk = {"error": str(e)}
-                yield f"data: {json.dumps(error_chunk)}\n\n"
+                yield from encoder.encode({"error": str(e)})
+            finally:
+                encoder.close()
+                request_manager.finish_request(request_id)
 
         return Response(
             stream_with_context(generate()),
@@ -226,6 +250,16 @@ def chat_stream():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@main_bp.route('/chat-stream/resync', methods=['POST'])
+def chat_stream_resync():
+    """Texto completo de um stream aberto - o cliente só pede quando detecta lacuna"""
+    data = request.get_json(silent=True) or {}
+    encoder = find_stream(str(data.get('stream_id', '')), session.get('titan_session_id'))
+    if encoder is None:
+        # Stream já terminou ou está em outro worker: o cliente volta a acrescentar os deltas ("done" corrige)
+        return jsonify({'error': 'Stream não encontrado'}), 404
+    return jsonify(encoder.snapshot())
+
 @main_bp.route('/thinking-mode', methods=['GET', 'POST'])
 def thinking_mode():
     """Gerenciar thinking mode"""
@@ -260,7 +294,7 @@ def debug_session():
                 'inicio': session_data.get('inicio'),
                 'ultima_atividade': session_data.get('ultima_atividade'),
                 'requests_count': session_data.get('requests_count'),
-                'chat_history_length': len(session_data.get('chat_history', []))
+                'chat_history_length': len(session_manager.get_chat_history(flask_session_id))
             }
     
     return jsonify(debug_info)
@@ -314,6 +348,7 @@ def clear_chat_history():
             return jsonify({"erro": "Sessão inválida"}), 401
         
         session_manager.update_chat_history(session_id, [])
+        conversation_summarizer.reset(session_id)
         return jsonify({'status': 'sucesso', 'message': 'Histórico limpo'})
         
     except Exception as e:
@@ -351,7 +386,18 @@ def criar_feedback():
 @main_bp.route('/admin/stats')
 def admin_stats():
     """Estatísticas do sistema"""
-    return jsonify(session_manager.get_status())
+    stats = session_manager.get_status()
+    stats['ai_http_pool'] = ai_client.http.get_stats()
+    stats['context_builder'] = context_builder.get_stats()
+    stats['conversation_summarizer'] = conversation_summarizer.get_stats()
+    stats['context_cache'] = context_cache.get_stats()
+    stats['response_cache'] = response_cache.get_stats()
+    stats['semantic_cache'] = semantic_cache.get_stats()
+    stats['db_pool'] = db_pool.get_stats()
+    stats['db_maintenance'] = maintenance_scheduler.get_stats()
+    stats['chat_store'] = chat_manager.store.get_stats()
+    stats['chat_backups'] = chat_manager.backups.get_stats()
+    return jsonify(stats)
 
 @main_bp.route('/api/chat', methods=['GET', 'POST'])
 def api_chat():
@@ -382,8 +428,82 @@ def end_session():
 
 @main_bp.route('/api/chats', methods=['GET', 'POST'])  # ✅ ROTA QUE FALTAVA
 def api_chats():
-    """API para chats (diferente de /api/chat)"""
+    """API para chats (diferente de /api/chat) - a listagem vem só do índice"""
+    session_id = session.get('titan_session_id')
+    if not session_id:
+        return jsonify({'status': 'erro', 'erro': 'Sessão inválida'}), 401
+    
     if request.method == 'GET':
-        return jsonify({'status': 'sucesso', 'chats': []})
-    else:
-        return jsonify({'status': 'sucesso', 'message': 'Chat salvo'})
\ No newline at end of file
+        return jsonify(chat_manager.list_chats(session_id=session_id, limit=request.args.get('limit', type=int),
+                                               offset=request.args.get('offset', 0, type=int)))
+    
+    chat_data = request.get_json(silent=True)
+    if not isinstance(chat_data, dict):
+        return jsonify({'status': 'erro', 'erro': 'JSON inválido'}), 400
+    
+    chat_data['session_id'] = session_id  # Nunca confiar no session_id do cliente
+    resultado = chat_manager.save_chat(chat_data)
+    return jsonify(resultado), 200 if resultado['status'] == 'sucesso' else 400
+
+@main_bp.route('/api/chats/<chat_id>', methods=['GET', 'DELETE'])
+def api_chat_by_id(chat_id):
+    """Uma conversa completa (abrir) ou exclusão"""
+    session_id = session.get('titan_session_id')
+    if not session_id:
+        return jsonify({'status': 'erro', 'erro': 'Sessão inválida'}), 401
+    
+    if request.method == 'DELETE':
+        resultado = chat_manager.delete_chat(chat_id, session_id=session_id)
+        return jsonify(resultado), 200 if resultado['status'] == 'sucesso' else 404
+    
+    chat = chat_manager.get_chat_by_id(chat_id, session_id=session_id)
+    if not chat:
+        return jsonify({'status': 'erro', 'erro': 'Conversa não encontrada'}), 404
+    return jsonify({'status': 'sucesso', 'chat': chat})
+
+@main_bp.route('/api/chats/export', methods=['POST'])
+def api_chats_export():
+    """Exportar uma conversa"""
+    session_id = session.get('titan_session_id')
+    if not session_id:
+        return jsonify({'status': 'erro', 'erro': 'Sessão inválida'}), 401
+    
+    data = request.get_json(silent=True) or {}
+    resultado = chat_manager.export_chat(data.get('chat_id'), session_id=session_id)
+    resultado.pop('path', None)  # Não expor caminho do servidor
+    return jsonify(resultado)
+
+@main_bp.route('/api/chats/backup', methods=['POST'])
+def api_chats_backup():
+    """Backup manual das conversas da sessão"""
+    session_id = session.get('titan_session_id')
+    if not session_id:
+        return jsonify({'status': 'erro', 'erro': 'Sessão inválida'}), 401
+    return jsonify(chat_manager.create_manual_backup(session_id=session_id))
+
+@main_bp.route('/api/chats/backups')
+def api_chats_backups():
+    """Pontos de restauração da sessão"""
+    session_id = session.get('titan_session_id')
+    if not session_id:
+        return jsonify({'status': 'erro', 'erro': 'Sessão inválida'}), 401
+    return jsonify(chat_manager.list_backups(session_id=session_id))
+
+@main_bp.route('/api/chats/restore', methods=['POST'])
+def api_chats_restore():
+    """Restaurar as conversas da sessão a partir de um backup"""
+    session_id = session.get('titan_session_id')
+    if not session_id:
+        return jsonify({'status': 'erro', 'erro': 'Sessão inválida'}), 401
+    
+    data = request.get_json(silent=True) or {}
+    resultado = chat_manager.restore_backup(session_id=session_id, snapshot_id=data.get('snapshot_id'))
+    return jsonify(resultado), 200 if resultado['status'] == 'sucesso' else 400
+
+@main_bp.route('/api/chats/stats')
+def api_chats_stats():
+    """Estatísticas das conversas da sessão"""
+    session_id = session.get('titan_session_id')
+    if not session_id:
+        return jsonify({'status': 'erro', 'erro': 'Sessão inválida'}), 401
+    return jsonify(chat_manager.get_stats(session_id=session_id))
\ No newline at end of file
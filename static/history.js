@@ -138,14 +138,35 @@ async function saveCurrentChat() {
     return null;
 }
 
-function loadChat(chatId) {
-    const chatIndex = chatHistory.findIndex(chat => chat.id === chatId);
-    if (chatIndex === -1) {
+// A listagem (/api/chats) traz só o índice - mensagens são buscadas ao abrir a conversa
+async function fetchFullChat(chatId) {
+    const chat = chatHistory.find(c => c.id === chatId);
+    if (chat && Array.isArray(chat.messages)) return chat;
+
+    try {
+        const response = await fetch(`/api/chats/${chatId}`);
+        const data = await response.json();
+        if (data.status !== 'sucesso') return null;
+
+        if (chat) {
+            Object.assign(chat, data.chat);
+            return chat;
+        }
+        return data.chat;
+    } catch (error) {
+        console.error('❌ Erro ao carregar conversa:', error);
+        return null;
+    }
+}
+
+async function loadChat(chatId) {
+    const chat = await fetchFullChat(chatId);
+    const chatIndex = chatHistory.findIndex(c => c.id === chatId);
+    if (!chat || chatIndex === -1) {
         showToast('❌ Conversa não encontrada', 'error');
         return;
     }
 
-    const chat = chatHistory[chatIndex];
     currentChatIndex = chatIndex;
 
     // Restaurar estado da conversa
@@ -339,9 +360,10 @@ function updateHistorySidebar() {
 
 function createChatHistoryItem(chat) {
     const isActive = currentChatIndex >= 0 && chatHistory[currentChatIndex]?.id === chat.id;
-    const lastMessage = chat.messages[chat.messages.length - 1];
-    const preview = lastMessage ? (lastMessage.content.substring(0, 60) + '...') : 'Sem mensagens';
-    const messageCount = chat.messages.length;
+    const lastMessage = chat.messages ? chat.messages[chat.messages.length - 1] : null;
+    const previewText = lastMessage ? lastMessage.content.substring(0, 60) : chat.preview;
+    const preview = previewText ? (previewText + '...') : 'Sem mensagens';
+    const messageCount = chat.messages ? chat.messages.length : (chat.message_count || 0);
     const date = new Date(chat.updated_at).toLocaleDateString('pt-BR');
 
     return `
@@ -438,7 +460,9 @@ function filterChatHistory() {
     if (searchTerm) {
         filteredChats = filteredChats.filter(chat =>
             chat.title.toLowerCase().includes(searchTerm) ||
-            chat.messages.some(msg => msg.content.toLowerCase().includes(searchTerm))
+            (chat.messages
+                ? chat.messages.some(msg => msg.content.toLowerCase().includes(searchTerm))
+                : (chat.preview || '').toLowerCase().includes(searchTerm))
         );
     }
 
@@ -459,7 +483,7 @@ function filterChatHistory() {
 
 // ===== AÇÕES DO HISTÓRICO =====
 async function togglePinChat(chatId) {
-    const chat = chatHistory.find(c => c.id === chatId);
+    const chat = await fetchFullChat(chatId);
     if (chat) {
         chat.is_pinned = !chat.is_pinned;
         chat.updated_at = new Date().toISOString();
@@ -484,7 +508,7 @@ async function togglePinChat(chatId) {
 }
 
 async function renameChat(chatId) {
-    const chat = chatHistory.find(c => c.id === chatId);
+    const chat = await fetchFullChat(chatId);
     if (!chat) return;
 
     const newTitle = prompt('Novo título da conversa:', chat.title);
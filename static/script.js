@@ -591,6 +591,165 @@ async function sendChatMessage() {
     await sendMessageToServer(finalMessage); // ✅ Enviar com comando
 }
 
+// =================== 🌊 PROTOCOLO DE STREAM (v2) ===================
+const STREAM_PROTOCOL_VERSION = 2;
+
+const CRC32_TABLE = (() => {
+    const table = new Uint32Array(256);
+    for (let n = 0; n < 256; n++) {
+        let c = n;
+        for (let k = 0; k < 8; k++) {
+            c = c & 1 ? 0xEDB88320 ^ (c >>> 1) : c >>> 1;
+        }
+        table[n] = c >>> 0;
+    }
+    return table;
+})();
+
+// crc32 incremental (mesmo resultado do zlib.crc32 do servidor)
+function crc32(bytes, crc = 0) {
+    crc = (crc ^ 0xFFFFFFFF) >>> 0;
+    for (let i = 0; i < bytes.length; i++) {
+        crc = CRC32_TABLE[(crc ^ bytes[i]) & 0xFF] ^ (crc >>> 8);
+    }
+    return (crc ^ 0xFFFFFFFF) >>> 0;
+}
+
+class StreamReassembler {
+    /**
+     * Remonta o texto a partir de deltas numerados (seq).
+     * Eventos "sync" trazem tamanho + crc32 do texto no servidor; se um evento
+     * se perder ou o texto divergir, pede o texto completo em /chat-stream/resync
+     * e guarda os deltas que chegarem até a resposta. Se o resync não estiver
+     * disponível (stream em outro worker), volta a acrescentar os deltas e o
+     * "done" corrige o texto final.
+     */
+    constructor(onResync) {
+        this.parts = [];
+        this.expectedSeq = 0;
+        this.desynced = false;
+        this.streamId = null;
+        this.size = 0;
+        this.crc = 0;
+        this.pending = [];      // Deltas recebidos enquanto dessincronizado
+        this.baseSeq = -1;      // Eventos até este seq já estão no texto do resync
+        this.resyncing = false;
+        this.resyncFailed = false;
+        this.onResync = onResync;
+        this.encoder = new TextEncoder();
+    }
+
+    get content() {
+        if (this.parts.length > 1) {
+            this.parts = [this.parts.join('')];
+        }
+        return this.parts[0] || '';
+    }
+
+    _append(text) {
+        const bytes = this.encoder.encode(text);
+        this.parts.push(text);
+        this.size += bytes.length;
+        this.crc = crc32(bytes, this.crc);
+    }
+
+    _reset(text) {
+        this.parts = [];
+        this.size = 0;
+        this.crc = 0;
+        this.pending = [];
+        this.desynced = false;
+        if (text) this._append(text);
+    }
+
+    apply(data) {
+        if (typeof data.seq === 'number') {
+            if (data.seq !== this.expectedSeq) {
+                console.warn('⚠️ Seq fora de ordem:', data.seq, 'esperado', this.expectedSeq);
+                this._desync();
+            }
+            this.expectedSeq = data.seq + 1;
+        }
+
+        if (data.type === 'start') {
+            this.streamId = data.stream_id || null;
+            return false;
+        }
+
+        // Protocolo legado: buffer completo em cada evento
+        if (typeof data.buffer === 'string' && data.type === 'content') {
+            this._reset(data.buffer);
+            return true;
+        }
+
+        if (data.type === 'sync') {
+            if (!this.desynced && (data.bytes !== this.size || data.crc !== this.crc)) {
+                console.warn('⚠️ Texto divergente no sync:', this.size, 'bytes, servidor', data.bytes);
+                this._desync();
+            }
+            return false;
+        }
+
+        if (data.type === 'content' && data.content) {
+            if (typeof data.seq === 'number' && data.seq <= this.baseSeq) {
+                return false;
+            }
+            if (this.desynced) {
+                this.pending.push(data);
+                return false;
+            }
+            this._append(data.content);
+            return true;
+        }
+
+        return false;
+    }
+
+    _desync() {
+        // Sem stream_id ou resync indisponível: segue acrescentando, o "done" traz o texto final
+        if (!this.streamId || this.resyncFailed) return;
+        this.desynced = true;
+        if (this.resyncing) return;
+
+        this.resyncing = true;
+        fetch('/chat-stream/resync', {
+            method: 'POST',
+            headers: getHeaders(),
+            body: JSON.stringify({ stream_id: this.streamId })
+        })
+        .then(response => response.ok ? response.json() : null)
+        .then(snapshot => {
+            if (!snapshot) {
+                // Stream terminou ou está em outro worker (404)
+                this._resume();
+                return;
+            }
+            if (!this.desynced) return;
+            const pending = this.pending.filter(d => d.seq > snapshot.seq);
+            this._reset(snapshot.buffer || '');
+            this.baseSeq = snapshot.seq;
+            pending.forEach(d => this._append(d.content));
+            if (this.onResync) this.onResync(this.content);
+        })
+        .catch(error => {
+            console.warn('⚠️ Falha no resync do stream:', error.message);
+            this._resume();
+        })
+        .finally(() => { this.resyncing = false; });
+    }
+
+    _resume() {
+        // Desiste do resync neste stream e mostra os deltas guardados
+        this.resyncFailed = true;
+        if (!this.desynced) return;
+        const pending = this.pending;
+        this.pending = [];
+        this.desynced = false;
+        pending.forEach(d => this._append(d.content));
+        if (this.onResync) this.onResync(this.content);
+    }
+}
+
 async function streamWithFetchStream(message, container) {
     return new Promise((resolve, reject) => {
         console.log('🌊 Iniciando stream para:', message);
@@ -613,7 +772,8 @@ async function streamWithFetchStream(message, container) {
             headers: getHeaders(),
             body: JSON.stringify({
                 mensagem: message,
-                thinking_mode: currentThinkingMode
+                thinking_mode: currentThinkingMode,
+                stream_protocol: STREAM_PROTOCOL_VERSION
             }),
             signal: currentRequest.signal
         })
@@ -639,6 +799,13 @@ async function streamWithFetchStream(message, container) {
             let buffer = '';
             let fullContent = '';
             let thinkingContent = '';
+            const reassembler = new StreamReassembler(content => {
+                fullContent = content;
+                if (contentElement) {
+                    contentElement.innerHTML = formatMessage(fullContent);
+                    scrollToBottom();
+                }
+            });
             
             let contentElement = container.querySelector('.streaming-content');
             let thinkingContainer = null;
@@ -722,27 +889,43 @@ async function streamWithFetchStream(message, container) {
                                     return;
                                 }
 
+                                // ✅ TODO EVENTO PASSA PELO REMONTADOR (controle de seq)
+                                const contentChanged = reassembler.apply(data);
+
                                 // ✅ THINKING PROCESSING
                                 if (data.type === 'thinking_done') {
                                     thinkingContent = data.thinking || '';
                                     console.log('🧠 Thinking recebido:', thinkingContent.length, 'chars');
                                     
-                                    if (currentThinkingMode && thinkingContent && !thinkingContainer) {
-                                        thinkingContainer = createThinkingContainer(container);
+                                    if (currentThinkingMode && thinkingContent) {
+                                        if (!thinkingContainer) {
+                                            thinkingContainer = createThinkingContainer(container);
+                                        }
                                         if (thinkingContainer) {
                                             updateThinkingContent(thinkingContainer, thinkingContent);
                                         }
                                     }
                                 }
 
-                                // ✅ CONTENT UPDATE COM DEBUG
+                                // ✅ THINKING AO VIVO (deltas do parser incremental)
+                                else if (data.type === 'thinking') {
+                                    thinkingContent += data.content || '';
+
+                                    if (currentThinkingMode && thinkingContent.trim()) {
+                                        if (!thinkingContainer) {
+                                            thinkingContainer = createThinkingContainer(container);
+                                        }
+                                        if (thinkingContainer) {
+                                            updateThinkingContent(thinkingContainer, thinkingContent);
+                                        }
+                                    }
+                                }
+
+                                // ✅ CONTENT UPDATE (delta ou buffer completo do protocolo legado)
                                 else if (data.type === 'content') {
-                                    const newContent = data.buffer || data.content || '';
-                                    if (newContent !== fullContent) {
-                                        const oldLength = fullContent.length;
-                                        fullContent = newContent;
-                                        console.log('📝 Conteúdo atualizado:', oldLength, '->', fullContent.length, 'chars');
-                                        
+                                    if (contentChanged) {
+                                        fullContent = reassembler.content;
+
                                         if (contentElement) {
                                             contentElement.innerHTML = formatMessage(fullContent);
                                             scrollToBottom();
@@ -750,6 +933,10 @@ async function streamWithFetchStream(message, container) {
                                     }
                                 }
 
+                                else if (data.type === 'start') {
+                                    console.log('🌊 Protocolo de stream v' + data.protocol);
+                                }
+
                                 // ✅ COMPLETION
                                 else if (data.type === 'done') {
                                     console.log('🏁 Stream marcado como concluído pelo servidor');
@@ -1325,6 +1512,10 @@ function startNewChat() {
     // Limpar tudo
     clearCurrentSession();
     userMessageCount = 0;
+
+    // Histórico do servidor (contexto enviado ao modelo) também recomeça
+    fetch('/clear-chat-history', { method: 'POST', headers: getHeaders() })
+        .catch(error => console.warn('⚠️ Falha ao limpar histórico no servidor:', error));
     feedbackShown = false;
 
     // Reset DOM
@@ -0,0 +1,23 @@
+"""Configuração dos testes
+
+Os módulos do app copiam os caminhos do config no import (bancos SQLite,
+chats, cache), então eles são redirecionados para um diretório temporário
+antes de qualquer outro import - os testes nunca tocam nos dados reais.
+"""
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import config  # noqa: E402
+
+RUNTIME_DIR = Path(tempfile.mkdtemp(prefix='titan-tests-'))
+
+for _name, _value in list(vars(config).items()):
+    if isinstance(_value, Path) and _name not in ('BASE_DIR', 'STATIC_DIR', 'TEMPLATES_DIR'):
+        setattr(config, _name, RUNTIME_DIR / _value.relative_to(config.BASE_DIR))
+
+for _directory in (config.CHATS_DIR, config.BACKUPS_DIR, config.EXPORTS_DIR, config.SESSIONS_DIR,
+                   config.SECURITY_LOGS_DIR):
+    _directory.mkdir(parents=True, exist_ok=True)
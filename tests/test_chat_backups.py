@@ -0,0 +1,75 @@
+"""Backups automáticos das conversas (save_chat / delete_chat / restore_backup)"""
+import multiprocessing
+import os
+import uuid
+
+import pytest
+
+from models.chat_backup import ChatBackupStore
+from models.chat_manager import ChatManager
+
+
+@pytest.fixture
+def manager():
+    return ChatManager(backups=ChatBackupStore(max_snapshots=10, coalesce_window=300))
+
+
+@pytest.fixture
+def session_id():
+    return str(uuid.uuid4())
+
+
+def conversa(chat_id, session_id, texto):
+    return {'id': chat_id, 'title': f"Conversa {chat_id}", 'session_id': session_id,
+            'messages': [{'role': 'user', 'content': texto}]}
+
+
+def test_save_cria_backup_coalescido(manager, session_id):
+    manager.save_chat(conversa('a', session_id, 'primeira'))
+    assert manager.list_backups(session_id)['total'] == 0  # Sessão vazia: nada a guardar
+
+    manager.save_chat(conversa('b', session_id, 'segunda'))
+    manager.save_chat(conversa('b', session_id, 'segunda editada'))
+    backups = manager.list_backups(session_id)
+    assert backups['total'] == 1  # Dentro da janela de coalescência
+    assert backups['backups'][0]['total_chats'] == 1
+
+
+def test_save_e_delete_podem_ser_restaurados(manager, session_id):
+    manager.save_chat(conversa('a', session_id, 'primeira'))
+    manager.save_chat(conversa('b', session_id, 'segunda'))
+    assert manager.delete_chat('a', session_id=session_id)['status'] == 'sucesso'
+    assert [c['id'] for c in manager.list_chats(session_id)['chats']] == ['b']
+
+    # Exclusão fura a coalescência: o backup mais recente ainda tem a conversa excluída
+    assert manager.restore_backup(session_id)['status'] == 'sucesso'
+    chats = {c['id']: c for c in manager.load_history(session_id)}
+    assert set(chats) == {'a', 'b'}
+    assert chats['a']['messages'][0]['content'] == 'primeira'
+
+
+def _snapshots_em_outro_worker(backup_dir, worker, total, max_snapshots):
+    store = ChatBackupStore(max_snapshots=max_snapshots, coalesce_window=300)
+    for i in range(total):
+        # Conversa compartilhada (objeto reaproveitado) + uma que só esse snapshot usa
+        chats = [{'id': 'fixa', 'texto': 'igual em todos'}, {'id': f"w{worker}", 'texto': f"versão {i}"}]
+        store.snapshot(backup_dir, chats, force=True)
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="precisa de fork")
+@pytest.mark.parametrize("max_snapshots", [100, 3])
+def test_snapshots_concorrentes_entre_workers(tmp_path, max_snapshots):
+    ctx = multiprocessing.get_context('fork')
+    workers = [ctx.Process(target=_snapshots_em_outro_worker, args=(tmp_path, w, 20, max_snapshots))
+               for w in range(2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+        assert worker.exitcode == 0
+
+    store = ChatBackupStore(max_snapshots=max_snapshots)
+    snapshots = store.list_snapshots(tmp_path)
+    assert len(snapshots) == min(40, max_snapshots)  # Nenhum snapshot perdido
+    for snap in snapshots:  # Nenhum objeto referenciado foi podado
+        assert len(store.restore(tmp_path, snap['snapshot_id'])) == 2
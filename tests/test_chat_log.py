@@ -0,0 +1,91 @@
+"""Log append-only das conversas: índice montado só pelos cabeçalhos dos registros"""
+import pytest
+
+import models.chat_log
+from models.chat_log import ChatLogStore
+from models.json_codec import codec
+
+
+def conversa(chat_id, texto, session_id='sessao-log-0001'):
+    return {'id': chat_id, 'title': f"Conversa {chat_id}", 'session_id': session_id,
+            'messages': [{'role': 'user', 'content': texto}, {'role': 'assistant', 'content': f"re: {texto}\tfim"}]}
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    return str(tmp_path / 'chats.log')
+
+
+def test_indice_a_frio_nao_decodifica_as_conversas(log_file, monkeypatch):
+    escrita = ChatLogStore()
+    escrita.put(log_file, conversa('a', 'primeira'))
+    escrita.put(log_file, conversa('b', 'segunda'))
+    escrita.put(log_file, conversa('a', 'primeira editada'))
+    escrita.delete(log_file, 'b')
+
+    # Outro worker (índice vazio): listar não pode recalcular metadados a partir das conversas
+    def proibido(chat):
+        raise AssertionError("corpo da conversa decodificado para montar o índice")
+    monkeypatch.setattr(models.chat_log, 'chat_meta', proibido)
+
+    fria = ChatLogStore()
+    listagem = fria.list(log_file)
+    assert [c['id'] for c in listagem] == ['a']
+    assert listagem[0]['message_count'] == 2
+    assert listagem[0]['preview'] == 're: primeira editada\tfim'
+    assert fria.read(log_file, 'a')['messages'][0]['content'] == 'primeira editada'
+
+
+def test_registros_antigos_continuam_legiveis_e_sao_convertidos(log_file):
+    with open(log_file, 'wb') as f:
+        for seq, chat_id in enumerate(['x', 'y'], start=1):
+            f.write(codec.dumps({'op': 'put', 'seq': seq, 'chat': conversa(chat_id, chat_id)}) + b'\n')
+
+    store = ChatLogStore()
+    assert [c['id'] for c in store.list(log_file)] == ['y', 'x']
+    store.put(log_file, conversa('z', 'nova'))
+    chats, _ = store.read_all(log_file)
+    assert [c['id'] for c in chats] == ['z', 'y', 'x']
+
+    store.compact(log_file)
+    with open(log_file, 'rb') as f:
+        assert all(b'\t{' in line for line in f)
+    assert [c['id'] for c in ChatLogStore().read_all(log_file)[0]] == ['z', 'y', 'x']
+
+
+def test_importacao_do_chats_json_concorrente(tmp_path):
+    import threading
+    import uuid
+    from models.chat_manager import ChatManager
+
+    manager = ChatManager()
+    session_id = str(uuid.uuid4())
+    legacy = [conversa(f"antiga-{i}", f"texto {i}", session_id) for i in range(3)]
+    legacy_file = manager._get_session_file(session_id, "chats.json")
+    codec.write_file(legacy_file, legacy)
+
+    barreira = threading.Barrier(8)
+    erros = []
+
+    def requisicao(i):
+        try:
+            barreira.wait()
+            if i == 0:
+                resultado = manager.save_chat(conversa('nova', 'durante a importação', session_id))
+                assert resultado['status'] == 'sucesso'
+            else:
+                manager.list_chats(session_id)
+        except Exception as e:
+            erros.append(e)
+
+    threads = [threading.Thread(target=requisicao, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert not erros
+    ids = {c['id'] for c in manager.load_history(session_id)}
+    assert ids == {'antiga-0', 'antiga-1', 'antiga-2', 'nova'}
+    assert not legacy_file.exists() and legacy_file.with_suffix('.json.backup').exists()
+    assert not [p for p in legacy_file.parent.iterdir() if p.name.endswith('.tmp')]
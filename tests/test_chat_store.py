@@ -0,0 +1,41 @@
+"""Backend SQLite das conversas (SQLiteChatStore)"""
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+from models.chat_store import SQLiteChatStore
+from models.db_pool import SQLitePool
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteChatStore(pool=SQLitePool(tmp_path / 'chats.db'))
+
+
+def conversa(chat_id, n_mensagens):
+    return {'id': chat_id, 'title': chat_id, 'session_id': 'sessao-sqlite-01',
+            'messages': [{'role': 'user', 'content': f"{chat_id} #{i}"} for i in range(n_mensagens)]}
+
+
+def test_read_all_com_mais_conversas_que_o_limite_de_variaveis(store):
+    # Acima de SQLITE_MAX_VARIABLE_NUMBER (999) de builds antigos do SQLite
+    chats = [conversa(f"c{i:04d}", 3 if i % 2 else 0) for i in range(1200)]
+    store.rewrite('sessao-sqlite-01', chats)
+
+    lidas, _ = store.read_all('sessao-sqlite-01')
+    assert [c['id'] for c in lidas] == [c['id'] for c in chats]
+    assert lidas[1]['messages'] == chats[1]['messages']
+    assert lidas[0]['messages'] == []
+
+    assert store.read('sessao-sqlite-01', 'c0007') == chats[7]
+    assert store.read('sessao-sqlite-01', 'inexistente') is None
+
+
+@pytest.mark.parametrize("sql, n_params", [(SQLiteChatStore.SESSION_MESSAGES_SQL, 1),
+                                           (SQLiteChatStore.CHAT_MESSAGES_SQL, 2)])
+def test_mensagens_saem_da_chave_primaria_sem_ordenar(store, sql, n_params):
+    with closing(sqlite3.connect(store.pool.db_file)) as conn:
+        plano = " | ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, ("",) * n_params))
+    assert "USING PRIMARY KEY" in plano
+    assert "TEMP B-TREE" not in plano
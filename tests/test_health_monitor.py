@@ -0,0 +1,18 @@
+"""Política fail_open/fail_closed do monitor de saúde do Ollama"""
+import pytest
+
+from utils.health_monitor import OllamaHealthMonitor
+
+
+class HttpSemResposta:
+    def get(self, url, timeout=None):
+        raise AssertionError("probe concorrente não deveria chamar o backend")
+
+
+@pytest.mark.parametrize("fail_open", [True, False])
+def test_probe_concorrente_sem_estado_segue_a_politica(fail_open):
+    monitor = OllamaHealthMonitor(HttpSemResposta(), 'http://ollama/api/tags', fail_open=fail_open)
+
+    # Outro request já está no probe inline (estado ainda None)
+    with monitor._probe_lock:
+        assert monitor.is_available() is fail_open
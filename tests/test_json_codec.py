@@ -0,0 +1,34 @@
+"""Escrita atômica dos arquivos de conversa (JSONCodec.write_bytes)"""
+import os
+import stat
+
+import pytest
+
+import models.json_codec
+from models.json_codec import JSONCodec
+
+
+def test_write_file_atomico_sem_sobras(tmp_path):
+    codec = JSONCodec(compression='gzip')
+    path = tmp_path / 'manifest.json'
+    codec.write_file(path, {'snapshots': [1, 2]})
+    codec.write_file(path, {'snapshots': [3]})
+
+    assert codec.read_file(path) == {'snapshots': [3]}
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert os.listdir(tmp_path) == ['manifest.json']
+
+
+def test_falha_no_replace_preserva_o_original_e_remove_o_tmp(tmp_path, monkeypatch):
+    codec = JSONCodec(compression=None)
+    path = tmp_path / 'summary.json'
+    codec.write_file(path, {'versao': 1})
+
+    def falha(src, dst):
+        raise OSError("disco cheio")
+    monkeypatch.setattr(models.json_codec.os, 'replace', falha)
+
+    with pytest.raises(OSError):
+        codec.write_file(path, {'versao': 2})
+    assert codec.read_file(path) == {'versao': 1}
+    assert os.listdir(tmp_path) == ['summary.json']
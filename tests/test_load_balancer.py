@@ -0,0 +1,199 @@
+"""Balanceador Ollama contra backends HTTP locais (stubs de /api/tags e /api/chat)"""
+import json
+import socket
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.ai_client import AIClient
+from utils.load_balancer import OllamaLoadBalancer
+
+
+class StubOllama:
+    """Ollama falso: /api/tags responde conforme `healthy`; /api/chat faz stream NDJSON
+
+    Enquanto `gate` não for liberado, as respostas de /api/chat ficam presas
+    (gerações "em andamento" para testar o least-outstanding).
+    """
+
+    def __init__(self, answer="olá mundo"):
+        self.answer = answer
+        self.healthy = True
+        self.chat_requests = 0
+        self.gate = threading.Event()
+        self.gate.set()
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, content_type='application/json'):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == '/api/tags' and stub.healthy:
+                    self._send(200, json.dumps({'models': [{'name': 'stub'}]}).encode())
+                else:
+                    self._send(503, b'{}')
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if self.path != '/api/chat':
+                    self._send(404, b'{}')
+                    return
+                with stub.lock:
+                    stub.chat_requests += 1
+                stub.gate.wait(10)
+                lines = [{'message': {'content': word + ' '}} for word in stub.answer.split()]
+                lines.append({'done': True, 'prompt_eval_count': 10})
+                self._send(200, ''.join(json.dumps(line) + '\n' for line in lines).encode(), 'application/x-ndjson')
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_port}/api/chat"
+
+    def close(self):
+        self.gate.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def free_port_url():
+    """URL de um backend sem servidor ouvindo (conexão recusada)"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}/api/chat"
+
+
+@pytest.fixture
+def stubs():
+    created = []
+
+    def make(**kwargs):
+        stub = StubOllama(**kwargs)
+        created.append(stub)
+        return stub
+
+    yield make
+    for stub in created:
+        stub.close()
+
+
+def make_client(backends):
+    client = AIClient()
+    client.backends = OllamaLoadBalancer(backends, client.http, model='stub')
+    # Estado de saúde já conhecido: sem probe inline concorrente nas primeiras requests
+    for backend in client.backends.backends:
+        backend.health.probe()
+    return client
+
+
+def stream_answer(client, session_id):
+    """Texto da resposta de um /api/chat em stream (mensagem única evita o cache de respostas)"""
+    messages = [{'role': 'user', 'content': f"pergunta {uuid.uuid4()}"}]
+    events = list(client.send_message_streaming(messages, session_id=session_id))
+    errors = [event['error'] for event in events if 'error' in event]
+    assert not errors, errors
+    return ''.join(event['content'] for event in events if event.get('type') == 'content').strip()
+
+
+def test_weighted_least_outstanding_routing(stubs):
+    heavy, light = stubs(), stubs()
+    heavy.gate.clear()
+    light.gate.clear()
+    client = make_client([{'url': heavy.url, 'weight': 3}, {'url': light.url, 'weight': 1}])
+
+    threads = [threading.Thread(target=stream_answer, args=(client, f"sessao-{i}")) for i in range(4)]
+    for thread in threads:
+        thread.start()
+
+    deadline = time.time() + 10
+    while heavy.chat_requests + light.chat_requests < 4 and time.time() < deadline:
+        time.sleep(0.01)
+
+    # Peso 3 x 1 com 4 gerações presas: 3 no backend pesado, 1 no leve
+    assert (heavy.chat_requests, light.chat_requests) == (3, 1)
+    assert [b.in_flight for b in client.backends.backends] == [3, 1]
+
+    heavy.gate.set()
+    light.gate.set()
+    for thread in threads:
+        thread.join(10)
+    assert [b.in_flight for b in client.backends.backends] == [0, 0]
+
+
+def test_sticky_session_stays_on_its_backend(stubs):
+    first, second = stubs(), stubs()
+    client = make_client([first.url, second.url])
+
+    assert stream_answer(client, 'sessao-fixa') == 'olá mundo'
+    pinned = first if first.chat_requests else second
+    other = second if pinned is first else first
+
+    # Outra sessão ocupa o outro backend; a fixa continua no mesmo
+    stream_answer(client, 'sessao-outra')
+    for _ in range(3):
+        stream_answer(client, 'sessao-fixa')
+
+    assert pinned.chat_requests == 4
+    assert other.chat_requests == 1
+
+
+def test_unhealthy_backend_is_ejected_and_recovers(stubs):
+    first, second = stubs(), stubs()
+    client = make_client([first.url, second.url])
+    backend_first = client.backends.backends[0]
+
+    stream_answer(client, 'sessao-a')
+    assert first.chat_requests == 1
+
+    # Probe falha: a sessão é realocada para o backend saudável
+    first.healthy = False
+    backend_first.health.probe()
+    stream_answer(client, 'sessao-a')
+    assert second.chat_requests == 1
+    assert client.backends.get_status()['backends'][0]['online'] is False
+
+    # Backend volta: sessões novas podem ir para ele de novo
+    first.healthy = True
+    backend_first.health.probe()
+    stream_answer(client, 'sessao-b')
+    assert first.chat_requests == 2
+    assert client.backends.get_status()['online'] is True
+
+
+def test_connection_error_fails_over_to_another_backend(stubs):
+    healthy = stubs()
+    client = make_client([free_port_url(), healthy.url])
+    dead = client.backends.backends[0]
+    # Estado ainda "up" (probe antigo) - a falha só aparece na chamada real
+    with dead.health.lock:
+        dead.health.up, dead.health.last_check = True, time.time()
+
+    assert stream_answer(client, 'sessao-failover') == 'olá mundo'
+    assert healthy.chat_requests == 1
+    assert dead.health.get_status()['online'] is False
+    assert [b.in_flight for b in client.backends.backends] == [0, 0]
+
+    # Caminho não-streaming (chamada final das ferramentas) também faz failover
+    with dead.health.lock:
+        dead.health.up, dead.health.last_check = True, time.time()
+    response = client._post_to_backend({'model': 'stub', 'messages': []}, 'sessao-outra', timeout=5)
+    assert response.status_code == 200
+    assert healthy.chat_requests == 2
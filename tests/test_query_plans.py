@@ -0,0 +1,54 @@
+"""Regressão dos planos das consultas quentes (EXPLAIN QUERY PLAN contra QUERY_PLANS)"""
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+from models.database import QUERY_PLANS, DatabaseManager
+from models.db_pool import SQLitePool
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return DatabaseManager(pool=SQLitePool(tmp_path / 'memoria.db'))
+
+
+def plano(db_file, sql, n_params):
+    with closing(sqlite3.connect(db_file)) as conn:
+        return " | ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, ("",) * n_params))
+
+
+@pytest.mark.parametrize("nome, sql, n_params, esperado, proibidos", QUERY_PLANS, ids=[q[0] for q in QUERY_PLANS])
+def test_consulta_usa_o_indice(manager, nome, sql, n_params, esperado, proibidos):
+    obtido = plano(manager.db_file, sql, n_params)
+    assert esperado in obtido
+    for proibido in proibidos:
+        assert proibido not in obtido
+
+
+@pytest.mark.parametrize("nome, sql, n_params, esperado, proibidos", QUERY_PLANS, ids=[q[0] for q in QUERY_PLANS])
+def test_plano_se_mantem_depois_do_analyze(manager, nome, sql, n_params, esperado, proibidos):
+    # Estatísticas reais (manutenção agendada roda ANALYZE) não podem trocar o índice por SCAN
+    for sessao in range(20):
+        for i in range(25):
+            manager.salvar_dados(f"chave_{i}", f"valor {i}", f"cat_{i % 5}", session_id=f"sessao-{sessao:03d}")
+    with closing(sqlite3.connect(manager.db_file)) as conn:
+        conn.execute("ANALYZE")
+        conn.commit()
+
+    obtido = plano(manager.db_file, sql, n_params)
+    assert esperado in obtido
+    for proibido in proibidos:
+        assert proibido not in obtido
+
+
+def test_verificacao_detecta_indice_perdido(manager):
+    assert manager.verificar_planos_consulta()['status'] == 'sucesso'
+
+    with closing(sqlite3.connect(manager.db_file)) as conn:
+        conn.execute("DROP INDEX idx_dados_sessao_recentes")
+        conn.commit()
+
+    resultado = manager.verificar_planos_consulta()
+    assert resultado['status'] == 'erro'
+    assert any(problema.startswith("listar_recentes:") for problema in resultado['problemas'])
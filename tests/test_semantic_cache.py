@@ -0,0 +1,30 @@
+"""Quando o cache semântico pode reaproveitar uma resposta"""
+import sys
+
+import pytest
+
+from utils.ai_client import AIClient
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(sys.modules['utils.ai_client'], 'SEMANTIC_CACHE_ENABLED', True)  # utils.ai_client é a instância
+    return AIClient()
+
+
+def payload(*messages):
+    return {'model': 'stub', 'options': {}, 'messages': [{'role': 'system', 'content': 'Você é o Titan'}]
+            + [{'role': role, 'content': content} for role, content in messages]}
+
+
+def test_primeira_pergunta_usa_o_cache_semantico(client):
+    scope, text = client._semantic_target(payload(('user', 'O que é uma closure?')), 'sessao-semantica')
+    assert scope.endswith(':sessao-semantica')
+    assert text == 'O que é uma closure?'
+
+
+def test_pergunta_de_continuacao_nao_usa_o_cache_semantico(client):
+    # "e em Python?" depende do histórico - duas conversas da mesma sessão teriam respostas diferentes
+    for historico in ([('user', 'Closures em JavaScript'), ('assistant', 'São funções...')],
+                      [('user', 'Ordenar uma lista em Go'), ('assistant', 'Use sort.Slice...')]):
+        assert client._semantic_target(payload(*historico, ('user', 'e em Python?')), 'sessao-semantica') is None
@@ -2,10 +2,10 @@
 Ferramentas do Titan Chat
 """
 from .system_tools import obter_data_hora, gerar_numero_aleatorio
-from .memory_tools import salvar_dados, buscar_dados, deletar_dados, listar_categorias
+from .memory_tools import salvar_dados, buscar_dados, buscar_memorias, deletar_dados, listar_categorias
 
 __all__ = [
     'obter_data_hora',
     'calcular_operacao',
-    'salvar_dados', 'buscar_dados', 'deletar_dados', 'listar_categorias'
+    'salvar_dados', 'buscar_dados', 'buscar_memorias', 'deletar_dados', 'listar_categorias'
 ]
\ No newline at end of file
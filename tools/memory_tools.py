@@ -14,6 +14,13 @@ def buscar_dados(chave=None, categoria=None, session_id=None):
     
     return db_manager.buscar_dados(chave, categoria, session_id=session_id)
 
+def buscar_memorias(consulta, limite=5, session_id=None):
+    """Busca as memórias mais relevantes para um assunto (FTS5) - COM ISOLAMENTO POR SESSÃO"""
+    if not session_id:
+        return {"status": "erro", "mensagem": "session_id é obrigatório para isolamento"}
+    
+    return db_manager.buscar_relevantes(consulta, session_id=session_id, limite=limite)
+
 def deletar_dados(chave, session_id=None):
     """Remove dados salvos da memória da IA - COM ISOLAMENTO POR SESSÃO"""
     if not session_id:
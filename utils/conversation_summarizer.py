@@ -0,0 +1,202 @@
+import queue
+import threading
+import time
+from collections import OrderedDict
+from config import (CONTEXT_SUMMARIZER_ENABLED, CONTEXT_SUMMARY_MAX_CHARS, CONTEXT_SUMMARY_MAX_TOKENS,
+                    CONTEXT_SUMMARY_CACHE_SIZE)
+from models.chat_manager import chat_manager
+
+SUMMARY_INSTRUCTIONS = (
+    "Você mantém o resumo de uma conversa entre um usuário e o assistente Titan. "
+    "Atualize o resumo atual incorporando os novos turnos. Preserve fatos, nomes, "
+    "decisões, preferências do usuário e perguntas em aberto. Responda apenas com o "
+    "resumo em português, em tópicos curtos, sem comentários."
+)
+
+
+class ConversationSummarizer:
+    """Resumo incremental (em background) dos turnos que saem da janela de contexto"""
+
+    def __init__(self, store=chat_manager, enabled=CONTEXT_SUMMARIZER_ENABLED,
+                 max_chars=CONTEXT_SUMMARY_MAX_CHARS, max_tokens=CONTEXT_SUMMARY_MAX_TOKENS,
+                 cache_size=CONTEXT_SUMMARY_CACHE_SIZE):
+        self.store = store
+        self.enabled = enabled
+        self.max_chars = max_chars
+        self.max_tokens = max_tokens
+        self.cache_size = cache_size
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self._pending = {}  # session_id -> {turn: [mensagens]} aguardando o worker
+        self._summaries = OrderedDict()  # session_id -> resumo (LRU, fonte de verdade no ChatManager)
+        self._resets = OrderedDict()  # session_id -> nº de resets (descarta resumos gerados antes do reset)
+        self._thread = None
+        self.stats = {
+            'scheduled': 0,
+            'summaries_generated': 0,
+            'turns_folded': 0,
+            'failures': 0,
+            'total_time': 0.0
+        }
+
+    def start(self):
+        if not self.enabled or (self._thread and self._thread.is_alive()):
+            return
+        self._thread = threading.Thread(target=self._worker, daemon=True, name="conversation-summarizer")
+        self._thread.start()
+        print("📝 Sumarizador de conversa iniciado")
+
+    # ===== LEITURA =====
+    def get_summary(self, session_id):
+        """{'summary', 'summarized_until'} da sessão ou None"""
+        if not session_id:
+            return None
+
+        with self.lock:
+            if session_id in self._summaries:
+                self._summaries.move_to_end(session_id)
+                return self._summaries[session_id]
+
+        data = self.store.load_summary(session_id)
+        self._remember(session_id, data)
+        return data
+
+    def _remember(self, session_id, data):
+        with self.lock:
+            self._summaries[session_id] = data
+            self._summaries.move_to_end(session_id)
+            while len(self._summaries) > self.cache_size:
+                self._summaries.popitem(last=False)
+
+    def reset(self, session_id):
+        """Nova conversa: descarta resumo e turnos pendentes"""
+        with self.lock:
+            self._pending.pop(session_id, None)
+            self._resets[session_id] = self._resets.pop(session_id, 0) + 1
+            while len(self._resets) > self.cache_size:
+                self._resets.popitem(last=False)
+        self._remember(session_id, None)
+        self.store.delete_summary(session_id)
+
+    # ===== AGENDAMENTO =====
+    def schedule(self, session_id, dropped_turns):
+        """Enfileira os turnos descartados que ainda não estão no resumo"""
+        if not self.enabled or not session_id or not dropped_turns:
+            return False
+
+        current = self.get_summary(session_id)
+        summarized_until = current.get('summarized_until', 0) if current else 0
+
+        with self.lock:
+            pending = self._pending.get(session_id)
+            is_new = pending is None
+            if is_new:
+                pending = {}
+
+            for turn in dropped_turns:
+                turn_id = turn[0].get('turn')
+                if turn_id and turn_id > summarized_until:
+                    pending[turn_id] = turn
+
+            if not pending:
+                return False
+
+            self._pending[session_id] = pending
+            self.stats['scheduled'] += 1
+
+        # Uma entrada por sessão na fila - novos turnos se juntam aos pendentes
+        if is_new:
+            self.queue.put(session_id)
+        return True
+
+    # ===== WORKER =====
+    def _worker(self):
+        while True:
+            session_id = self.queue.get()
+            try:
+                with self.lock:
+                    pending = self._pending.pop(session_id, None)
+                if pending:
+                    self._fold(session_id, [pending[t] for t in sorted(pending)])
+            except Exception as e:
+                with self.lock:
+                    self.stats['failures'] += 1
+                print(f"❌ Erro no sumarizador: {str(e)[:100]}")
+            finally:
+                self.queue.task_done()
+
+    @staticmethod
+    def _format_turns(turns, max_message_chars=1000):
+        lines = []
+        for turn in turns:
+            for message in turn:
+                role = "Usuário" if message.get('role') == 'user' else "Assistente"
+                content = (message.get('content') or '').strip()
+                if len(content) > max_message_chars:
+                    content = content[:max_message_chars] + "..."
+                lines.append(f"{role}: {content}")
+        return "\n".join(lines)
+
+    def _fold(self, session_id, turns):
+        """Incorpora só os turnos novos ao resumo existente (nunca refaz do zero)"""
+        from utils.ai_client import ai_client
+
+        start = time.time()
+        with self.lock:
+            resets = self._resets.get(session_id, 0)
+        current = self.get_summary(session_id)
+        summary = current.get('summary', '') if current else ''
+        summarized_until = current.get('summarized_until', 0) if current else 0
+
+        turns = [t for t in turns if t[0].get('turn', 0) > summarized_until]
+        if not turns:
+            return
+
+        messages = [
+            {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+            {"role": "user", "content": (
+                f"Resumo atual:\n{summary or '(vazio)'}\n\n"
+                f"Novos turnos:\n{self._format_turns(turns)}\n\n"
+                f"Resumo atualizado (máximo {self.max_chars} caracteres):"
+            )}
+        ]
+
+        new_summary = ai_client.complete(messages, num_predict=self.max_tokens)
+        if not new_summary:
+            with self.lock:
+                self.stats['failures'] += 1
+            return
+
+        data = {
+            'summary': new_summary.strip()[:self.max_chars],
+            'summarized_until': turns[-1][0]['turn']
+        }
+
+        # A conversa pode ter sido reiniciada enquanto o modelo gerava
+        with self.lock:
+            if self._resets.get(session_id, 0) != resets:
+                return
+
+        self.store.save_summary(session_id, data)
+        self._remember(session_id, data)
+
+        elapsed = time.time() - start
+        with self.lock:
+            self.stats['summaries_generated'] += 1
+            self.stats['turns_folded'] += len(turns)
+            self.stats['total_time'] += elapsed
+        print(f"📝 Resumo da sessão {session_id[:8]}... atualizado: +{len(turns)} turnos em {elapsed:.1f}s")
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['pending_sessions'] = len(self._pending)
+            stats['cached_summaries'] = len(self._summaries)
+        generated = stats['summaries_generated']
+        stats['avg_time'] = round(stats.pop('total_time') / generated, 3) if generated else 0
+        stats['enabled'] = self.enabled
+        return stats
+
+
+# Instância global
+conversation_summarizer = ConversationSummarizer()
@@ -0,0 +1,119 @@
+import threading
+import time
+from config import AI_HEALTH_TIMEOUT, AI_HEALTH_INTERVAL, AI_HEALTH_TTL, AI_HEALTH_FAIL_OPEN
+
+
+class OllamaHealthMonitor:
+    """Probe do Ollama em background com estado em memória (up/down + modelos)"""
+
+    def __init__(self, http, tags_url, model=None, interval=AI_HEALTH_INTERVAL,
+                 ttl=AI_HEALTH_TTL, fail_open=AI_HEALTH_FAIL_OPEN, timeout=AI_HEALTH_TIMEOUT):
+        self.http = http
+        self.tags_url = tags_url
+        self.model = model
+        self.interval = interval
+        self.ttl = ttl
+        self.fail_open = fail_open
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.thread = None
+        self._probe_lock = threading.Lock()
+
+        self.up = None            # None = ainda não verificado
+        self.models = []
+        self.last_check = 0
+        self.last_error = None
+        self.latency_ms = None
+        self.probes = 0
+        self.failures = 0
+
+    def start(self):
+        """Inicia a thread de probe (idempotente)"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self._monitor_loop, daemon=True)
+        self.thread.start()
+        print(f"🩺 Monitor de saúde do Ollama iniciado ({self.interval}s)")
+
+    def _monitor_loop(self):
+        while True:
+            self.probe()
+            time.sleep(self.interval)
+
+    def probe(self):
+        """Consulta /api/tags e atualiza o estado em cache"""
+        if not self._probe_lock.acquire(blocking=False):
+            return self.up  # Outro probe já em andamento
+
+        try:
+            start = time.time()
+            up, models, error = False, None, None
+            try:
+                response = self.http.get(self.tags_url, timeout=self.timeout)
+                if response.status_code == 200:
+                    up = True
+                    models = [m.get('name') for m in response.json().get('models', []) if isinstance(m, dict)]
+                else:
+                    error = f"HTTP {response.status_code}"
+            except Exception as e:
+                error = str(e)[:200]
+
+            with self.lock:
+                if up and not self.up:
+                    print(f"🩺 Ollama disponível ({len(models or [])} modelos)")
+                elif not up and self.up is not False:
+                    print(f"🩺 Ollama indisponível: {error}")
+
+                self.up = up
+                if models is not None:
+                    self.models = models
+                self.last_error = error
+                self.last_check = time.time()
+                self.latency_ms = round((self.last_check - start) * 1000, 1)
+                self.probes += 1
+                if not up:
+                    self.failures += 1
+            return up
+        finally:
+            self._probe_lock.release()
+
+    def mark_down(self, error):
+        """Falha observada numa chamada real - não esperar o próximo probe"""
+        with self.lock:
+            self.up = False
+            self.last_error = str(error)[:200]
+            self.last_check = time.time()
+
+    def _is_stale(self):
+        return not self.last_check or time.time() - self.last_check > self.ttl
+
+    def is_available(self):
+        """Checagem O(1) para o hot path; aplica a política se o estado estiver velho"""
+        with self.lock:
+            up, stale = self.up, self._is_stale()
+
+        if stale and not (self.thread and self.thread.is_alive()):
+            # Sem thread de background - fazer probe inline
+            up = self.probe()
+            # None = outro probe em andamento e nenhum resultado ainda: vale a política
+            return self.fail_open if up is None else up
+
+        if up is None or stale:
+            return self.fail_open
+        return up
+
+    def get_status(self):
+        with self.lock:
+            return {
+                'online': self.up,
+                'stale': self._is_stale(),
+                'policy': 'fail_open' if self.fail_open else 'fail_closed',
+                'model': self.model,
+                'model_available': self.model in self.models if self.model else None,
+                'models': list(self.models),
+                'last_check': self.last_check or None,
+                'last_error': self.last_error,
+                'latency_ms': self.latency_ms,
+                'probes': self.probes,
+                'failures': self.failures
+            }
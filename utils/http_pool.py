@@ -0,0 +1,125 @@
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from config import AI_HTTP_POOL_SIZE, AI_HTTP_MAX_RETRIES, AI_HTTP_CONNECT_TIMEOUT
+
+
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def connection_never_opened(error):
+    """True se a conexão nem foi aberta (o servidor não recebeu o corpo)"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+class PooledHTTPClient:
+    """Sessão HTTP keep-alive compartilhada para as chamadas ao Ollama"""
+
+    def __init__(self, pool_size=AI_HTTP_POOL_SIZE, max_retries=AI_HTTP_MAX_RETRIES,
+                 connect_timeout=AI_HTTP_CONNECT_TIMEOUT, host_pools=1):
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.connect_timeout = connect_timeout
+        self.lock = threading.Lock()
+        self.stats = {
+            'requests': 0,
+            'retries': 0,
+            'connection_errors': 0
+        }
+
+        self.session = requests.Session()
+        # Um pool por host (um por backend Ollama), cada um com pool_size conexões
+        adapter = HTTPAdapter(pool_connections=max(2, host_pools), pool_maxsize=pool_size, pool_block=False)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+
+        print(f"🔌 Pool HTTP inicializado - {pool_size} conexões keep-alive")
+
+    def _timeout(self, timeout):
+        """(connect, read) - conexão curta, leitura por chamada"""
+        if isinstance(timeout, tuple):
+            return timeout
+        return (self.connect_timeout, timeout)
+
+    def request(self, method, url, timeout, **kwargs):
+        """Request com retry apenas em falha de conexão
+
+        POST (/api/chat gera tokens) não é idempotente: só repete se a falha
+        foi ao abrir a conexão, nunca depois de o corpo ter sido enviado.
+        """
+        attempt = 0
+        while True:
+            with self.lock:
+                self.stats['requests'] += 1
+            try:
+                return self.session.request(method, url, timeout=self._timeout(timeout), **kwargs)
+            except requests.exceptions.ConnectionError as error:
+                with self.lock:
+                    self.stats['connection_errors'] += 1
+                if attempt >= self.max_retries:
+                    raise
+                if method.upper() not in IDEMPOTENT_METHODS and not connection_never_opened(error):
+                    raise
+                attempt += 1
+                with self.lock:
+                    self.stats['retries'] += 1
+                print(f"🔌 Conexão com Ollama falhou - retry {attempt}/{self.max_retries}")
+                time.sleep(0.1 * attempt)
+
+    def post(self, url, timeout, **kwargs):
+        return self.request('POST', url, timeout, **kwargs)
+
+    def get(self, url, timeout, **kwargs):
+        return self.request('GET', url, timeout, **kwargs)
+
+    def release(self, response, completed=False, max_drain=64 * 1024):
+        """Devolve a conexão de um stream ao pool
+
+        Só drena o resto (para reaproveitar a conexão) se o stream chegou ao
+        "done"; interrompido no meio, fecha na hora - drenar seguraria o
+        worker enquanto o Ollama continua gerando.
+        """
+        if not completed:
+            response.close()
+            return
+        try:
+            drained = 0
+            for chunk in response.iter_content(chunk_size=4096):
+                drained += len(chunk)
+                if drained > max_drain:
+                    break
+        except Exception:
+            pass
+        finally:
+            response.close()
+
+    def _pool_counters(self):
+        opened = total = 0
+        for adapter in set(self.session.adapters.values()):
+            manager = getattr(adapter, 'poolmanager', None)
+            if manager is None:
+                continue
+            for key in list(manager.pools.keys()):
+                pool = manager.pools.get(key)
+                if pool is not None:
+                    opened += pool.num_connections
+                    total += pool.num_requests
+        return opened, total
+
+    def get_stats(self):
+        """Contadores de conexões abertas e reaproveitadas"""
+        opened, total = self._pool_counters()
+        with self.lock:
+            stats = dict(self.stats)
+        stats.update({
+            'pool_size': self.pool_size,
+            'connections_opened': opened,
+            'connections_reused': max(0, total - opened)
+        })
+        return stats
@@ -0,0 +1,143 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Optional
+from config import AI_STICKY_SESSIONS_MAX
+from utils.health_monitor import OllamaHealthMonitor
+
+
+@dataclass(eq=False)
+class Backend:
+    url: str                      # Endpoint /api/chat do Ollama
+    weight: float = 1.0
+    in_flight: int = 0            # Gerações em andamento
+    sessions: int = 0             # Sessões fixadas neste backend
+    total_requests: int = 0
+    health: Optional[OllamaHealthMonitor] = field(default=None, repr=False)
+
+    @property
+    def server_url(self):
+        return self.url.split('/api/')[0]
+
+    def score(self):
+        """Least-outstanding-requests ponderado (menor = melhor)"""
+        return ((self.in_flight + 1) / self.weight, self.sessions / self.weight)
+
+
+class OllamaLoadBalancer:
+    """Distribui requests entre vários Ollama com sessões fixas (KV cache quente)"""
+
+    def __init__(self, backends, http, model=None, sticky_max=AI_STICKY_SESSIONS_MAX):
+        if not backends:
+            raise ValueError("Pelo menos um backend Ollama é obrigatório")
+
+        self.lock = threading.Lock()
+        self.sticky_max = sticky_max
+        self._sticky = OrderedDict()  # session_id -> Backend (LRU)
+        self.backends = []
+
+        for entry in backends:
+            if isinstance(entry, str):
+                entry = {"url": entry}
+            weight = float(entry.get("weight", 1) or 1)
+            backend = Backend(url=entry["url"], weight=max(weight, 0.01))
+            backend.health = OllamaHealthMonitor(http, f"{backend.server_url}/api/tags", model=model)
+            self.backends.append(backend)
+
+        print(f"⚖️ Balanceador Ollama: {len(self.backends)} backend(s)")
+
+    def start_health_checks(self):
+        for backend in self.backends:
+            backend.health.start()
+
+    def is_available(self):
+        """Algum backend saudável? (estado em memória)"""
+        return any(backend.health.is_available() for backend in self.backends)
+
+    def _healthy(self, exclude=()):
+        candidates = [b for b in self.backends if b not in exclude] or list(self.backends)
+        healthy = [b for b in candidates if b.health.is_available()]
+        # Nenhum saudável: tentar mesmo assim (o erro chega ao usuário)
+        return healthy or candidates
+
+    def _unpin(self, session_id):
+        backend = self._sticky.pop(session_id, None)
+        if backend is not None:
+            backend.sessions -= 1
+
+    def choose(self, session_id=None, exclude=()):
+        """Escolhe o backend e incrementa in_flight (usar release/lease depois)
+
+        exclude: backends que já falharam nesta request (failover).
+        """
+        healthy = self._healthy(exclude)
+
+        with self.lock:
+            backend = self._sticky.get(session_id) if session_id else None
+
+            if backend is not None and backend not in healthy:
+                print(f"⚖️ Backend {backend.server_url} ejetado - realocando sessão {session_id[:8]}...")
+                self._unpin(session_id)
+                backend = None
+
+            if backend is None:
+                backend = min(healthy, key=Backend.score)
+                if session_id:
+                    self._sticky[session_id] = backend
+                    backend.sessions += 1
+                    while len(self._sticky) > self.sticky_max:
+                        self._unpin(next(iter(self._sticky)))
+            elif session_id:
+                self._sticky.move_to_end(session_id)
+
+            backend.in_flight += 1
+            backend.total_requests += 1
+            return backend
+
+    def release(self, backend):
+        with self.lock:
+            backend.in_flight = max(0, backend.in_flight - 1)
+
+    @contextmanager
+    def lease(self, session_id=None, exclude=()):
+        backend = self.choose(session_id, exclude)
+        try:
+            yield backend
+        finally:
+            self.release(backend)
+
+    def fail_over(self, backend, error, tried, retryable=True):
+        """Erro de conexão: ejeta o backend -> True se vale tentar outro
+
+        retryable=False quando o corpo pode ter chegado ao Ollama (não
+        reenviar uma geração) - aí só marca o backend como fora.
+        """
+        backend.health.mark_down(error)
+        tried.append(backend)
+        if retryable and len(tried) < len(self.backends):
+            print(f"⚖️ Backend {backend.server_url} falhou - tentando outro")
+            return True
+        return False
+
+    def get_status(self):
+        with self.lock:
+            in_flight = {id(b): (b.in_flight, b.sessions, b.total_requests) for b in self.backends}
+
+        backends = []
+        for backend in self.backends:
+            current, sessions, total = in_flight[id(backend)]
+            status = backend.health.get_status()
+            status.update({
+                'url': backend.server_url,
+                'weight': backend.weight,
+                'in_flight': current,
+                'sticky_sessions': sessions,
+                'total_requests': total
+            })
+            backends.append(status)
+
+        return {
+            'online': any(b['online'] for b in backends),
+            'backends': backends
+        }
@@ -0,0 +1,129 @@
+import json
+import threading
+import uuid
+import zlib
+from config import STREAM_PROTOCOL_VERSION, STREAM_CHECKPOINT_INTERVAL
+
+# Versões do protocolo SSE do /chat-stream
+#  1 = legado: cada evento "content" carrega o buffer completo
+#  2 = delta: eventos carregam apenas o texto novo + seq; a cada N eventos um "sync"
+#      com tamanho + crc32 do texto. O texto completo só vai no fio quando o cliente
+#      pede /chat-stream/resync (ou no "done" final)
+SUPPORTED_PROTOCOLS = (1, 2)
+
+# Streams v2 abertos neste processo (stream_id -> StreamEncoder), para o resync
+active_streams = {}
+_active_lock = threading.Lock()
+
+
+def negotiate_protocol(requested):
+    """Escolhe a versão do protocolo pedida pelo cliente (padrão: legado)"""
+    try:
+        requested = int(requested)
+    except (TypeError, ValueError):
+        return 1
+
+    if requested in SUPPORTED_PROTOCOLS:
+        return requested
+    return min(max(SUPPORTED_PROTOCOLS), STREAM_PROTOCOL_VERSION)
+
+
+class StreamEncoder:
+    """Codifica os eventos do AIClient em linhas SSE numeradas
+
+    encode() roda no gerador do stream e snapshot() na thread do resync,
+    por isso o estado fica sob self.lock.
+    """
+
+    def __init__(self, protocol=STREAM_PROTOCOL_VERSION, checkpoint_interval=STREAM_CHECKPOINT_INTERVAL,
+                 session_id=None):
+        self.protocol = protocol
+        self.checkpoint_interval = max(1, int(checkpoint_interval))
+        self.session_id = session_id
+        self.stream_id = uuid.uuid4().hex
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.bytes_sent = 0
+        self._parts = []              # Deltas acumulados (juntados só quando necessário)
+        self._size = 0                # Bytes UTF-8 do texto acumulado
+        self._crc = 0                 # crc32 incremental do texto acumulado
+        self._since_sync = 0
+
+    def _buffer(self):
+        """Texto completo remontado - O(n) apenas quando chamado"""
+        if len(self._parts) > 1:
+            self._parts = [''.join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+    def _append(self, delta):
+        data = delta.encode('utf-8')
+        self._parts.append(delta)
+        self._size += len(data)
+        self._crc = zlib.crc32(data, self._crc)
+
+    def _format(self, event):
+        event["seq"] = self.seq
+        self.seq += 1
+        line = f"data: {json.dumps(event, ensure_ascii=False, separators=(',', ':'))}\n\n"
+        self.bytes_sent += len(line)
+        return line
+
+    def _sync(self):
+        """Verificação periódica barata: o cliente compara com o que remontou"""
+        self._since_sync = 0
+        return self._format({"type": "sync", "bytes": self._size, "crc": self._crc})
+
+    def start(self):
+        """Evento inicial com a versão negociada (só no protocolo delta)"""
+        if self.protocol < 2:
+            return []
+        with _active_lock:
+            active_streams[self.stream_id] = self
+        with self.lock:
+            return [self._format({
+                "type": "start",
+                "protocol": self.protocol,
+                "stream_id": self.stream_id,
+                "checkpoint_interval": self.checkpoint_interval
+            })]
+
+    def close(self):
+        with _active_lock:
+            active_streams.pop(self.stream_id, None)
+
+    def snapshot(self):
+        """Texto completo até o último evento emitido (resposta do resync)"""
+        with self.lock:
+            return {"seq": self.seq - 1, "buffer": self._buffer(), "bytes": self._size, "crc": self._crc}
+
+    def encode(self, chunk):
+        """Converte um evento do AIClient em zero ou mais linhas SSE"""
+        with self.lock:
+            return self._encode(chunk)
+
+    def _encode(self, chunk):
+        if chunk.get("type") == "content":
+            delta = chunk.get("content", "")
+            if not delta:
+                return []
+            self._append(delta)
+
+            if self.protocol < 2:
+                return [self._format({"type": "content", "content": delta, "buffer": self._buffer()})]
+
+            lines = [self._format({"type": "content", "content": delta})]
+            self._since_sync += 1
+            if self._since_sync >= self.checkpoint_interval:
+                lines.append(self._sync())
+            return lines
+
+        return [self._format(dict(chunk))]
+
+
+def find_stream(stream_id, session_id):
+    """Encoder de um stream aberto da sessão (None se acabou ou é de outro worker)"""
+    with _active_lock:
+        encoder = active_streams.get(stream_id)
+    if encoder is None or not session_id or encoder.session_id != session_id:
+        return None
+    return encoder
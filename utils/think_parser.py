@@ -0,0 +1,114 @@
+class ThinkStreamParser:
+    """
+    Separa <think>...</think> da resposta de forma incremental.
+
+    Cada chunk é processado uma única vez (O(1) amortizado por caractere),
+    inclusive quando uma tag chega dividida entre dois chunks. O resultado
+    equivale a THINK_PATTERN.sub('', texto).strip() sobre o texto completo.
+    """
+
+    OPEN_TAG = "<think>"
+    CLOSE_TAG = "</think>"
+
+    def __init__(self):
+        self.inside = False           # Dentro de um bloco <think>?
+        self.blocks_closed = 0
+        self._pending = ""            # Possível tag incompleta no fim do chunk
+        self._answer_parts = []
+        self._thinking_parts = []
+        self._answer_started = False  # Equivale ao lstrip da resposta
+        self._answer_ws = ""          # Espaços finais retidos (equivale ao rstrip)
+        self._thinking_started = False
+
+    @staticmethod
+    def _partial_tag_suffix(text, tag):
+        """Tamanho do maior sufixo de text que é prefixo de tag"""
+        for size in range(min(len(text), len(tag) - 1), 0, -1):
+            if tag.startswith(text[-size:]):
+                return size
+        return 0
+
+    def _add_answer(self, text):
+        if not text:
+            return ""
+        if not self._answer_started:
+            text = text.lstrip()
+            if not text:
+                return ""
+            self._answer_started = True
+
+        stripped = text.rstrip()
+        if not stripped:
+            # Só espaços - segurar até saber se vem mais texto
+            self._answer_ws += text
+            return ""
+
+        delta = self._answer_ws + stripped
+        self._answer_ws = text[len(stripped):]
+        self._answer_parts.append(delta)
+        return delta
+
+    def _add_thinking(self, text):
+        if not text:
+            return ""
+        if not self._thinking_started:
+            text = text.lstrip()
+            if not text:
+                return ""
+            self._thinking_started = True
+        self._thinking_parts.append(text)
+        return text
+
+    def feed(self, chunk):
+        """Processa um chunk e retorna (delta_resposta, delta_pensamento, fechou_bloco)"""
+        text = self._pending + chunk
+        self._pending = ""
+        answer_delta = []
+        thinking_delta = []
+        closed_block = False
+
+        while text:
+            tag = self.CLOSE_TAG if self.inside else self.OPEN_TAG
+            index = text.find(tag)
+
+            if index < 0:
+                keep = self._partial_tag_suffix(text, tag)
+                segment = text[:len(text) - keep]
+                self._pending = text[len(text) - keep:]
+                text = ""
+            else:
+                segment = text[:index]
+                text = text[index + len(tag):]
+
+            if self.inside:
+                thinking_delta.append(self._add_thinking(segment))
+            else:
+                answer_delta.append(self._add_answer(segment))
+
+            if index >= 0:
+                if self.inside:
+                    self.blocks_closed += 1
+                    closed_block = True
+                self.inside = not self.inside
+
+        return "".join(answer_delta), "".join(thinking_delta), closed_block
+
+    def finish(self):
+        """Descarrega o que sobrou no fim do stream"""
+        pending, self._pending = self._pending, ""
+        if self.inside:
+            # Bloco <think> nunca fechado - tratar o resto como pensamento
+            return "", self._add_thinking(pending)
+        return self._add_answer(pending), ""
+
+    @property
+    def answer(self):
+        if len(self._answer_parts) > 1:
+            self._answer_parts = ["".join(self._answer_parts)]
+        return self._answer_parts[0] if self._answer_parts else ""
+
+    @property
+    def thinking(self):
+        if len(self._thinking_parts) > 1:
+            self._thinking_parts = ["".join(self._thinking_parts)]
+        return self._thinking_parts[0].rstrip() if self._thinking_parts else ""